@@ -2,50 +2,160 @@ import streamlit as st
 import pandas as pd
 
 from exceptions_tab import show_exceptions_tab  # custom module
+from cube import CUBE_COLUMNS, load_or_build_cube
+from dataset_cache import DatasetCache
 from reports import show_reports_tab
-from reports import show_forecast_tab
 from faq_bot import show_faq_tab
+from ingest import load_csv_typed, null_count_table
+from exports import csv_bytes, download_on_demand
+from store import new_session_dir, prune_store, read_stage, replace_stage, stage_columns
+from dates import DATE_COLUMN, MONTH_COLUMN, load_or_build_dates, with_calendar_columns
+from filter_index import FilterIndex
+from data_grid import show_grid
+from joins import JOIN_HOW, join_summary
+from profiling import finish_trace, span, start_trace, traced
+from profile_panel import remember_trace, show_profile_panel
+from pipeline import (
+    NONE_OPTION, RANGE_FILTER_COLUMNS, StageCache,
+    apply_mapping, apply_null_policy, bytes_key, merge_datasets, null_options,
+    numeric_columns, stage_key, update_dataset,
+)
 
 
 
 
 
 st.set_page_config(page_title="Sales ETL & Exceptions", layout="wide")
+# Every rerun is traced; stages record themselves into it (see the Performance panel)
+trace = start_trace()
 st.title("Sales Data Analysis Tool")
 
-if 'merged_df' not in st.session_state:
-    st.session_state.merged_df = None
+if 'merged_path' not in st.session_state:
+    st.session_state.merged_path = None
 
 
 # Top-level tabs
-tab1, tab2,tab3,tab4,tab5 = st.tabs(["📊 ETL Pipeline", "🚨 Exceptions & Anomalies","📁 Reports","Forecasting","FAQ Bot"])
+TAB_NAMES = ["📊 ETL Pipeline", "🚨 Exceptions & Anomalies","📁 Reports","Forecasting","FAQ Bot"]
+try:
+    # Track the selected tab so the forecasting stack is only loaded once that tab is opened
+    tab1, tab2,tab3,tab4,tab5 = st.tabs(TAB_NAMES, key="main_tab", on_change="rerun")
+except TypeError:
+    # Older Streamlit runs every tab on every rerun
+    tab1, tab2,tab3,tab4,tab5 = st.tabs(TAB_NAMES)
+
+
+def tab_open(tab):
+    # None when the Streamlit version does not report the selected tab
+    return getattr(tab, "open", None) is not False
+
+# One cache per process: every session uploading the same file shares one typed frame
+@st.cache_resource(show_spinner=False)
+def dataset_cache():
+    return DatasetCache()
+
+
+@traced("load_csv", "ingest")
+def load_csv(key, file):
+    # Uploads are read in typed chunks once per distinct file content
+    return dataset_cache().get_or_load(key, lambda: load_csv_typed(file))
+
+
+def upload_key(file):
+    # Content hash, so the same file uploaded in different sessions maps to one entry; it is
+    # computed once per upload rather than on every rerun
+    hashes = st.session_state.setdefault("upload_hashes", {})
+    file_id = getattr(file, "file_id", None)
+    if file_id is None:
+        return bytes_key(file.getvalue())
+    if file_id not in hashes:
+        hashes[file_id] = bytes_key(file.getvalue())
+    return hashes[file_id]
 
-@st.cache_data(show_spinner=False)
-def load_csv(file):
-    return pd.read_csv(file)
 
 # Shared state
 if "mapped_df" not in st.session_state:
     st.session_state.mapped_df = None
 
+if "stage_cache" not in st.session_state:
+    st.session_state.stage_cache = StageCache()
+
+if "store_dir" not in st.session_state:
+    prune_store()
+    st.session_state.store_dir = new_session_dir()
+
+stage_cache = st.session_state.stage_cache
+store_dir = st.session_state.store_dir
+
+
+def csv_download(label, name, key, frame, file_name):
+    # Serialised only when requested, and at most once per stage version
+    download_on_demand(
+        label, f"{name}_csv:{key}", csv_bytes, frame,
+        file_name=file_name, mime='text/csv', widget_key=f"{name}_csv"
+    )
+
+
+def persist_merged(key, frame):
+    # Each version gets its own file; the previous one goes, with the dates and cube built from it
+    return replace_stage(store_dir, f"merged_{key[:16]}", frame, st.session_state.get("merged_path"))
+
+
+@traced("read_merged", "ingest")
+def session_frame(columns=None):
+    # Tabs read just the columns they need from the memory-mapped merged stage
+    path = st.session_state.get("merged_path")
+    if path is None:
+        return None
+    return read_stage(path, columns)
+
+
+@traced("dates")
+def session_dates():
+    # Invoice dates are parsed once per merged stage version and shared by every tab
+    path = st.session_state.get("merged_path")
+    if path is None or DATE_COLUMN not in stage_columns(path):
+        return None, None
+    return load_or_build_dates(path, lambda: read_stage(path, [DATE_COLUMN])[DATE_COLUMN])
+
+
+def cube_frame(path):
+    frame = read_stage(path, CUBE_COLUMNS)
+    dates, _ = session_dates()
+    if dates is not None:
+        # Datasets without Year/Month columns get them from the parsed invoice dates
+        frame = with_calendar_columns(frame, dates)
+    return frame
+
+
+@traced("cube", "report")
+def session_cube():
+    # Aggregated once per merged stage version; reports roll it up instead of rescanning rows
+    path = st.session_state.get("merged_path")
+    if path is None:
+        return None
+    return load_or_build_cube(path, lambda: cube_frame(path))
+
+
 # ETL PIPELINE TAB
-with tab1:
+with tab1, span("ETL tab", "tab"):
 
     # Step 1: Upload Original Dataset
     st.header("1. Upload Your Primary CSV File")
     uploaded_file = st.file_uploader("Choose the primary CSV file", type="csv")
 
     if uploaded_file:
-        df = load_csv(uploaded_file)
-        st.write("Preview of Primary Dataset", df.head())
+        primary_key = upload_key(uploaded_file)
+        df, df_profile = load_csv(primary_key, uploaded_file)
+        st.write("Preview of Primary Dataset", df_profile["preview"])
 
         # Step 2: Upload Secondary Dataset and Map Columns
         st.header("2. Upload Secondary CSV to Map Columns")
         uploaded_file_2 = st.file_uploader("Upload secondary CSV file", type="csv", key="second_file")
 
         if uploaded_file_2:
-            user_df = load_csv(uploaded_file_2)
-            st.write("Preview of Secondary Dataset", user_df.head())
+            secondary_key = upload_key(uploaded_file_2)
+            user_df, user_profile = load_csv(secondary_key, uploaded_file_2)
+            st.write("Preview of Secondary Dataset", user_profile["preview"])
 
             st.subheader("Map Columns from Secondary Dataset to Primary Dataset")
 
@@ -53,68 +163,68 @@ with tab1:
             for col in user_df.columns:
                 mapped_col = st.selectbox(
                     f"Map '{col}' to column in primary dataset:",
-                    options=["-- None --"] + list(df.columns),
+                    options=[NONE_OPTION] + list(df.columns),
                     key=f"map_{col}"
                 )
-                if mapped_col != "-- None --":
+                if mapped_col != NONE_OPTION:
                     mapping[col] = mapped_col
 
             st.write("Selected Mappings:", mapping)
 
             if mapping:
-                mapped_df = user_df.rename(columns=mapping)
+                key = stage_key(secondary_key, "mapping", mapping)
+                mapped_df = stage_cache.run("mapping", key, apply_mapping, user_df, mapping)
 
                 st.subheader("Preview of Mapped Secondary Dataset")
                 st.write(mapped_df.head())
 
                 # --- Nulls in full mapped dataset
                 st.subheader("Null Value Check in Mapped Dataset")
-                if mapped_df.isnull().values.any():
+                # Mapping only renames columns, so the counts gathered while streaming still apply
+                null_counts = user_profile["null_counts"].rename(index=mapping)
+                null_columns = null_counts[null_counts > 0]
+                if not null_columns.empty:
                     st.warning("⚠️ The mapped dataset contains missing (null) values.")
-                    st.dataframe(mapped_df.isnull().sum().reset_index().rename(columns={'index': 'Column', 0: 'Null Count'}))
+                    st.dataframe(null_count_table(null_counts))
                 else:
                     st.success("✅ No missing values found in the mapped dataset.")
 
-                
+
                 # --- Null Handling
                 st.subheader("Handle Missing Values in Mapped Dataset")
 
-                if mapped_df.isnull().values.any():
-                    null_summary = mapped_df.isnull().sum()
-                    null_columns = null_summary[null_summary > 0]
-
+                null_policy = {}
+                if not null_columns.empty:
                     for col in null_columns.index:
                         st.markdown(f"**Column:** `{col}` — {null_columns[col]} missing value(s)")
-
-                        if pd.api.types.is_numeric_dtype(mapped_df[col]):
-                            option = st.selectbox(
-                                f"Handle nulls in numeric column '{col}':",
-                                options=["Ignore rows", "Fill with mean", "Fill with mode"],
-                                key=f"null_option_{col}"
-                            )
-                        else:
-                            option = st.selectbox(
-                                f"Handle nulls in non-numeric column '{col}':",
-                                options=["Ignore rows", "Fill with mode"],
-                                key=f"null_option_{col}"
-                            )
-
-                        if option == "Ignore rows":
-                            mapped_df = mapped_df[mapped_df[col].notna()]
-                        elif option == "Fill with mean":
-                            mapped_df[col].fillna(mapped_df[col].mean(), inplace=True)
-                        elif option == "Fill with mode":
-                            mode_val = mapped_df[col].mode()
-                            if not mode_val.empty:
-                                mapped_df[col].fillna(mode_val[0], inplace=True)
+                        kind = "numeric" if pd.api.types.is_numeric_dtype(mapped_df[col]) else "non-numeric"
+                        null_policy[col] = st.selectbox(
+                            f"Handle nulls in {kind} column '{col}':",
+                            options=null_options(mapped_df, col),
+                            key=f"null_option_{col}"
+                        )
                 else:
                     st.success("✅ No missing values found in the mapped dataset.")
 
+                key = stage_key(key, "nulls", null_policy)
+                mapped_df = stage_cache.run("null_policy", key, apply_null_policy, mapped_df, null_policy)
+
 
                 # --- Download full mapped dataset
                 st.subheader("Download Mapped Dataset")
-                mapped_csv = mapped_df.to_csv(index=False).encode('utf-8')
-                st.download_button("Download Mapped CSV", mapped_csv, file_name="mapped_dataset.csv", mime='text/csv')
+                csv_download("Download Mapped CSV", "mapped", key, mapped_df, "mapped_dataset.csv")
+
+                st.subheader("Join with Primary Dataset")
+                shared_cols = [col for col in mapped_df.columns if col in df.columns]
+                join_keys = st.multiselect(
+                    "Join on column(s)", shared_cols,
+                    help="Rows are matched on these columns. Leave empty to combine the files row by row."
+                )
+                join_how = st.radio(
+                    "Rows to keep", JOIN_HOW, horizontal=True,
+                    format_func={"left": "All primary rows", "inner": "Matched rows only"}.get
+                )
+                join = {"keys": join_keys, "how": join_how}
 
                 st.subheader("Update Original Dataset with Mapped Columns")
 
@@ -122,15 +232,14 @@ with tab1:
 
                 if update_option:
                     # Avoid duplicate column names
-                    new_cols = [col for col in mapped_df.columns if col not in df.columns]
-                    
-                    if new_cols:
-                        updated_df = pd.concat([df.reset_index(drop=True), mapped_df[new_cols].reset_index(drop=True)], axis=1)
+                    update_key = stage_key(primary_key, key, "update", join)
+                    updated_df = stage_cache.run("update", update_key, update_dataset, df, mapped_df, **join)
+
+                    if updated_df is not None:
                         st.success("Original dataset updated with mapped columns.")
                         st.write("Preview of Updated Dataset", updated_df.head())
 
-                        updated_csv = updated_df.to_csv(index=False).encode('utf-8')
-                        st.download_button("Download Updated Dataset", updated_csv, file_name="updated_dataset.csv", mime='text/csv')
+                        csv_download("Download Updated Dataset", "updated", update_key, updated_df, "updated_dataset.csv")
                     else:
                         st.warning("No new columns found to add from mapped dataset.")
 
@@ -138,8 +247,12 @@ with tab1:
                 # Step 3: Filtering
                 st.header("3. Filter Mapped Data")
 
+                # Built once per mapped dataset; every filter interaction below reuses it
+                index = stage_cache.run("filter_index", key, FilterIndex, mapped_df)
+                selected_states, within = None, None
+
                 if 'State' in mapped_df.columns:
-                    states = sorted(mapped_df['State'].dropna().unique())
+                    states = index.domain("State")
 
                     if 'selected_states' not in st.session_state:
                         st.session_state.selected_states = states
@@ -155,51 +268,53 @@ with tab1:
 
                     selected_states = st.session_state.selected_states
 
-                    if selected_states:
-                        mapped_df = mapped_df[mapped_df['State'].isin(selected_states)]
-                    else:
+                    if not selected_states:
                         st.warning("No state selected. Please select at least one to view data.")
-                        mapped_df = pd.DataFrame()
+
+                    key = stage_key(key, "states", selected_states)
+                    within = ("State", selected_states)
+                    mapped_df = stage_cache.run("state_filter", key, index.filter, selected_states)
                 else:
                     st.warning("'State' column not found in mapped dataset.")
 
                 # Numeric filter
-                numeric_cols = mapped_df.select_dtypes(include='number').columns.tolist()
+                numeric_cols = numeric_columns(mapped_df)
 
                 if numeric_cols and not mapped_df.empty:
                     col_to_filter = st.selectbox("Select numeric column to filter", numeric_cols)
 
-                    if col_to_filter in ['Sales Amt', 'Qty']:
-                        threshold = st.slider(
-                            f"Select minimum value for {col_to_filter}",
-                            int(mapped_df[col_to_filter].min()),
-                            int(mapped_df[col_to_filter].max())
-                        )
-                        filtered_df = mapped_df[mapped_df[col_to_filter] > threshold]
+                    if col_to_filter in RANGE_FILTER_COLUMNS:
+                        low, high = index.value_range(col_to_filter, within=within) or (0, 0)
+                        threshold = st.slider(f"Select minimum value for {col_to_filter}", int(low), int(high))
+                        numeric_filter = {"column": col_to_filter, "threshold": threshold}
                     else:
-                        unique_vals = sorted(mapped_df[col_to_filter].dropna().unique())
+                        unique_vals = index.domain(col_to_filter, within=within)
                         selected_vals = st.multiselect(
                             f"Select values to filter for {col_to_filter}",
                             options=unique_vals,
                             default=unique_vals
                         )
-                        filtered_df = mapped_df[mapped_df[col_to_filter].isin(selected_vals)].head(1000)
+                        numeric_filter = {"column": col_to_filter, "values": selected_vals}
 
-                    # Combine original df and mapped_df horizontally (side-by-side) or vertically (stacked)
-                    merged_df = pd.concat([df.reset_index(drop=True), mapped_df.reset_index(drop=True)], axis=1)
+                    filter_key = stage_key(key, "numeric", numeric_filter)
+                    filtered_df = stage_cache.run(
+                        "numeric_filter", filter_key, index.filter, selected_states, **numeric_filter
+                    )
 
-                    # Optional: Drop duplicate columns (if mapped_df had renamed overlaps)
-                    merged_df = merged_df.loc[:, ~merged_df.columns.duplicated()]
+                    # Join the mapped rows onto the original dataset
+                    merge_key = stage_key(primary_key, key, "merge", join)
+                    merged_df, join_stats = stage_cache.run("merge", merge_key, merge_datasets, df, mapped_df, **join)
+                    st.caption(join_summary(join_stats))
 
-                    # Store in session for use in reports tab
-                    st.session_state.merged_df = merged_df
+                    # Persist for the other tabs; they read it back column-wise from disk
+                    st.session_state.merged_path = stage_cache.run("merged_stage", merge_key, persist_merged, merge_key, merged_df)
 
-                    st.write(f"Filtered Data", filtered_df)
+                    st.write("Filtered Data")
+                    show_grid(filtered_df, "filtered", filter_key)
                 
                     # Download filtered data
                     st.subheader("Download Filtered Data")
-                    csv = filtered_df.to_csv(index=False).encode('utf-8')
-                    st.download_button("Download Filtered CSV", csv, file_name="filtered_mapped_data.csv", mime='text/csv')
+                    csv_download("Download Filtered CSV", "filtered", filter_key, filtered_df, "filtered_mapped_data.csv")
 
                 else:
                     st.warning("No numeric columns found or no data available after filtering.")
@@ -207,39 +322,44 @@ with tab1:
                 st.info("No mappings selected yet.")
         else:
             #st.info("Upload a secondary CSV file to proceed with mapping and filtering.")
+            index = stage_cache.run("primary_filter_index", primary_key, FilterIndex, df)
+            selected_states = None
             if 'State' in df.columns:
-                states = sorted(df['State'].dropna().unique())
+                states = df_profile["domains"]["State"]
                 selected_states = st.multiselect("Filter by State(s)", states, default=states)
-                filtered_df = df[df['State'].isin(selected_states)]
+                key = stage_key(primary_key, "states", selected_states)
             else:
-                filtered_df = df
+                key = primary_key
 
-            numeric_cols = df.select_dtypes(include='number').columns.tolist()
+            numeric_cols = numeric_columns(df)
 
             if numeric_cols and not df.empty:
                 col_to_filter = st.selectbox("Select numeric column to filter", numeric_cols)
 
-                if col_to_filter in ['Sales Amt', 'Qty']:
-                    threshold = st.slider(
-                        f"Select minimum value for {col_to_filter}",
-                        int(df[col_to_filter].min()),
-                        int(df[col_to_filter].max())
-                    )
-                    filtered_df = filtered_df[filtered_df[col_to_filter] > threshold]
+                if col_to_filter in RANGE_FILTER_COLUMNS:
+                    low, high = index.value_range(col_to_filter) or (0, 0)
+                    threshold = st.slider(f"Select minimum value for {col_to_filter}", int(low), int(high))
+                    numeric_filter = {"column": col_to_filter, "threshold": threshold}
                 else:
-                    unique_vals = sorted(df[col_to_filter].dropna().unique())
+                    unique_vals = index.domain(col_to_filter)
                     selected_vals = st.multiselect(
                         f"Select values to filter for {col_to_filter}",
                         options=unique_vals,
                         default=unique_vals
                     )
-                    filtered_df = filtered_df[filtered_df[col_to_filter].isin(selected_vals)]
+                    numeric_filter = {"column": col_to_filter, "values": selected_vals}
+
+                filter_key = stage_key(key, "numeric", numeric_filter)
+                filtered_df = stage_cache.run(
+                    "primary_numeric_filter", filter_key, index.filter, selected_states, **numeric_filter
+                )
 
-                st.session_state.merged_df = filtered_df
-                st.write(f"Filtered Data", filtered_df.head(1000))
+                st.session_state.merged_path = stage_cache.run("merged_stage", filter_key, persist_merged, filter_key, filtered_df)
+                st.write("Filtered Data")
+                show_grid(filtered_df, "filtered", filter_key)
 
                 # Download button
-                st.download_button("Download Filtered CSV", filtered_df.to_csv(index=False), file_name="filtered_primary_data.csv", mime='text/csv')
+                csv_download("Download Filtered CSV", "filtered", filter_key, filtered_df, "filtered_primary_data.csv")
 
             else:
                 st.warning("No numeric columns found or no data available after filtering.")            
@@ -247,22 +367,32 @@ with tab1:
         st.info("Upload the primary CSV file to start the pipeline.")
 
 # EXCEPTIONS TAB
-with tab2:
-    # Check if merged_df is available before calling the exceptions logic
-    if "merged_df" in st.session_state and st.session_state.merged_df is not None:
-        show_exceptions_tab(st.session_state.merged_df)
+with tab2, span("Exceptions tab", "tab"):
+    # Check if the merged stage is available before calling the exceptions logic
+    if st.session_state.get("merged_path") is not None:
+        dates, date_info = session_dates()
+        show_exceptions_tab(session_frame(), dataset_key=st.session_state.merged_path, dates=dates, date_info=date_info)
     else:
         st.warning("⚠️ Please complete the ETL pipeline first to run exception checks.")
 
 
-with tab3:
-    show_reports_tab(st.session_state.get("merged_df"))
+with tab3, span("Reports tab", "tab"):
+    show_reports_tab(session_cube())
    
 
-with tab4:
-    show_forecast_tab(st.session_state.get("merged_df"))
-
-with tab5:
+with tab4, span("Forecasting tab", "tab"):
+    if tab_open(tab4):
+        # Prophet, Stan and plotly are imported on the first visit to this tab
+        from forecast_tab import FORECAST_COLUMNS, show_forecast_tab
+        frame = session_frame(FORECAST_COLUMNS)
+        dates, date_info = session_dates()
+        if frame is not None and dates is not None:
+            frame = frame.assign(**{MONTH_COLUMN: dates[MONTH_COLUMN].to_numpy()})
+        show_forecast_tab(frame, dataset_key=st.session_state.get("merged_path"), date_info=date_info)
+
+with tab5, span("FAQ tab", "tab"):
     show_faq_tab()
 
+show_profile_panel(remember_trace(finish_trace(trace)))
+
        
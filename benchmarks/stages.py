@@ -0,0 +1,281 @@
+import argparse
+import glob
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import numpy as np  # noqa: E402
+import pandas as pd  # noqa: E402
+
+from cube import build_cube, rollup, sorted_report  # noqa: E402
+from dates import DATE_COLUMN, date_table  # noqa: E402
+from exception_engine import RULES, scan_exceptions  # noqa: E402
+from ingest import DEFAULT_CHUNKSIZE, load_csv_typed  # noqa: E402
+from profiling import finish_trace, span, start_trace  # noqa: E402
+from reports import REPORT_DIMENSIONS, generate_excel, generate_pdf  # noqa: E402
+from synthetic import TODAY, parse_rows, write_sales_csv  # noqa: E402
+
+
+# Headless timings of the app's stages on synthetic datasets of several sizes: ingestion, date
+# parsing, the exception checks (and each rule), the cube and every report, Excel/PDF export and
+# forecasting. Each run is saved to benchmarks/results/ with the commit it measured, and can be
+# compared against an earlier run to spot regressions.
+#
+#   python benchmarks/stages.py --rows 10k 1m 10m --repeat 3
+#   python benchmarks/stages.py --rows 1m --compare latest
+
+DATA_DIR = os.path.join(ROOT, "benchmarks", "data")
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+FORECAST_PERIODS = 12
+# A stage regresses when it is this much slower than the baseline and by more than NOISE_SECONDS
+REGRESSION_THRESHOLD = 0.2
+NOISE_SECONDS = 0.01
+
+
+def dataset_path(rows, seed, data_dir):
+    path = os.path.join(data_dir, f"sales_{rows}_seed{seed}.csv")
+    if not os.path.exists(path):
+        started = time.perf_counter()
+        write_sales_csv(path, rows, seed=seed)
+        print(f"generated {path} in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+    return path
+
+
+def run_stages(path, args):
+    # One pass over every stage; returns the trace with a top-level span per stage
+    trace = start_trace("benchmark", memory=args.memory)
+    try:
+        with span("ingest") as info:
+            df, _ = load_csv_typed(path, args.chunksize)
+            info["rows"] = len(df)
+        with span("dates"):
+            table, _ = date_table(df[DATE_COLUMN])
+        with span("exceptions") as info:
+            scan = scan_exceptions(
+                df, list(RULES), today=TODAY, dates=table[DATE_COLUMN].to_numpy(),
+                quantile_method=args.quantile_method,
+            )
+            info["rows"] = int(np.count_nonzero(scan["mask"]))
+        with span("cube") as info:
+            cube = build_cube(df)
+            info["rows"] = len(cube)
+
+        reports = {}
+        for name, dims in REPORT_DIMENSIONS.items():
+            with span(f"report: {name}", "report") as info:
+                reports[name] = rollup(cube, dims)
+                info["rows"] = len(sorted_report(name, reports[name]))
+        with span("report: Custom Drill-down", "report") as info:
+            states = sorted(cube["State"].dropna().unique())[:5]
+            info["rows"] = len(rollup(cube, ["State", "Mat Desc"], filters={"State": states}))
+
+        with span("export: excel", "export"):
+            generate_excel(reports)
+        with span("export: pdf", "export"):
+            generate_pdf(reports)
+
+        if not args.no_forecast:
+            # forecasting imports the model code, so it is only loaded when it is measured
+            from forecasting import forecast_segments, forecast_series, monthly_sales
+            # A fit that fails stops early, so its time is recorded as failed rather than measured
+            with span("forecast: total", "forecast") as info:
+                try:
+                    _, info["model"] = forecast_series(monthly_sales(df), FORECAST_PERIODS, args.model)
+                except ImportError as e:
+                    info["skipped"] = str(e)
+                except Exception as e:
+                    info["failed"] = f"{type(e).__name__}: {e}"
+            with span(f"forecast: by {args.segment}", "forecast") as info:
+                try:
+                    _, _, stats = forecast_segments(df, args.segment, FORECAST_PERIODS, args.model, workers=args.workers)
+                    info["rows"] = stats["fitted"]
+                    if not stats["fitted"] or stats["failed"] or stats["timed_out"]:
+                        info["failed"] = (f"{stats['fitted']} of {stats['segments']} segments fitted, "
+                                          f"{stats['failed']} failed, {stats['timed_out']} timed out")
+                except ImportError as e:
+                    info["skipped"] = str(e)
+                except Exception as e:
+                    info["failed"] = f"{type(e).__name__}: {e}"
+    finally:
+        finish_trace(trace)
+    return trace
+
+
+def _stage_name(record, parents):
+    # Exception rules are reported under their scan; other nested spans are folded into their stage
+    if record["depth"] == 0:
+        return record["name"]
+    if record["category"] == "exception_rule" and parents[0] == "exceptions":
+        return f"exceptions: {record['name']}"
+    return None
+
+
+def stage_rows(traces):
+    # Median wall and CPU time over the repeats, largest peak memory
+    samples = {}
+    for trace in traces:
+        parents = {}
+        for record in sorted(trace.spans, key=lambda record: record["start"]):
+            parents[record["depth"]] = record["name"]
+            name = _stage_name(record, parents)
+            if name is not None:
+                samples.setdefault(name, []).append(record)
+    rows = []
+    for name, records in samples.items():
+        peaks = [record["peak_bytes"] for record in records if record["peak_bytes"] is not None]
+        last = records[-1]["args"]
+        rows.append({
+            "stage": name,
+            "category": records[0]["category"],
+            "wall": statistics.median(record["wall"] for record in records),
+            "wall_min": min(record["wall"] for record in records),
+            "cpu": statistics.median(record["cpu"] for record in records),
+            "peak_bytes": max(peaks) if peaks else None,
+            "rows": last.get("rows"),
+            "skipped": last.get("skipped"),
+            "failed": next((record["args"]["failed"] for record in records if record["args"].get("failed")), None),
+        })
+    return rows
+
+
+def _git(*args):
+    try:
+        proc = subprocess.run(["git", *args], cwd=ROOT, capture_output=True, text=True, timeout=30)
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    return proc.stdout.strip() if proc.returncode == 0 else None
+
+
+def environment():
+    versions = {"python": sys.version.split()[0], "numpy": np.__version__, "pandas": pd.__version__}
+    for module in ["pyarrow", "prophet", "xlsxwriter", "fpdf", "matplotlib"]:
+        try:
+            versions[module] = getattr(__import__(module), "__version__", "unknown")
+        except ImportError:
+            versions[module] = None
+    return {
+        "commit": _git("rev-parse", "HEAD"),
+        "dirty": bool(_git("status", "--porcelain", "--untracked-files=no")),
+        "branch": _git("rev-parse", "--abbrev-ref", "HEAD"),
+        "started_at": pd.Timestamp.now(tz="UTC").isoformat(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "versions": versions,
+    }
+
+
+def results_path(env, results_dir):
+    stamp = pd.Timestamp(env["started_at"]).strftime("%Y%m%dT%H%M%S")
+    commit = (env["commit"] or "nogit")[:10] + ("-dirty" if env["dirty"] else "")
+    return os.path.join(results_dir, f"{stamp}_{commit}.json")
+
+
+def load_baseline(spec, results_dir, exclude=None):
+    if spec == "latest":
+        paths = sorted(path for path in glob.glob(os.path.join(results_dir, "*.json")) if path != exclude)
+        if not paths:
+            return None, None
+        spec = paths[-1]
+    with open(spec, encoding="utf-8") as f:
+        return spec, json.load(f)
+
+
+def _measured(result):
+    # Results saved before failures were recorded have no "failed" entry
+    return not result["skipped"] and not result.get("failed")
+
+
+def compare(results, baseline, threshold=REGRESSION_THRESHOLD):
+    # (rows, stage, baseline wall, wall, ratio, regressed) for stages measured in both runs
+    before = {(r["dataset_rows"], r["stage"]): r for r in baseline["results"]}
+    rows = []
+    for result in results:
+        base = before.get((result["dataset_rows"], result["stage"]))
+        if base is None or not _measured(base) or not _measured(result) or not base["wall"]:
+            continue
+        ratio = result["wall"] / base["wall"]
+        regressed = ratio > 1 + threshold and result["wall"] - base["wall"] > NOISE_SECONDS
+        rows.append((result["dataset_rows"], result["stage"], base["wall"], result["wall"], ratio, regressed))
+    return rows
+
+
+def _format_bytes(value):
+    return "" if value is None else f"{value / 2 ** 20:,.0f}"
+
+
+def print_results(results):
+    print(f"{'rows':>12}  {'stage':<36}{'wall (s)':>10}{'cpu (s)':>10}{'peak (MB)':>11}")
+    for r in results:
+        wall = "skipped" if r["skipped"] else "failed" if r["failed"] else f"{r['wall']:.3f}"
+        print(f"{r['dataset_rows']:>12,}  {r['stage']:<36}{wall:>10}{r['cpu']:>10.3f}{_format_bytes(r['peak_bytes']):>11}")
+    for r in results:
+        if r["failed"]:
+            print(f"{r['dataset_rows']:>12,}  {r['stage']} failed: {r['failed']}", file=sys.stderr)
+
+
+def print_comparison(rows, baseline_path):
+    print(f"\ncompared with {baseline_path}")
+    print(f"{'rows':>12}  {'stage':<36}{'before (s)':>11}{'after (s)':>11}{'change':>9}")
+    for dataset_rows, stage, before, after, ratio, regressed in rows:
+        flag = "  REGRESSION" if regressed else ""
+        print(f"{dataset_rows:>12,}  {stage:<36}{before:>11.3f}{after:>11.3f}{ratio - 1:>+9.0%}{flag}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time the app's stages on synthetic sales data.")
+    parser.add_argument("--rows", nargs="+", default=["10k", "100k", "1m"], help="Dataset sizes, e.g. 10k 1m 50m")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per size; the median is reported")
+    parser.add_argument("--memory", action="store_true", help="Record peak memory per stage (slower)")
+    parser.add_argument("--quantile-method", choices=["exact", "sketch", "sample"], default="exact")
+    parser.add_argument("--model", default="auto", help="Forecast model (auto, prophet, or a baseline)")
+    parser.add_argument("--segment", default="State", help="Segment column for the batch forecast")
+    parser.add_argument("--workers", type=int, default=0, help="Forecast worker processes (0: fit in this process)")
+    parser.add_argument("--no-forecast", action="store_true")
+    parser.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE)
+    parser.add_argument("--data-dir", default=DATA_DIR, help="Where generated datasets are kept between runs")
+    parser.add_argument("--results-dir", default=RESULTS_DIR)
+    parser.add_argument("--no-save", action="store_true", help="Do not write the results file")
+    parser.add_argument("--compare", metavar="RESULTS", help="Results file to compare against, or 'latest'")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD,
+                        help="Slowdown that counts as a regression (0.2: 20%%)")
+    args = parser.parse_args(argv)
+
+    env = environment()
+    results = []
+    for size in [parse_rows(size) for size in args.rows]:
+        path = dataset_path(size, args.seed, args.data_dir)
+        traces = [run_stages(path, args) for _ in range(args.repeat)]
+        results.extend(dict(row, dataset_rows=size) for row in stage_rows(traces))
+
+    print_results(results)
+    output = {"environment": env, "options": vars(args), "results": results}
+    saved = None
+    if not args.no_save:
+        os.makedirs(args.results_dir, exist_ok=True)
+        saved = results_path(env, args.results_dir)
+        with open(saved, "w", encoding="utf-8") as f:
+            json.dump(output, f, indent=1, default=str)
+        print(f"\nsaved {saved}")
+
+    if args.compare:
+        baseline_path, baseline = load_baseline(args.compare, args.results_dir, exclude=saved)
+        if baseline is None:
+            print("no earlier results to compare with", file=sys.stderr)
+            return 0
+        rows = compare(results, baseline, args.threshold)
+        print_comparison(rows, baseline_path)
+        return 1 if any(row[-1] for row in rows) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,117 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+
+# Cold-start cost of the app: import time of each module in a fresh interpreter, and the time
+# until the first script run of app.py has finished (what a new pod or session waits for).
+#
+#   python benchmarks/startup.py --repeat 5 --json startup.json
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP = os.path.join(ROOT, "app.py")
+
+THIRD_PARTY = [
+    "streamlit", "pandas", "numpy", "pyarrow", "xlsxwriter", "plotly.express",
+    "matplotlib.pyplot", "fpdf", "PIL.Image", "prophet",
+]
+APP_MODULES = [
+    "profiling", "pipeline", "ingest", "store", "dataset_cache", "filter_index", "data_grid", "joins", "nulls",
+    "exports", "exception_engine", "exceptions_tab", "cube", "reports", "faq_bot", "forecasters",
+    "forecasting", "forecast_tab", "pdf_report", "profile_panel",
+]
+# Modules that should only be imported once the user reaches the feature that needs them
+DEFERRED = ["prophet", "plotly.express", "matplotlib", "fpdf", "forecasting", "forecast_tab", "pdf_report"]
+
+FIRST_RENDER = """
+import json, sys, time
+started = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file({app!r}, default_timeout=300)
+at.run()
+print(json.dumps({{
+    "run_seconds": time.perf_counter() - started,
+    "exceptions": [str(e.value) for e in at.exception],
+    "loaded": [m for m in {deferred!r} if m in sys.modules],
+}}))
+"""
+
+
+def import_time(module):
+    # Cumulative import time in seconds from -X importtime, or None if the module is missing
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, capture_output=True, text=True,
+    )
+    if proc.returncode:
+        return None
+    for line in proc.stderr.splitlines():
+        fields = [field.strip() for field in line.split("|")]
+        if len(fields) == 3 and fields[2] == module:
+            return int(fields[1]) / 1e6
+    return None
+
+
+def first_render():
+    started = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-c", FIRST_RENDER.format(app=APP, deferred=DEFERRED)],
+        cwd=ROOT, capture_output=True, text=True,
+    )
+    wall = time.perf_counter() - started
+    if proc.returncode:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "first render failed")
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    result["wall_seconds"] = wall
+    return result
+
+
+def median(values):
+    values = [value for value in values if value is not None]
+    return statistics.median(values) if values else None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure app cold-start and per-module import times.")
+    parser.add_argument("--repeat", type=int, default=3, help="Fresh interpreters per measurement")
+    parser.add_argument("--modules", nargs="*", help="Only time these modules")
+    parser.add_argument("--json", help="Write the results to this file")
+    args = parser.parse_args(argv)
+
+    modules = args.modules or THIRD_PARTY + APP_MODULES
+    imports = {module: median([import_time(module) for _ in range(args.repeat)]) for module in modules}
+    renders = [first_render() for _ in range(args.repeat)]
+
+    results = {
+        "python": sys.version.split()[0],
+        "repeat": args.repeat,
+        "imports": imports,
+        "first_render": {
+            "wall_seconds": median([r["wall_seconds"] for r in renders]),
+            "run_seconds": median([r["run_seconds"] for r in renders]),
+            "deferred_loaded": renders[-1]["loaded"],
+            "exceptions": renders[-1]["exceptions"],
+        },
+    }
+
+    print(f"{'module':<22}{'import (ms)':>12}")
+    for module, seconds in imports.items():
+        print(f"{module:<22}{'not installed' if seconds is None else f'{seconds * 1000:.0f}':>12}")
+    render = results["first_render"]
+    print(f"\nfirst render: {render['wall_seconds']:.2f}s wall, {render['run_seconds']:.2f}s in process")
+    print(f"deferred modules loaded by the first render: {', '.join(render['deferred_loaded']) or 'none'}")
+    if render["exceptions"]:
+        print(f"app raised: {render['exceptions']}", file=sys.stderr)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    return 1 if render["exceptions"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,177 @@
+import argparse
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+
+# Synthetic sales extracts with the schema the app expects. Output depends only on the seed and
+# the parameters, so every benchmark run (and every machine) sees the same data; large files are
+# written in chunks, each with its own seed derived from the main one.
+#
+#   python benchmarks/synthetic.py --rows 5m --out benchmarks/data/sales_5m.csv
+
+COLUMNS = ["State", "Dealer", "Dealer_Name", "Mat Desc", "Sales Amt", "Qty", "Inv Date", "Month", "Year"]
+STATES = [
+    "Andhra Pradesh", "Assam", "Bihar", "Chhattisgarh", "Delhi", "Goa", "Gujarat", "Haryana",
+    "Himachal Pradesh", "Jharkhand", "Karnataka", "Kerala", "Madhya Pradesh", "Maharashtra",
+    "Odisha", "Punjab", "Rajasthan", "Tamil Nadu", "Telangana", "Uttar Pradesh", "Uttarakhand",
+    "West Bengal",
+]
+CHUNK_ROWS = 1_000_000
+# Invoices cover MONTHS months from START; dates after TODAY count as future dates
+START = "2021-01-01"
+MONTHS = 36
+TODAY = "2024-01-01"
+
+# Fractions of rows given each kind of problem the exception checks look for
+DEFAULT_INJECT = {
+    "nulls": 0.01,          # per column
+    "duplicates": 0.005,    # exact copies of other rows
+    "outliers": 0.001,      # Sales Amt or Qty scaled up 20-100x
+    "negatives": 0.0005,    # Sales Amt below zero
+    "future_dates": 0.001,  # invoice dates after TODAY
+    "invalid_dates": 0.0005,
+    "state_mismatch": 0.002,  # dealer billed in a state other than its own
+}
+
+
+def parse_rows(text):
+    # "50000", "10k", "2.5m"
+    text = str(text).strip().lower().replace("_", "")
+    scale = {"k": 1_000, "m": 1_000_000}.get(text[-1:], 1)
+    return int(float(text[:-1] if scale > 1 else text) * scale)
+
+
+def dimensions(seed, dealers, products):
+    # Dealer home states and popularity, product prices: fixed by the seed, not the row count
+    rng = np.random.default_rng([seed, 0])
+    popularity = 1.0 / np.arange(1, dealers + 1) ** 0.8
+    return {
+        "dealer_name": np.array([f"Dealer {dealer + 1000}" for dealer in range(dealers)], dtype=object),
+        "dealer_state": rng.integers(0, len(STATES), dealers),
+        "dealer_p": rng.permutation(popularity / popularity.sum()),
+        "unit_price": np.round(rng.lognormal(mean=5.5, sigma=0.8, size=products), 2),
+        "product_name": np.array([f"Product {product}" for product in range(products)], dtype=object),
+        "product_p": rng.dirichlet(np.full(products, 0.5)),
+    }
+
+
+def _inject(chunk, rng, inject, today):
+    n = len(chunk)
+
+    def pick(rate):
+        return np.flatnonzero(rng.random(n) < rate)
+
+    rows = pick(inject.get("outliers", 0))
+    scale = rng.uniform(20, 100, len(rows))
+    sales = rows[rng.random(len(rows)) < 0.7]
+    chunk.loc[sales, "Sales Amt"] = np.round(chunk.loc[sales, "Sales Amt"] * scale[:len(sales)], 2)
+    qty = np.setdiff1d(rows, sales)
+    chunk.loc[qty, "Qty"] = np.round(chunk.loc[qty, "Qty"] * scale[len(sales):])
+
+    rows = pick(inject.get("negatives", 0))
+    chunk.loc[rows, "Sales Amt"] = -chunk.loc[rows, "Sales Amt"]
+
+    rows = pick(inject.get("state_mismatch", 0))
+    chunk.loc[rows, "State"] = np.asarray(STATES, dtype=object)[rng.integers(0, len(STATES), len(rows))]
+
+    rows = pick(inject.get("future_dates", 0))
+    future = np.datetime64(today, "D") + rng.integers(1, 366, len(rows))
+    chunk.loc[rows, "Inv Date"] = future.astype(str)
+    chunk.loc[rows, "Month"] = future.astype("datetime64[M]").astype(np.int64) % 12 + 1
+    chunk.loc[rows, "Year"] = future.astype("datetime64[Y]").astype(np.int64) + 1970
+
+    rows = pick(inject.get("invalid_dates", 0))
+    chunk.loc[rows, "Inv Date"] = np.asarray(["31/02/2023", "2023-13-01", "unknown", "00-00-0000"], dtype=object)[rng.integers(0, 4, len(rows))]
+
+    for col in COLUMNS:
+        chunk.loc[pick(inject.get("nulls", 0)), col] = None
+
+    # Duplicates last, so they copy rows with their problems
+    rows = pick(inject.get("duplicates", 0))
+    if len(rows) and n > 1:
+        chunk.iloc[rows] = chunk.iloc[rng.integers(0, n, len(rows))].to_numpy()
+    return chunk
+
+
+def generate_chunk(rows, seed, index, dims, start=START, months=MONTHS, today=TODAY, inject=None):
+    rng = np.random.default_rng([seed, 1, index])
+    inject = DEFAULT_INJECT if inject is None else inject
+
+    dealer = rng.choice(len(dims["dealer_p"]), size=rows, p=dims["dealer_p"])
+    product = rng.choice(len(dims["product_p"]), size=rows, p=dims["product_p"])
+    first = np.datetime64(start, "D")
+    days = (first.astype("datetime64[M]") + months).astype("datetime64[D]") - first
+    day = rng.integers(0, days.astype(np.int64), rows)
+    # Strings are built once per distinct value and gathered, not formatted per row
+    calendar = first + np.arange(days.astype(np.int64))
+    month_index = calendar.astype("datetime64[M]").astype(np.int64)[day]
+
+    # Monthly seasonality and a gentle upward trend, so forecasts have something to find
+    season = 1 + 0.25 * np.sin(2 * np.pi * (month_index % 12) / 12)
+    trend = 1 + 0.01 * (month_index - month_index.min())
+    qty = rng.poisson(4 * season * trend) + 1
+    sales = np.round(qty * dims["unit_price"][product] * rng.normal(1, 0.05, rows), 2)
+
+    chunk = pd.DataFrame({
+        "State": np.asarray(STATES, dtype=object)[dims["dealer_state"][dealer]],
+        "Dealer": dealer + 1000,
+        "Dealer_Name": dims["dealer_name"][dealer],
+        "Mat Desc": dims["product_name"][product],
+        "Sales Amt": sales,
+        "Qty": qty.astype(np.float64),
+        "Inv Date": calendar.astype(str).astype(object)[day],
+        "Month": (month_index % 12 + 1).astype(np.float64),
+        "Year": (month_index // 12 + 1970).astype(np.float64),
+    }, columns=COLUMNS)
+    chunk = _inject(chunk, rng, inject, today)
+    return chunk.astype({"Dealer": "Int64", "Qty": "Int64", "Month": "Int64", "Year": "Int64"})
+
+
+def _chunks(rows, seed, dealers=None, products=500, chunk_rows=CHUNK_ROWS, **options):
+    dealers = dealers or int(min(20_000, max(50, rows // 500)))
+    dims = dimensions(seed, dealers, products)
+    for index, offset in enumerate(range(0, rows, chunk_rows)):
+        yield generate_chunk(min(chunk_rows, rows - offset), seed, index, dims, **options)
+
+
+def generate_sales(rows, seed=0, **options):
+    # In-memory frame; use write_sales_csv for sizes that should not be held at once
+    return pd.concat(list(_chunks(rows, seed, **options)), ignore_index=True)
+
+
+def write_sales_csv(path, rows, seed=0, **options):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    for index, chunk in enumerate(_chunks(rows, seed, **options)):
+        chunk.to_csv(tmp_path, mode="w" if index == 0 else "a", header=index == 0, index=False)
+    os.replace(tmp_path, path)
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write a synthetic sales CSV with injected data problems.")
+    parser.add_argument("--rows", default="100k", help="Row count, e.g. 10k, 1m, 50m")
+    parser.add_argument("--out", required=True)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--dealers", type=int, help="Distinct dealers (default scales with rows)")
+    parser.add_argument("--products", type=int, default=500)
+    parser.add_argument("--months", type=int, default=MONTHS, help="Months of invoice history")
+    parser.add_argument("--start", default=START, help="First invoice month")
+    parser.add_argument("--today", default=TODAY, help="Dates after this count as future dates")
+    parser.add_argument("--clean", action="store_true", help="Inject no data problems")
+    args = parser.parse_args(argv)
+
+    rows = parse_rows(args.rows)
+    write_sales_csv(
+        args.out, rows, seed=args.seed, dealers=args.dealers, products=args.products,
+        months=args.months, start=args.start, today=args.today, inject={} if args.clean else None,
+    )
+    print(f"{args.out}: {rows:,} rows")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
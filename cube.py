@@ -0,0 +1,87 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from profiling import traced
+from store import derived_path, read_stage, write_stage
+
+
+CUBE_DIMENSIONS = ["Dealer_Name", "Mat Desc", "State", "Year", "Month"]
+CUBE_MEASURES = ["Sales Amt", "Qty"]
+CUBE_COLUMNS = CUBE_DIMENSIONS + CUBE_MEASURES
+
+
+@traced("build_cube", "report")
+def build_cube(df):
+    # One groupby over every report dimension; rows with missing keys are kept so
+    # rollups over the other dimensions still add up to the raw totals.
+    dims = [col for col in CUBE_DIMENSIONS if col in df.columns]
+    measures = [col for col in CUBE_MEASURES if col in df.columns]
+    if not dims or not measures:
+        return pd.DataFrame(columns=dims + measures)
+    # Sum in float64 even when the loaded columns were downcast
+    values = df[dims].assign(**{col: df[col].astype("float64") for col in measures})
+    return values.groupby(dims, observed=True, dropna=False)[measures].sum().reset_index()
+
+
+@traced("rollup", "report")
+def rollup(cube, dims, filters=None, measures=None):
+    measures = [col for col in (measures or CUBE_MEASURES) if col in cube.columns]
+    if filters:
+        mask = pd.Series(True, index=cube.index)
+        for col, values in filters.items():
+            mask &= cube[col].isin(values)
+        cube = cube[mask]
+    if not dims:
+        return cube[measures].sum().to_frame().T
+    return cube.groupby(list(dims), observed=True)[measures].sum().reset_index()
+
+
+def load_or_build_cube(stage, load_frame):
+    # Built once per version of a stage and persisted next to it; removed together with the stage
+    path = derived_path(stage, "cube")
+    if os.path.exists(path):
+        return read_stage(path)
+    cube = build_cube(load_frame())
+    directory, name = os.path.split(path)
+    write_stage(directory, os.path.splitext(name)[0], cube)
+    return cube
+
+
+def top_k(df, by, k, tie_breaker=None):
+    # Largest k rows by `by` without sorting the whole frame: argpartition finds the k-th
+    # value, then only rows at or above it are sorted. Ties are broken on `tie_breaker`
+    # ascending (then on position), so the result is deterministic.
+    if k <= 0 or df.empty:
+        return df.iloc[0:0]
+    sort_cols = [by] + ([tie_breaker] if tie_breaker else [])
+    ascending = [False] + ([True] if tie_breaker else [])
+    if k < len(df):
+        values = df[by].to_numpy(dtype="float64", na_value=np.nan)
+        values = np.where(np.isnan(values), -np.inf, values)
+        kth = values[np.argpartition(-values, k - 1)[k - 1]]
+        df = df.iloc[np.flatnonzero(values >= kth)]
+    return df.sort_values(sort_cols, ascending=ascending, kind="mergesort", na_position="last").head(k)
+
+
+# Report -> key column used to break ties when ranking by Sales Amt
+REPORT_KEYS = {
+    "Top Customers": "Dealer_Name",
+    "Product Performance": "Mat Desc",
+    "Sales by Region": "State",
+    "Drill-down": None,
+    "Sales Summary": None,
+}
+
+
+def report_top(report_name, df, k):
+    # The first k rows of a report in display order, without sorting the rest
+    if report_name == "Sales Summary":
+        return df.sort_values(by=["Year", "Month"]).head(k).reset_index(drop=True)
+    return top_k(df, "Sales Amt", k, tie_breaker=REPORT_KEYS.get(report_name)).reset_index(drop=True)
+
+
+def sorted_report(report_name, df):
+    # Full ordering, only built when a report is exported
+    return report_top(report_name, df, len(df))
@@ -0,0 +1,106 @@
+import math
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from filter_index import FilterIndex
+
+
+# Large tables are shown a page at a time: sorting and search run here against the frame's
+# FilterIndex, and only the rows of the visible page are serialised and sent to the browser.
+PAGE_SIZES = [25, 50, 100, 500]
+DEFAULT_PAGE_SIZE = 50
+NO_SORT = "(none)"
+
+
+def grid_index(df, key, data_key):
+    # One FilterIndex per dataset version, shared by every grid showing rows of it (sort orders
+    # are built per column on first use). An index holds its whole frame, so only the versions
+    # some grid of the session currently shows are kept.
+    shown = st.session_state.setdefault("grid_shown", {})
+    indexes = st.session_state.setdefault("grid_indexes", {})
+    shown[key] = data_key
+    if data_key not in indexes:
+        indexes[data_key] = FilterIndex(df)
+    for stale in set(indexes) - set(shown.values()):
+        del indexes[stale]
+    return indexes[data_key]
+
+
+def view_positions(index, rows=None, search_col=None, text="", sort_col=None, descending=False):
+    # Row positions of the view in display order; None means every row in frame order
+    searching = bool(search_col and text.strip())
+    if not searching and not sort_col:
+        return None if rows is None else np.asarray(rows)
+    mask = None
+    if rows is not None:
+        mask = np.zeros(index.n, dtype=bool)
+        mask[rows] = True
+    if searching:
+        hits = index.search(search_col, text)
+        mask = hits if mask is None else mask & hits
+    if not sort_col:
+        return np.flatnonzero(mask)
+    order = index.order(sort_col, descending)
+    return order if mask is None else order[mask[order]]
+
+
+def page_frame(df, positions, start, stop):
+    page = df.iloc[start:stop] if positions is None else df.iloc[positions[start:stop]]
+    # A categorical column would ship its whole dictionary with the page
+    categorical = [col for col in page.columns if isinstance(page[col].dtype, pd.CategoricalDtype)]
+    return page.astype({col: page[col].cat.categories.dtype for col in categorical})
+
+
+def _first_page(key):
+    st.session_state[f"{key}_page"] = 1
+
+
+def show_grid(df, key, data_key, rows=None):
+    # Paginated table over df (or only the row positions in rows); data_key identifies the
+    # dataset version the index is built for
+    index = grid_index(df, key, data_key)
+    columns = list(index.df.columns)
+
+    search_col_box, search_box, sort_box, order_box = st.columns([2, 3, 2, 1])
+    search_col = search_col_box.selectbox(
+        "Search in", columns, key=f"{key}_search_col", on_change=_first_page, args=(key,)
+    )
+    text = search_box.text_input(
+        "Search", key=f"{key}_search", on_change=_first_page, args=(key,),
+        placeholder="Text, a number, or >, >=, <, <= a number",
+    )
+    sort_col = sort_box.selectbox(
+        "Sort by", [NO_SORT] + columns, key=f"{key}_sort", on_change=_first_page, args=(key,)
+    )
+    descending = order_box.toggle("Desc", key=f"{key}_desc", on_change=_first_page, args=(key,))
+
+    # The view is reused across reruns that only change the page
+    signature = (data_key, search_col, text, sort_col, descending)
+    cached = st.session_state.get(f"{key}_view")
+    if cached is not None and cached[0] == signature and cached[1] is rows:
+        positions = cached[2]
+    else:
+        positions = view_positions(index, rows, search_col, text, None if sort_col == NO_SORT else sort_col, descending)
+        st.session_state[f"{key}_view"] = (signature, rows, positions)
+    total = index.n if positions is None else len(positions)
+    base = index.n if rows is None else len(rows)
+
+    size_box, page_box, count_box = st.columns([1, 1, 3])
+    size = size_box.selectbox(
+        "Rows per page", PAGE_SIZES, index=PAGE_SIZES.index(DEFAULT_PAGE_SIZE),
+        key=f"{key}_size", on_change=_first_page, args=(key,)
+    )
+    pages = max(1, math.ceil(total / size))
+    if st.session_state.get(f"{key}_page", 1) > pages:
+        st.session_state[f"{key}_page"] = pages
+    page = page_box.number_input("Page", min_value=1, max_value=pages, step=1, key=f"{key}_page")
+
+    start = (page - 1) * size
+    stop = min(start + size, total)
+    st.dataframe(page_frame(index.df, positions, start, stop), use_container_width=True)
+    count = f"Page {page:,} of {pages:,}: rows {start + 1:,}–{stop:,} of {total:,}" if total else "No matching rows"
+    if total != base:
+        count += f" (filtered from {base:,})"
+    count_box.caption(count)
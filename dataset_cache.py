@@ -0,0 +1,108 @@
+import os
+import threading
+import uuid
+from collections import OrderedDict
+
+import pandas as pd
+
+from store import STORE_ROOT
+
+
+# Uploaded datasets are shared by every session of the process, keyed by the hash of the file
+# contents, so memory grows with distinct datasets rather than with concurrent users.
+DATASET_CACHE_BYTES = int(os.environ.get("DATASET_CACHE_MB", 2048)) * 2 ** 20
+DATASET_SPILL_DIR = os.environ.get("DATASET_SPILL_DIR", os.path.join(STORE_ROOT, "datasets"))
+
+
+def frame_bytes(df):
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+if int(pd.__version__.split(".")[0]) < 3:
+    # shared_view depends on it; pandas 3 always copies on write
+    pd.options.mode.copy_on_write = True
+
+
+def shared_view(df):
+    # Sessions get a shallow copy: with copy-on-write, writing to it copies the touched
+    # columns and never changes the cached frame
+    return df.copy(deep=False)
+
+
+class DatasetCache:
+    # key -> {"frame", "profile", "bytes", "path"}, least recently used first. Past the memory
+    # budget the oldest frames are written to Parquet and dropped from memory (their profile
+    # stays); the next request reads them back. A frame is never spilled to make room for
+    # itself, so one dataset larger than the budget still loads.
+    def __init__(self, budget=DATASET_CACHE_BYTES, spill_dir=DATASET_SPILL_DIR):
+        self.budget = budget
+        self.spill_dir = spill_dir
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._loading = {}
+        self.hits = self.misses = self.spills = self.restores = 0
+
+    def get_or_load(self, key, loader):
+        # (frame, profile); loader() -> (frame, profile) runs once per key even when several
+        # sessions ask for the same dataset at the same time
+        with self._lock:
+            load_lock = self._loading.setdefault(key, threading.Lock())
+        with load_lock:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and entry["frame"] is not None:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return shared_view(entry["frame"]), entry["profile"]
+            if entry is not None and entry["path"] is not None and os.path.exists(entry["path"]):
+                frame, profile = pd.read_parquet(entry["path"]), entry["profile"]
+                self.restores += 1
+            else:
+                frame, profile = loader()
+                self.misses += 1
+            self._store(key, frame, profile, entry["path"] if entry is not None else None)
+            return shared_view(frame), profile
+
+    def _store(self, key, frame, profile, path):
+        with self._lock:
+            self._entries[key] = {"frame": frame, "profile": profile, "bytes": frame_bytes(frame), "path": path}
+            self._entries.move_to_end(key)
+            self._evict(keep=key)
+
+    def _evict(self, keep):
+        for key, entry in list(self._entries.items()):
+            if self.memory_bytes() <= self.budget:
+                break
+            if key == keep or entry["frame"] is None:
+                continue
+            if entry["path"] is None or not os.path.exists(entry["path"]):
+                entry["path"] = self._spill(key, entry["frame"])
+            entry["frame"] = None
+            self.spills += 1
+
+    def _spill(self, key, frame):
+        os.makedirs(self.spill_dir, exist_ok=True)
+        path = os.path.join(self.spill_dir, f"{key[:32]}.parquet")
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        frame.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, path)
+        return path
+
+    def memory_bytes(self):
+        return sum(entry["bytes"] for entry in self._entries.values() if entry["frame"] is not None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "datasets": len(self._entries),
+                "in_memory": sum(entry["frame"] is not None for entry in self._entries.values()),
+                "memory_bytes": self.memory_bytes(), "budget_bytes": self.budget,
+                "hits": self.hits, "misses": self.misses, "spills": self.spills, "restores": self.restores,
+            }
+
+    def clear(self):
+        with self._lock:
+            for entry in self._entries.values():
+                if entry["path"] and os.path.exists(entry["path"]):
+                    os.remove(entry["path"])
+            self._entries.clear()
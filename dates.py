@@ -0,0 +1,234 @@
+import json
+import os
+import re
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from store import derived_path, read_stage, write_stage
+
+
+DATE_COLUMN = "Inv Date"
+# Columns of the parsed date stage, row-aligned with the dataset it was built from
+MONTH_COLUMN = "Inv Month"
+YEAR_COLUMN = "Inv Year"
+STATUS_COLUMN = "Inv Date Status"
+DATE_COLUMNS = [DATE_COLUMN, MONTH_COLUMN, YEAR_COLUMN, STATUS_COLUMN]
+
+VALID, MISSING, INVALID = 0, 1, 2
+# Month/year code of rows without a usable date
+MISSING_CODE = np.iinfo(np.int32).min
+
+# Tried in order when inferring how a column writes its dates
+DATE_FORMATS = [
+    "%Y-%m-%d", "%d-%m-%Y", "%d/%m/%Y", "%m/%d/%Y", "%d.%m.%Y", "%Y/%m/%d",
+    "%d-%b-%Y", "%d-%b-%y", "%d %b %Y", "%Y-%m-%d %H:%M:%S", "%d/%m/%Y %H:%M", "%d-%m-%Y %H:%M:%S",
+]
+INFER_SAMPLE = 200
+
+# Shape of a sample (digits -> 9, letters -> a) -> format that parsed it
+_format_cache = {}
+
+
+def _shape_key(sample):
+    return tuple(sorted({re.sub(r"[A-Za-z]+", "a", re.sub(r"\d", "9", value)) for value in sample}))
+
+
+def _parses(sample, fmt):
+    return int(pd.to_datetime(sample, format=fmt, errors="coerce").notna().sum())
+
+
+def infer_format(values):
+    # A cached format is reused only while it still parses the whole sample, so a column
+    # written day-first is not read month-first just because it looks the same
+    sample = [value for value in values[:INFER_SAMPLE] if value]
+    if not sample:
+        return None
+    key = _shape_key(sample)
+    cached = _format_cache.get(key)
+    if cached is not None and _parses(sample, cached) == len(sample):
+        return cached
+    best, best_count = None, 0
+    for fmt in DATE_FORMATS:
+        count = _parses(sample, fmt)
+        if count > best_count:
+            best, best_count = fmt, count
+        if count == len(sample):
+            break
+    if best is not None:
+        _format_cache[key] = best
+    return best
+
+
+def ambiguous_formats(text, fmt, parsed):
+    # Other formats that also read every value parsed with fmt, but to different dates
+    # (03/04/2024 as 3 April or 4 March), as (format, dates) pairs. The inference sample
+    # breaks such ties on DATE_FORMATS order, so the caller checks them against the column.
+    if fmt is None or not len(text):
+        return []
+    read = ~np.isnat(parsed)
+    out = []
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        for other in DATE_FORMATS:
+            if other == fmt:
+                continue
+            # Most formats already fail on the first values, so the full column is rarely parsed
+            for stop in (INFER_SAMPLE, None):
+                dates = pd.to_datetime(text[:stop], format=other, errors="coerce").to_numpy(dtype="datetime64[ns]")
+                if np.isnat(dates[read[:stop]]).any():
+                    break
+            else:
+                if (dates[read] != parsed[read]).any():
+                    out.append((other, dates))
+    return out
+
+
+def _parse_mixed(values):
+    # Fallback for values the inferred format missed, each one parsed on its own
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        try:
+            parsed = pd.to_datetime(values, format="mixed", errors="coerce", utc=True)
+        except (TypeError, ValueError):
+            parsed = pd.to_datetime(values, errors="coerce", utc=True)
+    return parsed.tz_localize(None)
+
+
+def parse_dates(values):
+    # Returns (datetime64[ns] array, status array, info). Each distinct value is parsed once,
+    # which is where the time goes: invoice dates repeat across many rows.
+    series = pd.Series(values)
+    if pd.api.types.is_datetime64_any_dtype(series):
+        if getattr(series.dt, "tz", None) is not None:
+            series = series.dt.tz_convert(None)
+        parsed = series.to_numpy(dtype="datetime64[ns]")
+        status = np.where(np.isnat(parsed), MISSING, VALID).astype(np.int8)
+        return parsed, status, _info(status, "datetime64", 0)
+
+    codes, uniques = pd.factorize(series)
+    text = pd.Index(uniques).astype(str).str.strip()
+    fmt = infer_format(list(text))
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        unique_dates = pd.to_datetime(text, format=fmt, errors="coerce").to_numpy(dtype="datetime64[ns]").copy()
+    blank = np.asarray(text == "")
+    ambiguous = ambiguous_formats(text, fmt, unique_dates)
+    best = max(ambiguous, key=lambda pair: np.count_nonzero(~np.isnat(pair[1])), default=None)
+    if best is not None and np.count_nonzero(~np.isnat(best[1])) > np.count_nonzero(~np.isnat(unique_dates)):
+        # Values past the sample settle the tie: e.g. 01/25/2024 makes the column month-first
+        fmt, unique_dates = best[0], best[1].copy()
+        ambiguous = ambiguous_formats(text, fmt, unique_dates)
+    retry = np.isnat(unique_dates) & ~blank
+    if retry.any():
+        unique_dates[retry] = _parse_mixed(text[retry]).to_numpy(dtype="datetime64[ns]")
+
+    unique_status = np.where(blank, MISSING, np.where(np.isnat(unique_dates), INVALID, VALID))
+    # Index -1 (a null in the input) picks the appended NaT / MISSING entry
+    parsed = np.append(unique_dates, np.datetime64("NaT", "ns"))[codes]
+    status = np.append(unique_status, MISSING).astype(np.int8)[codes]
+    fallback = int(np.count_nonzero(np.append(retry & (unique_status == VALID), False)[codes]))
+    return parsed, status, _info(status, fmt, fallback, [other for other, _ in ambiguous])
+
+
+def _info(status, fmt, fallback, ambiguous=()):
+    counts = np.bincount(status, minlength=3)
+    return {
+        "rows": int(len(status)), "valid": int(counts[VALID]), "missing": int(counts[MISSING]),
+        "invalid": int(counts[INVALID]), "format": fmt, "fallback": fallback, "ambiguous": list(ambiguous),
+    }
+
+
+def date_table(values):
+    # Parsed dates plus month (months since 1970-01) and year codes, one row per input row
+    parsed, status, info = parse_dates(values)
+    usable = status == VALID
+    months = np.where(usable, parsed.astype("datetime64[M]").view("int64"), 0)
+    table = pd.DataFrame({
+        DATE_COLUMN: parsed,
+        MONTH_COLUMN: np.where(usable, months, MISSING_CODE).astype(np.int32),
+        YEAR_COLUMN: np.where(usable, 1970 + months // 12, MISSING_CODE).astype(np.int32),
+        STATUS_COLUMN: status,
+    })
+    return table, info
+
+
+def month_starts(codes):
+    codes = np.asarray(codes)
+    out = codes.astype("int64").astype("datetime64[M]").astype("datetime64[ns]")
+    out[codes == MISSING_CODE] = np.datetime64("NaT")
+    return out
+
+
+def calendar_columns(table):
+    # Year and Month (1-12) columns from a date table, null where the date is unusable
+    months = table[MONTH_COLUMN].to_numpy()
+    unusable = months == MISSING_CODE
+    return pd.DataFrame({
+        "Year": pd.arrays.IntegerArray(table[YEAR_COLUMN].to_numpy(dtype=np.int32), unusable),
+        "Month": pd.arrays.IntegerArray((months % 12 + 1).astype(np.int32), unusable),
+    }, index=table.index)
+
+
+def with_calendar_columns(frame, table):
+    # Year/Month from the parsed dates for a frame that lacks either of them
+    missing = [col for col in ("Year", "Month") if col not in frame.columns]
+    if not missing:
+        return frame
+    return pd.concat([frame, calendar_columns(table)[missing]], axis=1)
+
+
+def month_start(df):
+    # Month of every row as a timestamp (NaT when the date is missing or invalid); uses the
+    # precomputed month codes when the frame carries them
+    if MONTH_COLUMN in df.columns:
+        return pd.Series(month_starts(df[MONTH_COLUMN].to_numpy()), index=df.index)
+    parsed, _, _ = parse_dates(df[DATE_COLUMN])
+    return pd.Series(parsed.astype("datetime64[M]").astype("datetime64[ns]"), index=df.index)
+
+
+def format_label(fmt):
+    # "%d/%m/%Y" -> "DD/MM/YYYY"
+    for code, label in [("%d", "DD"), ("%m", "MM"), ("%Y", "YYYY"), ("%y", "YY"), ("%b", "Mon"),
+                        ("%H", "hh"), ("%M", "mm"), ("%S", "ss")]:
+        fmt = fmt.replace(code, label)
+    return fmt
+
+
+def date_summary(info):
+    if not info:
+        return None
+    notes = []
+    if info["format"] not in (None, "datetime64"):
+        read_as = f"Invoice dates were read as {format_label(info['format'])}."
+        # Older date stages were saved without the ambiguity check
+        ambiguous = info.get("ambiguous") or []
+        if ambiguous:
+            others = " or ".join(format_label(fmt) for fmt in ambiguous)
+            read_as += f" Every date also fits {others}; check the dates if that is how the file writes them."
+        notes.append(read_as)
+    problems = []
+    if info["invalid"]:
+        problems.append(f"{info['invalid']:,} could not be parsed")
+    if info["missing"]:
+        problems.append(f"{info['missing']:,} are missing")
+    if problems:
+        notes.append(f"Of {info['rows']:,} invoice dates, {' and '.join(problems)}; those rows have no date.")
+    return " ".join(notes) or None
+
+
+def load_or_build_dates(stage, load_column):
+    # Parsed once per version of a stage and persisted next to it, with the parse statistics;
+    # both are removed together with the stage
+    path = derived_path(stage, "dates")
+    info_path = derived_path(stage, "dates", ".json")
+    if os.path.exists(path) and os.path.exists(info_path):
+        with open(info_path, encoding="utf-8") as f:
+            return read_stage(path), json.load(f)
+    table, info = date_table(load_column())
+    directory, name = os.path.split(path)
+    write_stage(directory, os.path.splitext(name)[0], table)
+    with open(info_path, "w", encoding="utf-8") as f:
+        json.dump(info, f)
+    return table, info
@@ -0,0 +1,325 @@
+import hashlib
+import importlib
+import os
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+import pandas as pd
+
+from dates import DATE_COLUMN, parse_dates
+from profiling import span, traced
+from sketches import DEFAULT_K, KLLSketch, dkw_rank_error, grouped_quantiles, sample_positions, sample_quantiles
+
+
+CRITICAL_COLUMNS = ["State", "Dealer", "Inv Date"]
+PRICE_TOLERANCE = 0.5
+# Rows sampled by the "sample" quantile method
+SAMPLE_SIZE = 200_000
+
+# Extra rule modules (comma separated) imported on startup; they call register_rule
+PLUGIN_ENV_VAR = "EXCEPTION_RULE_MODULES"
+
+# columns: tuple of required columns, or a callable(ctx) returning them
+# predicate: callable(ctx) -> boolean NumPy array with one entry per row
+# cost: relative evaluation cost; cheaper rules run first
+# check: checkbox label the rule is grouped under in the UI
+Rule = namedtuple("Rule", ["rule_id", "title", "columns", "predicate", "cost", "check", "bit"])
+
+RULES = OrderedDict()
+
+
+def register_rule(rule_id, title, columns, predicate=None, cost=1, check=None):
+    # Usable directly or as a decorator on the predicate
+    def _register(func):
+        if rule_id in RULES:
+            bit = RULES[rule_id].bit
+        else:
+            bit = max((rule.bit for rule in RULES.values()), default=0) << 1 or 1
+        RULES[rule_id] = Rule(rule_id, title, columns, func, cost, check or title, bit)
+        return func
+
+    if predicate is None:
+        return _register
+    return _register(predicate)
+
+
+def unregister_rule(rule_id):
+    RULES.pop(rule_id, None)
+
+
+def checks():
+    # Checkbox label -> rule ids, in registration order
+    grouped = OrderedDict()
+    for rule in RULES.values():
+        grouped.setdefault(rule.check, []).append(rule.rule_id)
+    return grouped
+
+
+def rule_title(rule_id):
+    return RULES[rule_id].title
+
+
+class ScanContext:
+    # Intermediate results (numeric arrays, parsed dates, quantiles, row hashes) are
+    # computed on first use and shared by every rule in the scan.
+    def __init__(self, df, today=None, **options):
+        self.df = df
+        self.today = pd.Timestamp.today() if today is None else pd.Timestamp(today)
+        self.options = options
+        self.estimates = {}
+        self._memo = {}
+
+    def memo(self, key, func):
+        if key not in self._memo:
+            self._memo[key] = func()
+        return self._memo[key]
+
+    def numeric(self, col):
+        return self.memo(("numeric", col), lambda: pd.to_numeric(self.df[col], errors="coerce").to_numpy(
+            dtype="float64", na_value=np.nan))
+
+    def dates(self, col=DATE_COLUMN):
+        # The app passes invoice dates already parsed for the dataset version
+        if col == DATE_COLUMN and self.options.get("dates") is not None:
+            return self.options["dates"]
+        return self.memo(("dates", col), lambda: parse_dates(self.df[col])[0])
+
+    def codes(self, col):
+        return self.memo(("codes", col), lambda: pd.factorize(self.df[col]))
+
+    def _note(self, col, group, method, rank_error):
+        self.estimates[col if group is None else f"{col} by {group}"] = {"method": method, "rank_error": rank_error}
+
+    def quartiles(self, col):
+        # In incremental mode the bounds come from the persisted sketch instead of a full sort
+        sketch = self.options.get("sketches", {}).get(col)
+        method = "persisted sketch" if sketch is not None else self.options.get("quantile_method", "exact")
+
+        def _quartiles():
+            values = self.numeric(col)
+            if not np.isfinite(values).any():
+                return np.nan, np.nan
+            if sketch is not None:
+                q1, q3 = sketch.quantiles([0.25, 0.75])
+                error = sketch.normalized_rank_error()
+            elif method == "sketch":
+                fresh = KLLSketch(self.options.get("sketch_k", DEFAULT_K)).update(values)
+                q1, q3 = fresh.quantiles([0.25, 0.75])
+                error = fresh.normalized_rank_error()
+            elif method == "sample":
+                (q1, q3), error = sample_quantiles(values, [0.25, 0.75], self.options.get("sample_size", SAMPLE_SIZE))
+            else:
+                q1, q3 = np.nanquantile(values, [0.25, 0.75])
+                error = 0.0
+            self._note(col, None, method, error)
+            return q1, q3
+        return self.memo(("quartiles", col), _quartiles)
+
+    def grouped_quartiles(self, col, group):
+        # Per-group bounds from one sort over (group, value), broadcast back to rows.
+        # Approximate methods sort a uniform sample instead of the full column.
+        method = self.options.get("quantile_method", "exact")
+
+        def _grouped():
+            codes, uniques = self.codes(group)
+            values = self.numeric(col)
+            if method == "exact":
+                bounds, _ = grouped_quantiles(values, codes, [0.25, 0.75], len(uniques))
+                error = 0.0
+            else:
+                positions = sample_positions(len(values), self.options.get("sample_size", SAMPLE_SIZE))
+                bounds, counts = grouped_quantiles(values[positions], codes[positions], [0.25, 0.75], len(uniques))
+                sampled = counts[counts > 0]
+                # The smallest sampled group has the loosest bound
+                error = dkw_rank_error(sampled.min()) if len(sampled) and len(positions) < len(values) else 0.0
+            self._note(col, group, "exact" if method == "exact" else "sample", error)
+            # Rows with a missing group get NaN bounds and are never flagged
+            bounds = np.vstack([bounds, [np.nan, np.nan]])
+            return bounds[codes, 0], bounds[codes, 1]
+        return self.memo(("grouped_quartiles", col, group), _grouped)
+
+    def row_hashes(self):
+        return self.memo("row_hashes", lambda: row_hashes(self.df))
+
+    def critical_columns(self):
+        return self.options.get("critical_columns") or CRITICAL_COLUMNS
+
+
+def row_hashes(df):
+    # One uint64 per row; equal rows hash equally, so duplicates are found on a single array.
+    # Numerics are hashed as float64 so batches loaded with different dtypes still hash the
+    # same. Integers widen exactly; float32 goes through its shortest decimal text, because
+    # widening it directly gives 1234.5699462890625 rather than the 1234.57 that was read (values
+    # with more than six significant digits were already changed by float32 and cannot be recovered).
+    widen = {}
+    for col in df.columns:
+        dtype = df[col].dtype
+        if not pd.api.types.is_numeric_dtype(dtype) or pd.api.types.is_bool_dtype(dtype) or dtype == "float64":
+            continue
+        if dtype == "float32":
+            widen[col] = df[col].astype(str).astype("float64")
+        else:
+            widen[col] = df[col].astype("float64")
+    if widen:
+        df = df.assign(**widen)
+    return pd.util.hash_pandas_object(df, index=False).to_numpy()
+
+
+def _mask_dtype(n_bits):
+    for dtype in (np.uint8, np.uint16, np.uint32):
+        if n_bits <= np.iinfo(dtype).bits:
+            return dtype
+    return np.uint64
+
+
+def _required_columns(rule, ctx):
+    return rule.columns(ctx) if callable(rule.columns) else rule.columns
+
+
+@traced("scan_exceptions", "exceptions")
+def scan_exceptions(df, rules, today=None, **options):
+    ctx = ScanContext(df, today=today, **options)
+    columns = set(df.columns)
+
+    selected = [RULES[rule_id] for rule_id in rules if rule_id in RULES]
+    runnable = [rule for rule in selected if columns.issuperset(_required_columns(rule, ctx))]
+    skipped = [rule.rule_id for rule in selected if rule not in runnable]
+
+    n_bits = max((rule.bit for rule in RULES.values()), default=1).bit_length()
+    mask = np.zeros(len(df), dtype=_mask_dtype(n_bits))
+    hits = {}
+
+    # Cheap rules first; anything they compute is reused by the expensive ones
+    for rule in sorted(runnable, key=lambda r: r.cost):
+        with span(rule.rule_id, "exception_rule") as info:
+            hit = np.asarray(rule.predicate(ctx), dtype=bool)
+            mask[hit] |= rule.bit
+            hits[rule.rule_id] = np.flatnonzero(hit)
+            info["rows"] = len(hits[rule.rule_id])
+
+    # Report in registration order regardless of evaluation order
+    hits = {rule_id: hits[rule_id] for rule_id in RULES if rule_id in hits}
+    return {"mask": mask, "hits": hits, "skipped": skipped, "rows": len(df), "estimates": ctx.estimates}
+
+
+def exception_rows(df, scan, rule_id):
+    # Rows are only materialised here, when a report is displayed or exported
+    return df.iloc[scan["hits"][rule_id]]
+
+
+def exception_reports(df, scan):
+    return {rule_title(rule_id): exception_rows(df, scan, rule_id) for rule_id in scan["hits"]}
+
+
+def rule_counts(scan):
+    return {rule_title(rule_id): len(idx) for rule_id, idx in scan["hits"].items()}
+
+
+def scan_fingerprint(scan, dataset_key):
+    digest = hashlib.sha1(str(dataset_key).encode("utf-8"))
+    for rule_id, idx in scan["hits"].items():
+        digest.update(rule_id.encode("utf-8"))
+        digest.update(idx.tobytes())
+    return digest.hexdigest()
+
+
+# --- Built-in rules
+
+def _iqr_outliers(ctx, col):
+    values = ctx.numeric(col)
+    group = ctx.options.get("outlier_group")
+    q1, q3 = ctx.grouped_quartiles(col, group) if group else ctx.quartiles(col)
+    iqr = q3 - q1
+    with np.errstate(invalid="ignore"):
+        return (values < q1 - 1.5 * iqr) | (values > q3 + 1.5 * iqr)
+
+
+def _outlier_columns(col):
+    def _columns(ctx):
+        group = ctx.options.get("outlier_group")
+        return (col, group) if group else (col,)
+    return _columns
+
+
+@register_rule("negatives", "Negative Sales or Qty", ("Sales Amt", "Qty"), cost=1,
+               check="Negative Sales or Quantity")
+def _negatives(ctx):
+    return (ctx.numeric("Sales Amt") < 0) | (ctx.numeric("Qty") < 0)
+
+
+@register_rule("duplicates", "Duplicate Rows", (), cost=4)
+def _duplicates(ctx):
+    hashes = ctx.row_hashes()
+    duplicated = pd.Series(hashes).duplicated().to_numpy()
+    # Incremental mode: rows already seen in earlier batches are duplicates too
+    index = ctx.options.get("hash_index")
+    if index is not None:
+        duplicated = duplicated | index.contains(hashes)
+    return duplicated
+
+
+@register_rule("missing_fields", "Missing Critical Fields", lambda ctx: ctx.critical_columns(), cost=1)
+def _missing_fields(ctx):
+    return ctx.df[ctx.critical_columns()].isnull().to_numpy().any(axis=1)
+
+
+@register_rule("outliers_sales", "Outliers in Sales Amt", _outlier_columns("Sales Amt"), cost=2,
+               check="Outliers in Sales Amt or Qty")
+def _outliers_sales(ctx):
+    return _iqr_outliers(ctx, "Sales Amt")
+
+
+@register_rule("outliers_qty", "Outliers in Qty", _outlier_columns("Qty"), cost=2,
+               check="Outliers in Sales Amt or Qty")
+def _outliers_qty(ctx):
+    return _iqr_outliers(ctx, "Qty")
+
+
+@register_rule("invalid_dates", "Future/Invalid Dates", ("Inv Date",), cost=3, check="Invalid Invoice Dates")
+def _invalid_dates(ctx):
+    return ctx.dates("Inv Date") > ctx.today.to_datetime64()
+
+
+@register_rule("mismatch_sales_qty", "Zero Qty / Non-zero Sales Mismatch", ("Sales Amt", "Qty"), cost=1,
+               check="Zero Qty with non-zero Sales or vice versa")
+def _mismatch_sales_qty(ctx):
+    sales, qty = ctx.numeric("Sales Amt"), ctx.numeric("Qty")
+    return ((qty == 0) & (sales != 0)) | ((sales == 0) & (qty != 0))
+
+
+@register_rule("price_out_of_band", "Unit Price Out of Band", ("Sales Amt", "Qty", "Mat Desc"), cost=3,
+               check="Price per Unit out of Band")
+def _price_out_of_band(ctx):
+    # Unit price compared with the median unit price of the same product
+    sales, qty = ctx.numeric("Sales Amt"), ctx.numeric("Qty")
+    with np.errstate(divide="ignore", invalid="ignore"):
+        unit_price = np.where(qty > 0, sales / qty, np.nan)
+    codes, _ = ctx.codes("Mat Desc")
+    median = pd.Series(unit_price).groupby(codes).transform("median").to_numpy()
+    tolerance = ctx.options.get("price_tolerance", PRICE_TOLERANCE)
+    with np.errstate(invalid="ignore"):
+        return (codes >= 0) & (np.abs(unit_price - median) > tolerance * np.abs(median))
+
+
+@register_rule("dealer_state_mismatch", "Dealer/State Mismatch", ("Dealer", "State"), cost=3)
+def _dealer_state_mismatch(ctx):
+    # A dealer is expected to trade from one state: flag rows away from the dealer's usual state
+    dealers, _ = ctx.codes("Dealer")
+    states, _ = ctx.codes("State")
+    valid = (dealers >= 0) & (states >= 0)
+    pairs = pd.DataFrame({"dealer": dealers[valid], "state": states[valid]})
+    counts = pairs.value_counts().reset_index(name="n").sort_values(["dealer", "n"], ascending=[True, False])
+    usual = counts.drop_duplicates("dealer").set_index("dealer")["state"]
+    expected = usual.reindex(dealers).to_numpy()
+    return valid & (states != expected)
+
+
+def load_rule_plugins(modules=None):
+    modules = modules if modules is not None else os.environ.get(PLUGIN_ENV_VAR, "")
+    if isinstance(modules, str):
+        modules = [name.strip() for name in modules.split(",") if name.strip()]
+    for name in modules:
+        importlib.import_module(name)
+
+
+load_rule_plugins()
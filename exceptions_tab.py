@@ -1,83 +1,91 @@
 import streamlit as st
 import pandas as pd
-import tempfile
-import os
 
-def show_exceptions_tab(mapped_df):
-    st.header("Sales Data Exception Reports")
+from exception_engine import (
+    CRITICAL_COLUMNS, checks, exception_rows, rule_title, scan_exceptions, scan_fingerprint,
+)
+from data_grid import show_grid
+from dates import DATE_COLUMN, date_summary
+from exports import download_on_demand, reports_fingerprint, table_export
 
-    st.write("Select exception types to generate reports:")
-    options = {
-        "Negative Sales or Quantity": "negatives",
-        "Duplicate Rows": "duplicates",
-        "Missing Critical Fields": "missing_fields",
-        "Outliers in Sales Amt or Qty": "outliers",
-        "Invalid Invoice Dates": "invalid_dates",
-        "Zero Qty with non-zero Sales or vice versa": "mismatch_sales_qty"
+QUANTILE_METHODS = {
+    "Exact": "exact",
+    "Approximate (quantile sketch)": "sketch",
+    "Approximate (random sample)": "sample",
+}
+
+
+def exception_sheets(mapped_df, scan):
+    # Rows for a sheet are only taken from the frame when the writer reaches it
+    return {
+        rule_title(rule): (lambda rule=rule: exception_rows(mapped_df, scan, rule))
+        for rule in scan["hits"]
     }
 
-    selected = [opt for opt in options if st.checkbox(opt)]
 
-    reports = {}
+def show_exceptions_tab(mapped_df, dataset_key=None, dates=None, date_info=None):
+    st.header("Sales Data Exception Reports")
 
-    if "Negative Sales or Quantity" in selected:
-        negatives = mapped_df[(mapped_df["Sales Amt"] < 0) | (mapped_df["Qty"] < 0)]
-        reports["Negative Sales or Qty"] = negatives
+    st.write("Select exception types to generate reports:")
 
-    if "Duplicate Rows" in selected:
-        duplicates = mapped_df[mapped_df.duplicated()]
-        reports["Duplicate Rows"] = duplicates
+    options = checks()
+    selected = [opt for opt in options if st.checkbox(opt)]
+    rules = [rule for opt in selected for rule in options[opt]]
 
+    critical_cols = CRITICAL_COLUMNS
     if "Missing Critical Fields" in selected:
-        critical_cols = ["State", "Dealer", "Inv Date"]
-        missing = mapped_df[mapped_df[critical_cols].isnull().any(axis=1)]
-        reports["Missing Critical Fields"] = missing
+        critical_cols = st.multiselect(
+            "Critical fields",
+            options=list(mapped_df.columns),
+            default=[col for col in CRITICAL_COLUMNS if col in mapped_df.columns]
+        )
 
+    scan_options = {"critical_columns": critical_cols}
     if "Outliers in Sales Amt or Qty" in selected:
-        for col in ["Sales Amt", "Qty"]:
-            q1 = mapped_df[col].quantile(0.25)
-            q3 = mapped_df[col].quantile(0.75)
-            iqr = q3 - q1
-            outliers = mapped_df[(mapped_df[col] < (q1 - 1.5 * iqr)) | (mapped_df[col] > (q3 + 1.5 * iqr))]
-            reports[f"Outliers in {col}"] = outliers
-
-    if "Invalid Invoice Dates" in selected and "Inv Date" in mapped_df.columns:
-        mapped_df['Inv Date'] = pd.to_datetime(mapped_df['Inv Date'], errors='coerce')
-        invalid_dates = mapped_df[mapped_df['Inv Date'] > pd.Timestamp.today()]
-        reports["Future/Invalid Dates"] = invalid_dates
-
-    if "Zero Qty with non-zero Sales or vice versa" in selected:
-        mismatch = mapped_df[((mapped_df['Qty'] == 0) & (mapped_df['Sales Amt'] != 0)) | 
-                             ((mapped_df['Sales Amt'] == 0) & (mapped_df['Qty'] != 0))]
-        reports["Zero Qty / Non-zero Sales Mismatch"] = mismatch
-
-    for title, data in reports.items():
-        st.subheader(title)
-        st.dataframe(data)
-
-    if reports:
-        if st.button("Export Reports to Excel"):
-            # Create a temp file manually (without 'with' block to avoid locking on Windows)
-            tmp_file = tempfile.NamedTemporaryFile(delete=False, suffix=".xlsx")
-            output_path = tmp_file.name
-            tmp_file.close()  # Explicitly close so it’s not locked on Windows
-
-            try:
-                # Write Excel file
-                with pd.ExcelWriter(output_path, engine='xlsxwriter') as writer:
-                    for title, df in reports.items():
-                        df.to_excel(writer, sheet_name=title[:31], index=False)
-
-                # Read and allow download
-                with open(output_path, "rb") as f:
-                    st.download_button(
-                        "Download Excel File",
-                        f.read(),
-                        file_name="exception_reports.xlsx",
-                        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-                    )
-            finally:
-                # Clean up the file afterwards
-                os.remove(output_path)
+        method = st.selectbox("Outlier bounds", options=list(QUANTILE_METHODS))
+        group = st.selectbox("Compute outlier bounds per", options=["All rows", "State", "Mat Desc"])
+        scan_options["quantile_method"] = QUANTILE_METHODS[method]
+        scan_options["outlier_group"] = None if group == "All rows" else group
+
+    # One pass over the frame for all selected checks; reused across reruns of the same dataset
+    if dataset_key is None:
+        dataset_key = reports_fingerprint({"data": mapped_df})
+    scan_key = (dataset_key, tuple(rules), repr(sorted(scan_options.items())), pd.Timestamp.today().date())
+    cached = st.session_state.get("exception_scan")
+    if cached is not None and cached[0] == scan_key:
+        scan = cached[1]
+    else:
+        parsed = dates[DATE_COLUMN].to_numpy() if dates is not None else None
+        scan = scan_exceptions(mapped_df, rules, dates=parsed, **scan_options)
+        st.session_state["exception_scan"] = (scan_key, scan)
+
+    if date_summary(date_info):
+        st.caption(date_summary(date_info))
+
+    for rule in scan["skipped"]:
+        st.warning(f"Skipped '{rule_title(rule)}': required columns are missing.")
+
+    for col, estimate in scan["estimates"].items():
+        if estimate["rank_error"]:
+            st.caption(f"{col}: bounds from {estimate['method']}, quantile rank error ≤ {estimate['rank_error']:.2%} (99% confidence)")
+
+    for rule in scan["hits"]:
+        st.subheader(rule_title(rule))
+        # Only the visible page of a rule's rows is materialised
+        show_grid(mapped_df, f"exceptions_{rule}", ("exceptions", dataset_key), rows=scan["hits"][rule])
+
+    if scan["hits"]:
+        builder, file_name, mime = table_export(
+            exception_sheets(mapped_df, scan), [len(idx) for idx in scan["hits"].values()], "exception_reports"
+        )
+        download_on_demand(
+            "Download Excel File" if file_name.endswith(".xlsx") else "Download Exception Bundle (zip)",
+            f"exceptions_export:{scan_fingerprint(scan, dataset_key)}",
+            builder,
+            file_name=file_name,
+            mime=mime,
+            widget_key="exceptions_excel",
+            prepare_label="Export Reports to Excel"
+        )
     else:
         st.info("No exception types selected.")
@@ -0,0 +1,228 @@
+import hashlib
+import json
+import os
+import threading
+import zipfile
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from io import BytesIO
+
+import pandas as pd
+import streamlit as st
+import xlsxwriter
+
+
+# Built payloads are shared by every session in the process and keyed on the
+# content they were built from, so identical reports are only rendered once.
+MAX_PAYLOAD_BYTES = 256 * 1024 * 1024
+
+_payloads = OrderedDict()
+_payload_bytes = 0
+# key -> number of download widgets (across all sessions) currently showing it
+_holders = {}
+_lock = threading.Lock()
+
+
+def frame_fingerprint(df, digest=None):
+    digest = digest or hashlib.sha1()
+    digest.update(json.dumps([str(col) for col in df.columns]).encode("utf-8"))
+    digest.update(pd.util.hash_pandas_object(df, index=False).values.tobytes())
+    return digest
+
+
+def reports_fingerprint(reports, filters=None):
+    digest = hashlib.sha1()
+    for name, df in reports.items():
+        digest.update(name.encode("utf-8"))
+        frame_fingerprint(df, digest)
+    if filters is not None:
+        digest.update(json.dumps(filters, sort_keys=True, default=str).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def excel_sheet_name(name):
+    # Excel rejects []:*?/\ in sheet names and caps them at 31 characters
+    for char in '[]:*?/\\':
+        name = name.replace(char, "-")
+    return name[:31]
+
+
+def csv_bytes(df):
+    return df.to_csv(index=False).encode("utf-8")
+
+
+# --- Table exports
+
+EXCEL_MAX_ROWS = 1_048_576
+EXCEL_CHUNK_ROWS = 10_000
+# Above this many rows in total the export becomes a zip of per-sheet files
+BUNDLE_ROW_THRESHOLD = int(os.environ.get("EXPORT_BUNDLE_ROWS", 3_000_000))
+EXPORT_WORKERS = min(4, os.cpu_count() or 1)
+
+XLSX_MIME = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+ZIP_MIME = "application/zip"
+
+
+def _frame(table):
+    # Sheets may be given lazily as callables so only one is materialised at a time
+    return table() if callable(table) else table
+
+
+def _sheet_names(name, n_parts, used):
+    base = excel_sheet_name(name)
+    for part in range(n_parts):
+        sheet = base if n_parts == 1 else f"{base[:25]} ({part + 1})"
+        while sheet in used:
+            sheet = f"{sheet[:28]}_{len(used)}"
+        used.add(sheet)
+        yield sheet
+
+
+def _cell_rows(chunk):
+    # Python scalars with NaN/NaT as None, which xlsxwriter writes as blank cells
+    columns = []
+    for col in chunk.columns:
+        values = chunk[col].astype(object).where(chunk[col].notna(), None)
+        columns.append(values.tolist())
+    return zip(*columns)
+
+
+def write_excel(sheets, output=None):
+    # constant_memory flushes each row to the worksheet's temp file as soon as the next
+    # row starts, so memory stays flat however long the sheet is. Sheets longer than
+    # Excel's row limit continue on "<name> (2)", "<name> (3)", ...
+    output = output or BytesIO()
+    workbook = xlsxwriter.Workbook(output, {"constant_memory": True})
+    date_format = workbook.add_format({"num_format": "yyyy-mm-dd"})
+    used = set()
+    rows_per_sheet = EXCEL_MAX_ROWS - 1
+
+    for name, table in sheets.items():
+        df = _frame(table)
+        n_parts = max(1, -(-len(df) // rows_per_sheet))
+        for part, sheet_name in enumerate(_sheet_names(name, n_parts, used)):
+            worksheet = workbook.add_worksheet(sheet_name)
+            worksheet.write_row(0, 0, [str(col) for col in df.columns])
+            for col, dtype in enumerate(df.dtypes):
+                if pd.api.types.is_datetime64_any_dtype(dtype):
+                    worksheet.set_column(col, col, 12, date_format)
+
+            start = part * rows_per_sheet
+            stop = min(start + rows_per_sheet, len(df))
+            row_number = 1
+            for chunk_start in range(start, stop, EXCEL_CHUNK_ROWS):
+                chunk = df.iloc[chunk_start:min(chunk_start + EXCEL_CHUNK_ROWS, stop)]
+                for values in _cell_rows(chunk):
+                    worksheet.write_row(row_number, 0, values)
+                    row_number += 1
+        del df
+
+    workbook.close()
+    return output.getvalue() if isinstance(output, BytesIO) else output
+
+
+def _encode_member(name, table, fmt):
+    df = _frame(table)
+    buf = BytesIO()
+    if fmt == "parquet":
+        df.to_parquet(buf, index=False)
+    else:
+        df.to_csv(buf, index=False)
+    return f"{excel_sheet_name(name)}.{fmt}", buf.getvalue()
+
+
+def write_bundle(sheets, fmt="parquet"):
+    # Members are encoded concurrently (the Arrow/CSV writers release the GIL) and
+    # written to the archive as they finish.
+    output = BytesIO()
+    compression = zipfile.ZIP_STORED if fmt == "parquet" else zipfile.ZIP_DEFLATED
+    with zipfile.ZipFile(output, "w", compression=compression) as archive:
+        with ThreadPoolExecutor(max_workers=EXPORT_WORKERS) as pool:
+            futures = [pool.submit(_encode_member, name, table, fmt) for name, table in sheets.items()]
+            for future in as_completed(futures):
+                member, data = future.result()
+                archive.writestr(member, data)
+    return output.getvalue()
+
+
+def table_export(sheets, row_counts, base_name, bundle_format="parquet"):
+    # Picks the format up front from the row counts: (builder, file name, mime)
+    if sum(row_counts) > BUNDLE_ROW_THRESHOLD:
+        return (lambda: write_bundle(sheets, bundle_format)), f"{base_name}.zip", ZIP_MIME
+    return (lambda: write_excel(sheets)), f"{base_name}.xlsx", XLSX_MIME
+
+
+def _as_bytes(payload):
+    if hasattr(payload, "getvalue"):
+        payload = payload.getvalue()
+    if isinstance(payload, str):
+        payload = payload.encode("utf-8")
+    return bytes(payload)
+
+
+def _evict(key):
+    global _payload_bytes
+    payload = _payloads.pop(key, None)
+    if payload is not None:
+        _payload_bytes -= len(payload)
+
+
+def cached_payload(key):
+    with _lock:
+        payload = _payloads.get(key)
+        if payload is not None:
+            _payloads.move_to_end(key)
+        return payload
+
+
+def get_payload(key, builder, *args, **kwargs):
+    global _payload_bytes
+    payload = cached_payload(key)
+    if payload is not None:
+        return payload
+
+    payload = _as_bytes(builder(*args, **kwargs))
+    with _lock:
+        if key not in _payloads:
+            _payloads[key] = payload
+            _payload_bytes += len(payload)
+        while _payload_bytes > MAX_PAYLOAD_BYTES and len(_payloads) > 1:
+            _evict(next(iter(_payloads)))
+    return payload
+
+
+def acquire(key):
+    with _lock:
+        _holders[key] = _holders.get(key, 0) + 1
+
+
+def release(key):
+    # The payload is dropped once no widget in any session shows it any more; until then
+    # only the memory budget can evict it
+    with _lock:
+        count = _holders.get(key, 0) - 1
+        if count > 0:
+            _holders[key] = count
+        else:
+            _holders.pop(key, None)
+            _evict(key)
+
+
+def download_on_demand(label, key, builder, *args, file_name, mime, widget_key, prepare_label=None, **kwargs):
+    # Nothing is built until the user asks for it; once built the payload is served from the cache.
+    # A new key for the same widget (e.g. after a filter change) releases this session's hold on
+    # the previous payload, which is dropped if no other session still shows it.
+    previous = st.session_state.get(f"_export_{widget_key}")
+    if previous != key:
+        if previous is not None:
+            release(previous)
+        acquire(key)
+        st.session_state[f"_export_{widget_key}"] = key
+
+    payload = cached_payload(key)
+    if payload is None and st.button(prepare_label or f"Prepare {label}", key=f"prepare_{widget_key}"):
+        with st.spinner(f"Preparing {file_name}..."):
+            payload = get_payload(key, builder, *args, **kwargs)
+
+    if payload is not None:
+        st.download_button(label, payload, file_name=file_name, mime=mime, key=f"download_{widget_key}")
@@ -1,6 +1,35 @@
-import streamlit as st
+import csv
+import json
+import math
+import os
+import re
+from collections import Counter, defaultdict
 from difflib import get_close_matches
 
+import numpy as np
+import streamlit as st
+
+
+# Extra entries (thousands are fine), same shape as faq_dict in JSON, or a CSV with
+# category, question and answer columns
+FAQ_KB_PATH = os.environ.get("FAQ_KB_PATH")
+# Question words count this many times more than answer words
+QUESTION_WEIGHT = 2
+MAX_RESULTS = 3
+# Below this cosine similarity a match is not worth showing
+MIN_SCORE = 0.12
+# Question/answer pairs kept in the conversation
+CHAT_LIMIT = 30
+# Unknown query words are corrected to a known word at least this similar
+TYPO_CUTOFF = 0.75
+
+STOP_WORDS = {
+    "a", "am", "an", "and", "any", "are", "be", "but", "can", "do", "does", "e", "for", "g", "how",
+    "i", "if", "in", "is", "it", "may", "me", "my", "not", "of", "on", "or", "so", "some", "that",
+    "the", "there", "this", "to", "too", "very", "what", "when", "where", "which", "why", "will",
+    "with", "you", "your",
+}
+
 faq_dict = {
     "Data Upload & Cleaning": {
         "Why isn’t my dataset uploading?": 
@@ -92,7 +121,6 @@ faq_dict = {
 }
 
 
-# Define this first
 def get_answer(category, question, faq_dict):
     try:
         return faq_dict[category][question]
@@ -100,6 +128,133 @@ def get_answer(category, question, faq_dict):
         return "🤖 Sorry, I couldn't find that question."
 
 
+def _stem(word):
+    if word.endswith("ies") and len(word) > 4:
+        return word[:-3] + "y"
+    for suffix in ("ing", "ed", "s"):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            return word[:-len(suffix)]
+    return word
+
+
+def tokenize(text):
+    return [_stem(word) for word in re.findall(r"[a-z0-9]+", text.lower().replace("’", "'").replace("'", "")) if word not in STOP_WORDS]
+
+
+def _trigrams(word):
+    padded = f" {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class FaqIndex:
+    # TF-IDF over questions and answers, stored as an inverted index: each term maps to the
+    # entries containing it and their normalised weights, so a query only touches the
+    # postings of its own terms. A character-trigram index over the vocabulary shortlists
+    # spelling corrections for words the index has never seen.
+    def __init__(self, entries):
+        self.entries = list(entries)
+        counts = [
+            Counter(tokenize(question) * QUESTION_WEIGHT + tokenize(answer))
+            for _, question, answer in self.entries
+        ]
+        doc_freq = Counter(term for terms in counts for term in terms)
+        n = len(self.entries)
+        self.idf = {term: math.log((1 + n) / (1 + df)) + 1 for term, df in doc_freq.items()}
+
+        postings = defaultdict(lambda: ([], []))
+        for doc, terms in enumerate(counts):
+            weights = {term: (1 + math.log(tf)) * self.idf[term] for term, tf in terms.items()}
+            norm = math.sqrt(sum(w * w for w in weights.values())) or 1.0
+            for term, weight in weights.items():
+                postings[term][0].append(doc)
+                postings[term][1].append(weight / norm)
+        self.postings = {
+            term: (np.array(docs, dtype=np.int32), np.array(weights, dtype=np.float32))
+            for term, (docs, weights) in postings.items()
+        }
+        self.grams = defaultdict(set)
+        for term in self.postings:
+            for gram in _trigrams(term):
+                self.grams[gram].add(term)
+        self._corrections = {}
+
+    @classmethod
+    def from_dict(cls, faqs):
+        return cls((category, question, answer) for category, items in faqs.items() for question, answer in items.items())
+
+    def correct(self, word):
+        # Closest known word, or None; only words sharing a trigram are compared
+        if word in self.postings:
+            return word
+        if word not in self._corrections:
+            shared = Counter(term for gram in _trigrams(word) for term in self.grams.get(gram, ()))
+            candidates = [term for term, _ in shared.most_common(50)]
+            matches = get_close_matches(word, candidates, n=1, cutoff=TYPO_CUTOFF)
+            self._corrections[word] = matches[0] if matches else None
+        return self._corrections[word]
+
+    def search(self, query, limit=MAX_RESULTS, min_score=MIN_SCORE):
+        # [(score, category, question, answer)], best first
+        terms = Counter(filter(None, (self.correct(word) for word in tokenize(query))))
+        if not terms:
+            return []
+        weights = {term: (1 + math.log(tf)) * self.idf[term] for term, tf in terms.items()}
+        norm = math.sqrt(sum(w * w for w in weights.values()))
+        scores = np.zeros(len(self.entries), dtype=np.float32)
+        for term, weight in weights.items():
+            docs, doc_weights = self.postings[term]
+            scores[docs] += doc_weights * (weight / norm)
+        top = np.flatnonzero(scores >= min_score)
+        top = top[np.argsort(-scores[top], kind="stable")[:limit]]
+        return [(float(scores[doc]),) + tuple(self.entries[doc]) for doc in top]
+
+
+def load_faq(path):
+    if path.lower().endswith(".csv"):
+        faqs = defaultdict(dict)
+        with open(path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                faqs[row["category"]][row["question"]] = row["answer"]
+        return faqs
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+@st.cache_resource(show_spinner=False)
+def faq_index(kb_path=FAQ_KB_PATH):
+    # Built once per process and shared by every session
+    faqs = {category: dict(items) for category, items in faq_dict.items()}
+    if kb_path:
+        for category, items in load_faq(kb_path).items():
+            faqs.setdefault(category, {}).update(items)
+    return FaqIndex.from_dict(faqs)
+
+
+def add_exchange(question, answer):
+    # Asking the same question again moves it to the end instead of repeating it
+    chat = [pair for pair in st.session_state.chat if pair[0] != question]
+    chat.append((question, answer))
+    st.session_state.chat = chat[-CHAT_LIMIT:]
+
+
+def answer_query(query):
+    results = faq_index().search(query)
+    if not results:
+        return "🤖 Sorry, I couldn't find an answer to that. Try other words or pick a suggested question."
+    score, _, question, answer = results[0]
+    reply = f"{answer}\n\n_Matched: “{question}” (score {score:.2f})_"
+    if len(results) > 1:
+        related = "; ".join(f"“{q}” ({s:.2f})" for s, _, q, _ in results[1:])
+        reply += f"\n\n_Related: {related}_"
+    return reply
+
+
+def _ask_suggested():
+    category = st.session_state.get("faq_category")
+    question = st.session_state.get("faq_question")
+    if category and question:
+        add_exchange(question, get_answer(category, question, faq_dict))
+
 
 def show_faq_tab():
     st.title("🤖 FAQ Bot")
@@ -111,31 +266,34 @@ def show_faq_tab():
     if "chat" not in st.session_state:
         st.session_state.chat = []
 
+    # Free-text question; chat_input returns it only on the run it was submitted
+    query = st.chat_input("Ask a question about uploads, exceptions, reports or forecasts")
+    if query and query.strip():
+        add_exchange(query.strip(), answer_query(query))
+
     st.markdown("#### 💡 Suggested Questions")
 
     # Step 1: Category selection
     selected_category = st.selectbox(
         "Choose a category:",
         options=[""] + list(faq_dict.keys()),
-        index=0
+        index=0,
+        key="faq_category"
     )
 
-    # Step 2: Question selection within the category
+    # Step 2: Question selection within the category; answered once, when it is picked
     if selected_category:
         questions = list(faq_dict[selected_category].keys())
-        selected_question = st.selectbox(
+        st.selectbox(
             "Now choose a question:",
             options=[""] + questions,
-            index=0
+            index=0,
+            key="faq_question",
+            on_change=_ask_suggested
         )
 
-        # Step 3: Show answer and add to chat
-        if selected_question:
-            answer = get_answer(selected_category, selected_question, faq_dict)
-            st.session_state.chat.append(("You", selected_question))
-            st.session_state.chat.append(("Bot", answer))
-
-    # Step 4: Display chat history
+    # Step 3: Display chat history
     st.markdown("### 💬 Conversation")
-    for speaker, msg in st.session_state.chat:
-        st.markdown(f"**{speaker}:** {msg}")
\ No newline at end of file
+    for question, answer in st.session_state.chat:
+        st.markdown(f"**You:** {question}")
+        st.markdown(f"**Bot:** {answer}")
@@ -0,0 +1,226 @@
+import numpy as np
+import pandas as pd
+
+
+# Columns with more distinct values than this are filtered with a plain comparison instead
+MAX_INDEX_VALUES = 65_536
+# Below this fraction of the rows, building a mask from row positions beats a full pass
+SCATTER_FRACTION = 1 / 16
+
+
+def _reversed_groups(order, starts):
+    # order is split into runs of equal values beginning at starts; the runs are put in
+    # reverse order and each keeps its rows in row order, so no second sort is needed
+    if not len(order):
+        return order
+    ends = np.append(starts[1:], len(order))
+    group = np.repeat(np.arange(len(starts)), ends - starts)
+    out = np.empty_like(order)
+    out[(len(order) - ends[group]) + (np.arange(len(order)) - starts[group])] = order
+    return out
+
+
+class FilterIndex:
+    # Built once per dataset version so filter widgets and filters never rescan the frame.
+    # Low-cardinality columns get category codes plus the row positions of every value
+    # (grouped by value, CSR style); range columns get the row order sorted by value, so a
+    # threshold is one binary search. Per-column structures are built on first use.
+    def __init__(self, df):
+        self.df = df
+        self.n = len(df)
+        self._values = {}
+        self._sorted = {}
+        self._memo = {}
+
+    # --- Value (categorical) index
+
+    def _value_index(self, col):
+        if col not in self._values:
+            codes, uniques = pd.factorize(self.df[col], sort=True)
+            if len(uniques) > MAX_INDEX_VALUES:
+                self._values[col] = None
+            else:
+                codes = codes.astype(np.int16 if len(uniques) < 2 ** 15 else np.int32)
+                order = np.argsort(codes, kind="stable")
+                counts = np.bincount(codes + 1, minlength=len(uniques) + 1)
+                offsets = np.concatenate([[0], np.cumsum(counts)])
+                self._values[col] = {
+                    "codes": codes, "values": np.asarray(uniques), "lookup": pd.Index(uniques),
+                    "positions": order.astype(np.int32 if self.n < 2 ** 31 else np.int64),
+                    # offsets[code + 1]: null rows (code -1) come first
+                    "offsets": offsets,
+                }
+        return self._values[col]
+
+    def domain(self, col, within=None):
+        # Sorted distinct non-null values, optionally only those on rows matching within=(col, values)
+        entry = self._value_index(col)
+        if entry is None or (within is not None and self._value_index(within[0]) is None):
+            values = self.df[col] if within is None else self.df[col][self.isin(*within)]
+            return sorted(values.dropna().unique())
+        if within is None:
+            return entry["values"].tolist()
+        selected = self._lookup(self._value_index(within[0]), within[1])
+        return entry["values"][self._presence(within[0], col)[selected].any(axis=0)].tolist()
+
+    def isin(self, col, values):
+        # Boolean mask of rows whose value is in `values`; nulls never match, as with Series.isin
+        entry = self._value_index(col)
+        if entry is None:
+            return self.df[col].isin(values).to_numpy()
+        codes = self._lookup(entry, values)
+        offsets = entry["offsets"]
+        selected_rows = int((offsets[codes + 2] - offsets[codes + 1]).sum())
+        if selected_rows < self.n * SCATTER_FRACTION:
+            mask = np.zeros(self.n, dtype=bool)
+            for code in codes:
+                mask[entry["positions"][offsets[code + 1]:offsets[code + 2]]] = True
+            return mask
+        lookup = np.zeros(len(entry["values"]) + 1, dtype=bool)
+        lookup[codes + 1] = True
+        return lookup[entry["codes"] + 1]
+
+    def _lookup(self, entry, values):
+        # Codes of the given values, ignoring values the column does not have
+        codes = entry["lookup"].get_indexer(pd.Index(list(values)))
+        return np.unique(codes[codes >= 0])
+
+    def _presence(self, by, col):
+        # (values of by) x (values of col): which pairs occur on some row
+        key = ("presence", by, col)
+        if key not in self._memo:
+            a, b = self._value_index(by), self._value_index(col)
+            present = np.zeros((len(a["values"]), len(b["values"])), dtype=bool)
+            both = (a["codes"] >= 0) & (b["codes"] >= 0)
+            present[a["codes"][both], b["codes"][both]] = True
+            self._memo[key] = present
+        return self._memo[key]
+
+    # --- Range index
+
+    def _range_index(self, col):
+        if col not in self._sorted:
+            values = pd.to_numeric(self.df[col], errors="coerce").to_numpy(dtype="float64", na_value=np.nan)
+            order = np.argsort(values, kind="stable")
+            n_valid = int(np.count_nonzero(~np.isnan(values)))
+            self._sorted[col] = {"values": values, "order": order[:n_valid], "sorted": values[order[:n_valid]]}
+        return self._sorted[col]
+
+    def above(self, col, threshold):
+        # Rows with value > threshold, like df[col] > threshold
+        entry = self._range_index(col)
+        start = np.searchsorted(entry["sorted"], threshold, side="right")
+        if len(entry["sorted"]) - start < self.n * SCATTER_FRACTION:
+            mask = np.zeros(self.n, dtype=bool)
+            mask[entry["order"][start:]] = True
+            return mask
+        return entry["values"] > threshold
+
+    def value_range(self, col, within=None):
+        # (min, max) of a range column, optionally over rows matching within=(col, values)
+        entry = self._range_index(col)
+        if within is None:
+            if not len(entry["sorted"]):
+                return None
+            return entry["sorted"][0], entry["sorted"][-1]
+        if self._value_index(within[0]) is None:
+            values = entry["values"][self.isin(*within)]
+            return None if np.isnan(values).all() else (np.nanmin(values), np.nanmax(values))
+        extremes = self._extremes(within[0], col)
+        codes = self._lookup(self._value_index(within[0]), within[1])
+        lows, highs = extremes[0][codes], extremes[1][codes]
+        if not len(codes) or np.isnan(lows).all():
+            return None
+        return np.nanmin(lows), np.nanmax(highs)
+
+    def _extremes(self, by, col):
+        key = ("extremes", by, col)
+        if key not in self._memo:
+            groups = self._value_index(by)
+            values = self._range_index(col)["values"]
+            stats = pd.Series(values).groupby(groups["codes"]).agg(["min", "max"])
+            lows = np.full(len(groups["values"]), np.nan)
+            highs = np.full(len(groups["values"]), np.nan)
+            index = stats.index.to_numpy()
+            keep = index >= 0
+            lows[index[keep]] = stats["min"].to_numpy()[keep]
+            highs[index[keep]] = stats["max"].to_numpy()[keep]
+            self._memo[key] = (lows, highs)
+        return self._memo[key]
+
+    # --- Sorting and search (data grid)
+
+    def order(self, col, descending=False):
+        # Row positions sorted by col, ties in row order and nulls last in either direction
+        key = ("order", col, descending)
+        if key not in self._memo:
+            if pd.api.types.is_numeric_dtype(self.df[col]):
+                entry = self._range_index(col)
+                valid, missing = entry["order"], np.flatnonzero(np.isnan(entry["values"]))
+                if descending:
+                    values = entry["sorted"]
+                    valid = _reversed_groups(valid, np.flatnonzero(np.r_[True, values[1:] != values[:-1]]))
+            elif self._value_index(col) is not None:
+                # The value index already holds the rows grouped by value, nulls first
+                entry = self._value_index(col)
+                nulls = entry["offsets"][1]
+                valid, missing = entry["positions"][nulls:], entry["positions"][:nulls]
+                if descending:
+                    valid = _reversed_groups(valid, entry["offsets"][1:-1] - nulls)
+            else:
+                codes, uniques = pd.factorize(self.df[col], sort=True)
+                ranks = len(uniques) - 1 - codes if descending else codes
+                valid = np.argsort(np.where(codes >= 0, ranks, len(uniques)), kind="stable")
+                missing = valid[:0]
+            order = np.concatenate([valid, missing])
+            self._memo[key] = order.astype(np.int32 if self.n < 2 ** 31 else np.int64, copy=False)
+        return self._memo[key]
+
+    def search(self, col, text):
+        # Mask of rows matching a search box: numeric columns take a value or a comparison
+        # (">100", "<=5"), anything else matches values containing the text, ignoring case
+        text = str(text).strip()
+        if pd.api.types.is_numeric_dtype(self.df[col]):
+            rows = self._compare(col, text)
+            if rows is not None:
+                return rows
+        entry = self._value_index(col)
+        if entry is None:
+            return self.df[col].astype(str).str.contains(text, case=False, regex=False).fillna(False).to_numpy(dtype=bool)
+        # Only the distinct values are scanned; rows come from the index
+        matches = pd.Index(entry["values"]).astype(str).str.contains(text, case=False, regex=False)
+        return self.isin(col, entry["values"][np.asarray(matches, dtype=bool)])
+
+    def _compare(self, col, text):
+        op = next((op for op in (">=", "<=", ">", "<", "=") if text.startswith(op)), "=")
+        try:
+            value = float(text[len(op):] if text.startswith(op) else text)
+        except ValueError:
+            return None
+        entry = self._range_index(col)
+        left = np.searchsorted(entry["sorted"], value, side="left")
+        right = np.searchsorted(entry["sorted"], value, side="right")
+        start, stop = {
+            "=": (left, right), ">": (right, None), ">=": (left, None), "<": (0, left), "<=": (0, right),
+        }[op]
+        mask = np.zeros(self.n, dtype=bool)
+        mask[entry["order"][start:stop]] = True
+        return mask
+
+    # --- Results
+
+    def filter(self, states=None, column=None, threshold=None, values=None):
+        # filter_states followed by filter_numeric from pipeline, as one mask and one copy
+        mask = None
+        if states is not None and "State" in self.df.columns:
+            mask = self.isin("State", states)
+        if column and column in self.df.columns and (threshold is not None or values is not None):
+            rows = self.above(column, threshold) if threshold is not None else self.isin(column, values)
+            mask = rows if mask is None else mask & rows
+        return self.take(mask)
+
+    def take(self, mask=None):
+        # Matching rows in their original order; no mask means every row
+        if mask is None:
+            return self.df
+        return self.df.iloc[np.flatnonzero(mask)]
@@ -0,0 +1,168 @@
+import streamlit as st
+import plotly.graph_objects as go
+
+from dates import DATE_COLUMN, MONTH_COLUMN, date_summary
+from exports import csv_bytes, download_on_demand
+from forecasters import FORECASTERS
+from forecasting import (
+    FORECAST_WORKERS, SEGMENT_COLUMNS, backtest_segments, forecast_segments, forecast_series, monthly_sales,
+)
+from pipeline import stage_key
+
+
+# Columns the forecast tab reads from the persisted merged stage; months come from the date stage
+FORECAST_COLUMNS = ["Sales Amt"] + SEGMENT_COLUMNS
+# Upper bound of the worker input; the default (CPU count or FORECAST_WORKERS) is capped to it
+MAX_WORKERS = 64
+
+
+def show_forecast_tab(df, dataset_key=None, date_info=None):
+    st.header("📈 Forecast Sales Using Prophet")
+
+    if df is None or df.empty:
+        st.warning("⚠️ Please load data through ETL first.")
+        return
+
+    st.subheader("Configure Forecast")
+
+    st.write("Columns in dataframe:", df.columns.tolist())
+
+    if MONTH_COLUMN not in df.columns and DATE_COLUMN not in df.columns:
+        st.warning(f"⚠️ The dataset has no '{DATE_COLUMN}' column to forecast from.")
+        return
+    if date_summary(date_info):
+        st.caption(date_summary(date_info))
+
+    sales_monthly = monthly_sales(df)
+
+    forecast_period = st.slider("Months to Forecast", min_value=1, max_value=24, value=6)
+
+    model_options = {"Auto": "auto", **{f.title: name for name, f in FORECASTERS.items()}}
+    model = model_options[st.selectbox("Model", list(model_options), help="Auto uses Prophet only for long series")]
+
+    # A fitted Prophet model is cached on the training series, so the slider only re-predicts
+    with st.spinner("Training the model..."):
+        forecast, model_name = forecast_series(sales_monthly, forecast_period, model)
+    st.caption(f"Model: {FORECASTERS[model_name].title}")
+
+    st.success("Forecast generated!")
+
+    actual = forecast[forecast['ds'] <= sales_monthly['ds'].max()]
+    predicted = forecast[forecast['ds'] > sales_monthly['ds'].max()]
+
+    # Create figure
+    fig = go.Figure()
+
+    # Actual data in blue
+    fig.add_trace(go.Scatter(
+        x=actual['ds'],
+        y=actual['yhat'],
+        mode='lines+markers',
+        name='Actual (Fitted)',
+        line=dict(color='blue')
+    ))
+
+    # Forecast data in orange
+    fig.add_trace(go.Scatter(
+        x=predicted['ds'],
+        y=predicted['yhat'],
+        mode='lines+markers',
+        name='Forecast',
+        line=dict(color='orange', dash='dash')
+    ))
+
+    # Add confidence interval
+    fig.add_trace(go.Scatter(
+        x=forecast['ds'],
+        y=forecast['yhat_upper'],
+        mode='lines',
+        name='Upper Bound',
+        line=dict(width=0),
+        showlegend=False
+    ))
+
+    fig.add_trace(go.Scatter(
+        x=forecast['ds'],
+        y=forecast['yhat_lower'],
+        mode='lines',
+        name='Lower Bound',
+        fill='tonexty',
+        line=dict(width=0),
+        fillcolor='rgba(255,165,0,0.2)',
+        showlegend=True
+    ))
+
+    # Layout
+    fig.update_layout(
+        title='Sales Forecast',
+        xaxis_title='Month',
+        yaxis_title='Sales Amount',
+        template='plotly_white',
+        legend=dict(orientation='h', yanchor='bottom', y=1.02, xanchor='right', x=1)
+    )
+
+    st.plotly_chart(fig, use_container_width=True)
+
+    forecast_table = forecast[['ds', 'yhat', 'yhat_lower', 'yhat_upper']].tail(forecast_period)
+    forecast_table.columns = ['Month', 'Predicted Sales', 'Lower Bound', 'Upper Bound']
+    st.write("### Forecast Table")
+    st.dataframe(forecast_table)
+
+    show_segment_forecasts(df, forecast_period, model, dataset_key)
+
+
+def show_segment_forecasts(df, forecast_period, model="auto", dataset_key=None):
+    st.subheader("Forecast by Segment")
+
+    segments = [col for col in SEGMENT_COLUMNS if col in df.columns]
+    if not segments:
+        st.info("No segment columns (State, Dealer_Name, Mat Desc) in the dataset.")
+        return
+
+    segment = st.selectbox("Forecast each", segments)
+    workers = st.number_input(
+        "Worker processes", min_value=1, max_value=MAX_WORKERS, value=min(MAX_WORKERS, max(1, FORECAST_WORKERS))
+    )
+
+    # One model per segment is fitted in worker processes; results are kept until the inputs change
+    run_key = stage_key(dataset_key, segment, forecast_period, model)
+    if st.button("Run Segment Forecasts"):
+        with st.spinner(f"Fitting one model per {segment}..."):
+            st.session_state["segment_forecast"] = (
+                run_key, forecast_segments(df, segment, forecast_period, model=model, workers=int(workers))
+            )
+
+    # Scores each model on the last months of every segment, to pick the cheapest acceptable one
+    with st.expander("Backtest models"):
+        models = st.multiselect(
+            "Models to compare", list(FORECASTERS) + ["auto"],
+            default=[name for name, f in FORECASTERS.items() if f.batched],
+        )
+        if models and st.button("Run Backtest"):
+            with st.spinner("Backtesting..."):
+                st.dataframe(backtest_segments(df, segment, forecast_period, models))
+
+    stored = st.session_state.get("segment_forecast")
+    if not stored or stored[0] != run_key:
+        return
+
+    forecasts, summary, stats = stored[1]
+    st.caption(
+        f"{stats['fitted']} of {stats['segments']} segments fitted in {stats['seconds']:.1f}s "
+        f"({stats['fits_per_sec']:.2f} fits/sec)"
+    )
+    problems = summary[summary["status"] != "ok"]
+    if not problems.empty:
+        st.warning(f"{len(problems)} segment(s) could not be forecast.")
+        st.dataframe(problems)
+
+    st.dataframe(forecasts.head(1000))
+    download_on_demand(
+        "Download Segment Forecasts (CSV)",
+        f"segment_forecast:{run_key}",
+        csv_bytes,
+        forecasts,
+        file_name=f"forecast_by_{segment.replace(' ', '_').lower()}.csv",
+        mime="text/csv",
+        widget_key="segment_forecast_csv"
+    )
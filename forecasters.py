@@ -0,0 +1,253 @@
+import time
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+import pandas as pd
+
+from profiling import span
+
+
+SEASON = 12
+# z for an 80% interval, the same width Prophet reports by default
+INTERVAL_Z = 1.2815515655446004
+SMOOTHING_ALPHAS = np.linspace(0.05, 1.0, 20)
+TREND_RIDGE = 1e-6
+
+# Series are passed around as a matrix Y (series x months) on one calendar of month starts.
+# Every row ends at the last month; months before a series' first sale are NaN and months
+# without sales inside its range are 0.
+#
+# fit_predict: callable(Y, months, periods) -> {"fitted": (n, T), "yhat", "lower", "upper": (n, periods)}
+# batched: False for models that fit one series at a time (batch jobs send them to a process pool)
+# min_points: shortest series the automatic choice will give the model
+Forecaster = namedtuple("Forecaster", ["name", "title", "fit_predict", "batched", "min_points"])
+
+FORECASTERS = OrderedDict()
+# Tried in this order by model="auto"; the first registered one the series is long enough for wins
+AUTO_ORDER = ["prophet", "trend_seasonal", "smoothing", "seasonal_naive"]
+
+
+def register_forecaster(name, title, fit_predict=None, batched=True, min_points=1):
+    # Usable directly or as a decorator, like register_rule in exception_engine
+    def _register(func):
+        FORECASTERS[name] = Forecaster(name, title, func, batched, min_points)
+        return func
+
+    if fit_predict is None:
+        return _register
+    return _register(fit_predict)
+
+
+def series_matrix(monthly, key=None):
+    # Long monthly frame (key, ds, y) -> (keys, months, Y)
+    months_of = monthly["ds"].to_numpy(dtype="datetime64[M]")
+    first, last = months_of.min(), months_of.max()
+    months = np.arange(first, last + 1)
+    if key is None:
+        keys, rows = np.array([None], dtype=object), np.zeros(len(monthly), dtype=np.int64)
+    else:
+        rows, keys = pd.factorize(monthly[key], sort=True)
+        keys = np.asarray(keys, dtype=object)
+    cols = (months_of - first).astype(np.int64)
+
+    Y = np.zeros((len(keys), len(months)))
+    np.add.at(Y, (rows, cols), monthly["y"].to_numpy(dtype="float64", na_value=np.nan))
+    starts = np.full(len(keys), len(months))
+    np.minimum.at(starts, rows, cols)
+    Y[np.arange(len(months))[None, :] < starts[:, None]] = np.nan
+    return keys, months.astype("datetime64[ns]"), Y
+
+
+def future_months(months, periods):
+    last = np.datetime64(months[-1], "M")
+    return (last + np.arange(1, periods + 1)).astype("datetime64[ns]")
+
+
+def forecast_frame(months, result, row=0):
+    # One row of a result as a Prophet-style frame: history (fitted) followed by the forecast
+    ds = np.concatenate([np.asarray(months, dtype="datetime64[ns]"), future_months(months, result["yhat"].shape[1])])
+    fitted = result["fitted"][row]
+    band = INTERVAL_Z * result["sigma"][row]
+    return pd.DataFrame({
+        "ds": ds,
+        "yhat": np.concatenate([fitted, result["yhat"][row]]),
+        "yhat_lower": np.concatenate([fitted - band, result["lower"][row]]),
+        "yhat_upper": np.concatenate([fitted + band, result["upper"][row]]),
+    })
+
+
+def _shift(Y, lag):
+    out = np.full_like(Y, np.nan)
+    if lag < Y.shape[1]:
+        out[:, lag:] = Y[:, :-lag]
+    return out
+
+
+def residual_sigma(residuals, dof_used=0):
+    valid = ~np.isnan(residuals)
+    count = valid.sum(axis=1)
+    sse = np.where(valid, residuals, 0.0) ** 2
+    return np.where(count > 0, np.sqrt(sse.sum(axis=1) / np.maximum(count - dof_used, 1)), 0.0)
+
+
+def _result(fitted, yhat, sigma, spread):
+    # spread: (n, periods) multiplier on sigma for each forecast step
+    return {
+        "fitted": fitted, "yhat": yhat, "sigma": sigma,
+        "lower": yhat - INTERVAL_Z * sigma[:, None] * spread,
+        "upper": yhat + INTERVAL_Z * sigma[:, None] * spread,
+    }
+
+
+@register_forecaster("seasonal_naive", "Seasonal naive")
+def seasonal_naive(Y, months, periods):
+    # Same month last year; series shorter than a season repeat their last value
+    n, T = Y.shape
+    steps = np.arange(periods)
+    seasonal = (~np.isnan(Y)).sum(axis=1) >= SEASON
+    last = Y[:, -1]
+    if T >= SEASON:
+        same_month = Y[:, T - SEASON + steps % SEASON]
+    else:
+        same_month = np.repeat(last[:, None], periods, axis=1)
+
+    fitted = np.where(seasonal[:, None], _shift(Y, SEASON), _shift(Y, 1))
+    yhat = np.where(seasonal[:, None], same_month, last[:, None])
+    spread = np.where(seasonal[:, None], np.sqrt(steps // SEASON + 1), np.sqrt(steps + 1))
+    return _result(fitted, yhat, residual_sigma(Y - fitted), spread)
+
+
+def _smooth(Y, alphas, keep_fitted=False):
+    # Simple exponential smoothing for every series and every alpha at once; alphas broadcasts
+    # against (n, A). Returns the final level, the one-step squared errors and optionally the fits.
+    n, T = Y.shape
+    level = np.full(np.broadcast_shapes((n, 1), np.shape(alphas)), np.nan)
+    sse = np.zeros_like(level)
+    fitted = np.full(level.shape + (T,), np.nan) if keep_fitted else None
+    for t in range(T):
+        y = Y[:, t][:, None]
+        error = y - level
+        sse += np.where(np.isnan(error), 0.0, error ** 2)
+        if keep_fitted:
+            fitted[..., t] = level
+        level = np.where(np.isnan(level), y, np.where(np.isnan(y), level, level + alphas * error))
+    return level, sse, fitted
+
+
+@register_forecaster("smoothing", "Exponential smoothing")
+def exponential_smoothing(Y, months, periods):
+    # alpha is chosen per series from a grid by one-step-ahead error
+    n, T = Y.shape
+    _, sse, _ = _smooth(Y, SMOOTHING_ALPHAS[None, :])
+    alpha = SMOOTHING_ALPHAS[np.argmin(sse, axis=1)][:, None]
+    level, _, fitted = _smooth(Y, alpha, keep_fitted=True)
+    fitted = fitted[:, 0, :]
+    steps = np.arange(periods)
+    spread = np.sqrt(1 + steps[None, :] * alpha ** 2)
+    return _result(fitted, np.repeat(level, periods, axis=1), residual_sigma(Y - fitted, dof_used=1), spread)
+
+
+def _trend_design(months, periods):
+    # Intercept, linear trend and one dummy per calendar month (January is the baseline)
+    all_months = np.concatenate([np.asarray(months, dtype="datetime64[M]"), np.asarray(future_months(months, periods), dtype="datetime64[M]")])
+    month_of_year = all_months.astype(np.int64) % 12
+    t = np.arange(len(all_months)) / max(len(months), 1)
+    dummies = (month_of_year[:, None] == np.arange(1, 12)[None, :]).astype("float64")
+    return np.column_stack([np.ones(len(all_months)), t, dummies])
+
+
+@register_forecaster("trend_seasonal", "Linear trend + seasonal dummies", min_points=SEASON + 1)
+def trend_seasonal(Y, months, periods):
+    # Weighted least squares for all series at once: missing months get zero weight and a tiny
+    # ridge keeps the normal equations solvable for months a series has never seen
+    n, T = Y.shape
+    X = _trend_design(months, periods)
+    history, future = X[:T], X[T:]
+    weights = (~np.isnan(Y)).astype("float64")
+    values = np.nan_to_num(Y)
+
+    xtx = np.einsum("nt,tp,tq->npq", weights, history, history, optimize=True)
+    xtx += TREND_RIDGE * np.eye(X.shape[1])
+    xty = np.einsum("nt,tp,nt->np", weights, history, values, optimize=True)
+    beta = np.linalg.solve(xtx, xty[..., None])[..., 0]
+
+    fitted = beta @ history.T
+    fitted[weights == 0] = np.nan
+    yhat = beta @ future.T
+    sigma = residual_sigma(Y - fitted, dof_used=X.shape[1])
+    return _result(fitted, yhat, sigma, np.ones((n, periods)))
+
+
+def points(Y):
+    return (~np.isnan(Y)).sum(axis=1)
+
+
+def choose_forecaster(n_points):
+    for name in AUTO_ORDER:
+        forecaster = FORECASTERS.get(name)
+        if forecaster is not None and n_points >= forecaster.min_points:
+            return name
+    return next(iter(FORECASTERS))
+
+
+def assign_models(Y, model="auto"):
+    # Model name for every row of Y; model may also already be one name per row
+    if not isinstance(model, str):
+        return np.asarray(model, dtype=object)
+    if model != "auto":
+        return np.full(len(Y), model, dtype=object)
+    return np.array([choose_forecaster(n) for n in points(Y)], dtype=object)
+
+
+def predict_matrix(Y, months, periods, model="auto"):
+    # Rows are grouped by model and each group is fitted in one call. Returns the stacked
+    # result plus "model" (name per row) and "fit_seconds" (share of its group's time per row).
+    n, T = Y.shape
+    names = assign_models(Y, model)
+    out = {
+        "fitted": np.full((n, T), np.nan), "sigma": np.zeros(n),
+        "yhat": np.full((n, periods), np.nan), "lower": np.full((n, periods), np.nan),
+        "upper": np.full((n, periods), np.nan), "model": names, "fit_seconds": np.zeros(n),
+    }
+    for name in pd.unique(names):
+        rows = np.flatnonzero(names == name)
+        started = time.perf_counter()
+        with span(f"fit {name}", "forecast", rows=len(rows)):
+            result = FORECASTERS[name].fit_predict(Y[rows], months, periods)
+        elapsed = time.perf_counter() - started
+        for field in ("fitted", "sigma", "yhat", "lower", "upper"):
+            out[field][rows] = result[field]
+        out["fit_seconds"][rows] = elapsed / len(rows)
+    return out
+
+
+def backtest(Y, months, horizon, models=None):
+    # Holds out the last `horizon` months of every series and scores each model on them.
+    # A model is scored on the series long enough for it; "auto" is scored on all of them.
+    models = list(models or list(FORECASTERS) + ["auto"])
+    train, actual = Y[:, :-horizon], Y[:, -horizon:]
+    train_months = months[:-horizon]
+    usable = points(train) >= 2
+    rows = []
+    for model in models:
+        eligible = usable if model == "auto" else usable & (points(train) >= FORECASTERS[model].min_points)
+        idx = np.flatnonzero(eligible)
+        if not len(idx):
+            rows.append({"model": model, "series": 0})
+            continue
+        started = time.perf_counter()
+        result = predict_matrix(train[idx], train_months, horizon, model)
+        elapsed = time.perf_counter() - started
+        error = result["yhat"] - actual[idx]
+        scale = np.abs(result["yhat"]) + np.abs(actual[idx])
+        smape = np.where(scale > 0, 2 * np.abs(error) / np.where(scale > 0, scale, 1), 0.0)
+        rows.append({
+            "model": model,
+            "series": len(idx),
+            "mae": float(np.nanmean(np.abs(error))),
+            "rmse": float(np.sqrt(np.nanmean(error ** 2))),
+            "smape": float(np.nanmean(smape)),
+            "fit_seconds": elapsed,
+            "ms_per_series": 1000 * elapsed / len(idx),
+        })
+    return pd.DataFrame(rows, columns=["model", "series", "mae", "rmse", "smape", "fit_seconds", "ms_per_series"])
@@ -0,0 +1,412 @@
+import argparse
+import logging
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+import pandas as pd
+
+from dates import month_start
+from forecasters import (
+    FORECASTERS, assign_models, backtest, forecast_frame, future_months, points,
+    predict_matrix, register_forecaster, series_matrix, residual_sigma,
+)
+from ingest import DEFAULT_CHUNKSIZE, load_csv_typed
+from pipeline import bytes_key, expand_paths, stage_key
+from profiling import traced
+
+
+# Fitted models are shared by every session in the process and survive restarts on disk
+MODEL_DIR = os.environ.get("FORECAST_MODEL_DIR", os.path.join(tempfile.gettempdir(), "sales_models"))
+MAX_MODELS = int(os.environ.get("FORECAST_MAX_MODELS", 64))
+MAX_LOADED_MODELS = 8
+FORECAST_FREQ = "ME"
+PROPHET_PARAMS = {}
+# Below this many months the automatic choice uses a NumPy baseline instead of Prophet
+PROPHET_MIN_POINTS = int(os.environ.get("PROPHET_MIN_POINTS", 24))
+
+# Batch forecasting fits one model per value of a segment column
+SEGMENT_COLUMNS = ["State", "Dealer_Name", "Mat Desc"]
+FORECAST_WORKERS = int(os.environ.get("FORECAST_WORKERS", os.cpu_count() or 1))
+SEGMENT_TIMEOUT = float(os.environ.get("FORECAST_SEGMENT_TIMEOUT", 120))
+MIN_SEGMENT_POINTS = 2
+
+_forecasts = OrderedDict()
+_forecasts_lock = threading.Lock()
+
+
+def monthly_sales(df):
+    # Training series for the forecast: total sales per calendar month, as Prophet's ds/y
+    totals = df["Sales Amt"].groupby(month_start(df)).sum()
+    return pd.DataFrame({"ds": totals.index, "y": totals.to_numpy()})
+
+
+def segment_monthly_sales(df, segment):
+    # The same monthly series for every value of `segment`, from one groupby
+    totals = df["Sales Amt"].groupby([df[segment], month_start(df)], observed=True).sum()
+    totals.index.names = [segment, "ds"]
+    return totals.rename("y").reset_index()
+
+
+def series_fingerprint(series, params=None):
+    ds = series["ds"].to_numpy(dtype="datetime64[ns]").view("int64")
+    y = series["y"].to_numpy(dtype="float64")
+    return stage_key(bytes_key(ds.tobytes() + y.tobytes()), params or {})
+
+
+class ModelCache:
+    # Fitted models by training fingerprint. A few stay deserialised in memory; all of them are
+    # written to disk, and the least recently used files are evicted beyond max_models.
+    def __init__(self, directory=MODEL_DIR, max_models=MAX_MODELS, max_loaded=MAX_LOADED_MODELS):
+        self.directory = directory
+        self.max_models = max_models
+        self.max_loaded = max_loaded
+        self._loaded = OrderedDict()
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key):
+        with self._lock:
+            if key in self._loaded:
+                self._loaded.move_to_end(key)
+                return self._loaded[key]
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        from prophet.serialize import model_from_json
+        try:
+            with open(path, encoding="utf-8") as f:
+                model = model_from_json(f.read())
+            # The file's mtime is its position in the LRU order
+            os.utime(path)
+        except (OSError, ValueError, KeyError):
+            return None
+        self._remember(key, model)
+        return model
+
+    def put(self, key, model):
+        from prophet.serialize import model_to_json
+        path = self._path(key)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(model_to_json(model))
+        os.replace(tmp_path, path)
+        self._remember(key, model)
+        self._evict()
+
+    def _remember(self, key, model):
+        with self._lock:
+            self._loaded[key] = model
+            self._loaded.move_to_end(key)
+            while len(self._loaded) > self.max_loaded:
+                self._loaded.popitem(last=False)
+
+    def _evict(self):
+        files = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".json"):
+                try:
+                    files.append((os.path.getmtime(os.path.join(self.directory, name)), name))
+                except OSError:
+                    pass
+        for _, name in sorted(files)[:max(0, len(files) - self.max_models)]:
+            with self._lock:
+                self._loaded.pop(name[:-len(".json")], None)
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+
+
+_model_cache = None
+_model_cache_lock = threading.Lock()
+
+
+def model_cache():
+    global _model_cache
+    with _model_cache_lock:
+        if _model_cache is None:
+            _model_cache = ModelCache()
+        return _model_cache
+
+
+@traced("fit_prophet", "forecast")
+def fit_prophet(series, params=None):
+    # Prophet (and Stan) are imported on the first fit, not when the app starts
+    from prophet import Prophet
+    model = Prophet(**(params or PROPHET_PARAMS))
+    model.fit(series)
+    return model
+
+
+@register_forecaster("prophet", "Prophet", batched=False, min_points=PROPHET_MIN_POINTS)
+def prophet_forecaster(Y, months, periods):
+    # One Stan fit per row; batch jobs spread the rows over worker processes instead
+    n, T = Y.shape
+    ds = pd.DataFrame({"ds": np.concatenate([months, future_months(months, periods)])})
+    fitted, yhat = np.full((n, T), np.nan), np.full((n, periods), np.nan)
+    lower, upper = np.full((n, periods), np.nan), np.full((n, periods), np.nan)
+    for i in range(n):
+        valid = ~np.isnan(Y[i])
+        forecast = fit_prophet(pd.DataFrame({"ds": months[valid], "y": Y[i, valid]})).predict(ds)
+        fitted[i, valid] = forecast["yhat"].to_numpy()[:T][valid]
+        yhat[i] = forecast["yhat"].to_numpy()[T:]
+        lower[i] = forecast["yhat_lower"].to_numpy()[T:]
+        upper[i] = forecast["yhat_upper"].to_numpy()[T:]
+    return {"fitted": fitted, "yhat": yhat, "lower": lower, "upper": upper, "sigma": residual_sigma(Y - fitted)}
+
+
+def fitted_model(series, params=None, cache=None):
+    # Returns (model, key); Stan only runs when this series and these params were never fitted
+    cache = cache or model_cache()
+    key = series_fingerprint(series, params)
+    model = cache.get(key)
+    if model is None:
+        model = fit_prophet(series, params)
+        cache.put(key, model)
+    return model, key
+
+
+def cached_forecast(series, periods, params=None, cache=None):
+    # Forecasts are kept per model at the longest horizon asked for so far; a shorter horizon
+    # is a slice of it and only a longer one runs predict again.
+    key = series_fingerprint(series, params)
+    with _forecasts_lock:
+        forecast = _forecasts.get(key)
+        if forecast is not None:
+            _forecasts.move_to_end(key)
+    if forecast is None or len(forecast) < len(series) + periods:
+        model, key = fitted_model(series, params, cache)
+        forecast = model.predict(model.make_future_dataframe(periods=periods, freq=FORECAST_FREQ))
+        with _forecasts_lock:
+            _forecasts[key] = forecast
+            while len(_forecasts) > MAX_LOADED_MODELS:
+                _forecasts.popitem(last=False)
+    return forecast.iloc[:len(series) + periods]
+
+
+@traced("forecast_series", "forecast")
+def forecast_series(series, periods, model="auto"):
+    # Returns (forecast frame, model name). Prophet goes through the model cache; the
+    # baselines are cheap enough to refit on every call.
+    _, months, Y = series_matrix(series)
+    name = assign_models(Y, model)[0]
+    if name == "prophet":
+        return cached_forecast(series, periods), name
+    return forecast_frame(months, predict_matrix(Y, months, periods, name)), name
+
+
+# --- Batch forecasting per segment
+
+def fit_segment(segment, model, row, months, periods):
+    # Runs in a worker process; failures are returned rather than raised so one bad
+    # segment never takes the batch down
+    logging.getLogger("cmdstanpy").setLevel(logging.WARNING)
+    started = time.perf_counter()
+    result = {"segment": segment, "model": model, "points": int(points(row[None])[0]), "status": "ok", "error": None}
+    try:
+        prediction = FORECASTERS[model].fit_predict(row[None], months, periods)
+        result.update({field: prediction[field][0] for field in ("yhat", "lower", "upper")})
+    except Exception as exc:
+        result.update(status="failed", error=f"{type(exc).__name__}: {exc}")
+    result["fit_seconds"] = time.perf_counter() - started
+    return result
+
+
+def _new_pool(workers):
+    # Spawned rather than forked, like the PDF renderer, so the app server's threads are not copied
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+
+
+def _kill_pool(pool):
+    # A fit stuck in Stan cannot be cancelled, so its worker is terminated with the pool
+    for process in list(getattr(pool, "_processes", {}).values()):
+        process.terminate()
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _run_segments(tasks, workers, timeout):
+    # At most `workers` fits are in flight, so a task starts when it is submitted and its
+    # timeout can be measured from then. A timeout or a crashed worker replaces the pool.
+    # After a crash every task that was in flight is a suspect and is rerun on its own,
+    # so only the segment that actually kills its worker is reported as crashed.
+    pending = list(reversed(tasks))
+    suspects = set()
+    results = []
+    inflight = {}
+    pool = None
+    try:
+        while pending or inflight:
+            if pool is None:
+                pool = _new_pool(workers)
+            while pending and len(inflight) < workers:
+                if inflight and (pending[-1][0] in suspects or any(t[0] in suspects for t, _ in inflight.values())):
+                    break
+                task = pending.pop()
+                inflight[pool.submit(fit_segment, *task)] = (task, time.monotonic())
+
+            solo = len(inflight) == 1
+            oldest = min(started for _, started in inflight.values())
+            done, _ = wait(inflight, timeout=max(0.0, oldest + timeout - time.monotonic()), return_when=FIRST_COMPLETED)
+
+            broken = False
+            for future in done:
+                try:
+                    results.append(future.result())
+                    del inflight[future]
+                except BrokenProcessPool:
+                    broken = True
+
+            now = time.monotonic()
+            expired = [f for f, (_, started) in inflight.items() if f not in done and now - started >= timeout]
+            for future in expired:
+                task, started = inflight.pop(future)
+                results.append(_failure(task, "timeout", f"no result after {timeout:g}s", started))
+
+            if not broken and not expired:
+                continue
+            for task, started in inflight.values():
+                if broken and solo:
+                    results.append(_failure(task, "failed", "worker process crashed", started))
+                else:
+                    if broken:
+                        suspects.add(task[0])
+                    pending.append(task)
+            inflight = {}
+            _kill_pool(pool)
+            pool = None
+    finally:
+        if pool is not None:
+            pool.shutdown(wait=True)
+    return results
+
+
+def _failure(task, status, error, started):
+    return {
+        "segment": task[0], "model": task[1], "points": int(points(task[2][None])[0]),
+        "status": status, "error": error, "fit_seconds": time.monotonic() - started,
+    }
+
+
+@traced("forecast_segments", "forecast")
+def forecast_segments(df, segment, periods, model="auto", workers=FORECAST_WORKERS, timeout=SEGMENT_TIMEOUT):
+    # Returns (forecasts, summary, stats). forecasts is long and columnar: one row per segment
+    # and future month; summary has one row per segment with its model, status and fit time.
+    # Batched models fit all their segments in one array operation in this process; the
+    # others (Prophet) get one task per segment in the worker pool.
+    keys, months, Y = segment_matrix(df, segment)
+    names = assign_models(Y, model)
+    too_short = points(Y) < MIN_SEGMENT_POINTS
+    batched = np.array([FORECASTERS[name].batched for name in names], dtype=bool) & ~too_short
+    results = [
+        {"segment": keys[i], "model": names[i], "points": int(points(Y[i][None])[0]), "status": "skipped",
+         "error": "too few months to fit", "fit_seconds": 0.0}
+        for i in np.flatnonzero(too_short)
+    ]
+
+    started = time.perf_counter()
+    rows = np.flatnonzero(batched)
+    if len(rows):
+        prediction = predict_matrix(Y[rows], months, periods, names[rows])
+        for j, i in enumerate(rows):
+            results.append({
+                "segment": keys[i], "model": names[i], "points": int(points(Y[i][None])[0]), "status": "ok",
+                "error": None, "fit_seconds": prediction["fit_seconds"][j],
+                "yhat": prediction["yhat"][j], "lower": prediction["lower"][j], "upper": prediction["upper"][j],
+            })
+
+    tasks = [(keys[i], names[i], Y[i], months, periods) for i in np.flatnonzero(~batched & ~too_short)]
+    if workers < 1:
+        # In-process, mainly for debugging: no timeouts or crash isolation
+        results.extend(fit_segment(*task) for task in tasks)
+    elif tasks:
+        results.extend(_run_segments(tasks, workers, timeout))
+    elapsed = time.perf_counter() - started
+
+    fitted = [r for r in results if r["status"] == "ok"]
+    future = future_months(months, periods)
+    forecasts = pd.DataFrame({
+        segment: np.repeat(np.array([r["segment"] for r in fitted], dtype=object), periods),
+        "model": np.repeat(np.array([r["model"] for r in fitted], dtype=object), periods),
+        "ds": np.tile(future, len(fitted)),
+        "yhat": np.concatenate([r["yhat"] for r in fitted]) if fitted else np.empty(0),
+        "yhat_lower": np.concatenate([r["lower"] for r in fitted]) if fitted else np.empty(0),
+        "yhat_upper": np.concatenate([r["upper"] for r in fitted]) if fitted else np.empty(0),
+    })
+    summary_columns = ["segment", "model", "points", "status", "error", "fit_seconds"]
+    summary = pd.DataFrame(
+        [{key: r[key] for key in summary_columns} for r in results], columns=summary_columns,
+    ).rename(columns={"segment": segment}).sort_values(segment, kind="mergesort", ignore_index=True)
+
+    stats = {
+        "segments": len(summary),
+        "fitted": len(fitted),
+        "failed": int((summary["status"] == "failed").sum()),
+        "timed_out": int((summary["status"] == "timeout").sum()),
+        "skipped": int((summary["status"] == "skipped").sum()),
+        "seconds": elapsed,
+        "fits_per_sec": len(fitted) / elapsed if elapsed > 0 else 0.0,
+    }
+    return forecasts, summary, stats
+
+
+def segment_matrix(df, segment):
+    return series_matrix(segment_monthly_sales(df, segment), segment)
+
+
+def backtest_segments(df, segment, horizon, models=None):
+    _, months, Y = segment_matrix(df, segment)
+    return backtest(Y, months, horizon, models)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Forecast monthly sales for every segment in a batch.")
+    parser.add_argument("inputs", nargs="+", help="CSV files (or globs), combined into one dataset")
+    parser.add_argument("--segment", choices=SEGMENT_COLUMNS, default="State")
+    parser.add_argument("--periods", type=int, default=6, help="Months to forecast")
+    parser.add_argument("--model", choices=["auto"] + list(FORECASTERS), default="auto")
+    parser.add_argument("--backtest", type=int, metavar="MONTHS",
+                        help="Score every model on the last MONTHS of each segment instead of forecasting")
+    parser.add_argument("--workers", type=int, default=FORECAST_WORKERS)
+    parser.add_argument("--timeout", type=float, default=SEGMENT_TIMEOUT, help="Seconds allowed per segment fit")
+    parser.add_argument("--output-dir", default="forecast_output")
+    parser.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE)
+    args = parser.parse_args(argv)
+
+    paths = expand_paths(args.inputs)
+    df = pd.concat([load_csv_typed(path, args.chunksize)[0] for path in paths], ignore_index=True)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    stem = args.segment.replace(" ", "_").lower()
+
+    if args.backtest:
+        scores = backtest_segments(df, args.segment, args.backtest)
+        scores.to_csv(os.path.join(args.output_dir, f"backtest_{stem}.csv"), index=False)
+        print(scores.to_string(index=False))
+        return 0
+
+    forecasts, summary, stats = forecast_segments(
+        df, args.segment, args.periods, args.model, args.workers, args.timeout
+    )
+    forecasts.to_parquet(os.path.join(args.output_dir, f"forecast_{stem}.parquet"), index=False)
+    summary.to_parquet(os.path.join(args.output_dir, f"forecast_{stem}_segments.parquet"), index=False)
+
+    print(f"{stats['segments']} segments: {stats['fitted']} fitted, {stats['failed']} failed, "
+          f"{stats['timed_out']} timed out, {stats['skipped']} skipped")
+    print(f"{stats['seconds']:.1f}s, {stats['fits_per_sec']:.2f} fits/sec")
+    return 1 if stats["failed"] or stats["timed_out"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,178 @@
+import argparse
+import copy
+import json
+import os
+import sys
+import uuid
+
+import numpy as np
+
+from exception_engine import RULES, exception_reports, row_hashes, rule_counts, scan_exceptions
+from ingest import DEFAULT_CHUNKSIZE, load_csv_typed
+from pipeline import bytes_key, expand_paths
+from sketches import KLLSketch
+
+
+# State layout under the state directory:
+#   state.json            row count, processed batches, hash segments
+#   hashes/<id>.npy       sorted, unique uint64 row hashes (one segment per merge tier)
+#   sketches/<col>.npz    KLL sketch per outlier column
+SKETCH_COLUMNS = ["Sales Amt", "Qty"]
+STATE_FILE = "state.json"
+
+
+class BatchAlreadyApplied(ValueError):
+    # Applying the same rows twice would flag all of them as duplicates and count them twice
+    # in the sketches
+    pass
+
+
+class HashIndex:
+    # Append-only set of row hashes kept as sorted segments. New batches add a segment and
+    # equally sized neighbours are merged (like a binary counter), so appending n rows costs
+    # O(n log N) amortised and lookups are one binary search per segment.
+    def __init__(self, directory, segments=None):
+        self.directory = directory
+        self.segments = list(segments or [])
+        self._arrays = {}
+        os.makedirs(directory, exist_ok=True)
+
+    def _array(self, name):
+        if name not in self._arrays:
+            self._arrays[name] = np.load(os.path.join(self.directory, f"{name}.npy"), mmap_mode="r")
+        return self._arrays[name]
+
+    def __len__(self):
+        return sum(len(self._array(name)) for name in self.segments)
+
+    def contains(self, hashes):
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        found = np.zeros(len(hashes), dtype=bool)
+        for name in self.segments:
+            segment = self._array(name)
+            if not len(segment):
+                continue
+            positions = np.searchsorted(segment, hashes)
+            in_range = positions < len(segment)
+            found[in_range] |= segment[positions[in_range]] == hashes[in_range]
+        return found
+
+    def _write(self, values):
+        name = uuid.uuid4().hex
+        np.save(os.path.join(self.directory, f"{name}.npy"), values)
+        return name
+
+    def _drop(self, name):
+        self._arrays.pop(name, None)
+        try:
+            os.remove(os.path.join(self.directory, f"{name}.npy"))
+        except OSError:
+            pass
+
+    def add(self, hashes):
+        hashes = np.unique(np.asarray(hashes, dtype=np.uint64))
+        hashes = hashes[~self.contains(hashes)]
+        if not len(hashes):
+            return
+        self.segments.append(self._write(hashes))
+        while len(self.segments) > 1 and len(self._array(self.segments[-1])) >= len(self._array(self.segments[-2])):
+            newer, older = self.segments.pop(), self.segments.pop()
+            merged = np.union1d(self._array(older), self._array(newer))
+            self.segments.append(self._write(merged))
+            self._drop(newer)
+            self._drop(older)
+
+
+def load_state(directory):
+    path = os.path.join(directory, STATE_FILE)
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            state = json.load(f)
+    else:
+        state = {"rows": 0, "batches": [], "segments": []}
+
+    state["index"] = HashIndex(os.path.join(directory, "hashes"), state["segments"])
+    state["sketches"] = {}
+    for col in SKETCH_COLUMNS:
+        sketch_path = os.path.join(directory, "sketches", f"{col}.npz")
+        state["sketches"][col] = KLLSketch.load(sketch_path) if os.path.exists(sketch_path) else KLLSketch()
+    return state
+
+
+def save_state(directory, state):
+    os.makedirs(os.path.join(directory, "sketches"), exist_ok=True)
+    for col, sketch in state["sketches"].items():
+        sketch.save(os.path.join(directory, "sketches", f"{col}.npz"))
+
+    meta = {"rows": state["rows"], "batches": state["batches"], "segments": state["index"].segments}
+    tmp_path = os.path.join(directory, f"{STATE_FILE}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+    os.replace(tmp_path, os.path.join(directory, STATE_FILE))
+
+
+def scan_increment(directory, new_df, rules, batch_name=None, today=None, **options):
+    # Only the new rows are scanned. Duplicates are checked against the persisted hash index
+    # and the IQR bounds come from sketches that already include this batch. A batch whose
+    # rows were already applied is rejected; nothing is saved unless the scan succeeds.
+    os.makedirs(directory, exist_ok=True)
+    state = load_state(directory)
+    hashes = row_hashes(new_df)
+    key = bytes_key(hashes.tobytes())
+    applied = next((batch for batch in state["batches"] if batch.get("key") == key), None)
+    if applied is not None and len(new_df):
+        earlier = applied["name"] or f"the batch starting at row {applied['first_row']}"
+        raise BatchAlreadyApplied(f"{batch_name or 'batch'}: the same rows were already applied as {earlier}")
+
+    sketches = {}
+    for col, sketch in state["sketches"].items():
+        sketches[col] = sketch = copy.deepcopy(sketch)
+        if col in new_df.columns:
+            sketch.update(new_df[col].to_numpy(dtype="float64", na_value=np.nan))
+
+    scan = scan_exceptions(
+        new_df, rules, today=today, hash_index=state["index"], sketches=sketches, **options
+    )
+
+    state["sketches"] = sketches
+    state["index"].add(hashes)
+    state["rows"] += len(new_df)
+    state["batches"].append({
+        "name": batch_name, "rows": len(new_df), "first_row": state["rows"] - len(new_df), "key": key,
+    })
+    save_state(directory, state)
+    return scan
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run exception checks on appended files only.")
+    parser.add_argument("inputs", nargs="+", help="New CSV files (or globs), processed in order")
+    parser.add_argument("--state-dir", required=True, help="Directory holding the hash index and sketches")
+    parser.add_argument("--rules", default=",".join(RULES), help="Comma separated rule ids")
+    parser.add_argument("--output-dir", help="Write the exception rows of each file here")
+    parser.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE)
+    args = parser.parse_args(argv)
+
+    rules = [rule.strip() for rule in args.rules.split(",") if rule.strip()]
+    for path in expand_paths(args.inputs):
+        df, _ = load_csv_typed(path, args.chunksize)
+        try:
+            scan = scan_increment(args.state_dir, df, rules, batch_name=os.path.basename(path))
+        except BatchAlreadyApplied as e:
+            print(f"{path}: skipped, {e}")
+            continue
+        print(f"{path}: {len(df)} rows")
+        for title, count in rule_counts(scan).items():
+            print(f"  {title}: {count}")
+
+        if args.output_dir:
+            os.makedirs(args.output_dir, exist_ok=True)
+            stem = os.path.splitext(os.path.basename(path))[0]
+            for title, rows in exception_reports(df, scan).items():
+                name = title.replace("/", "-").replace(" ", "_")
+                rows.to_csv(os.path.join(args.output_dir, f"{stem}_{name}.csv"), index=False)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
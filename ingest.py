@@ -0,0 +1,127 @@
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+
+DEFAULT_CHUNKSIZE = 100_000
+PREVIEW_ROWS = 5
+CATEGORY_COLUMNS = ["State", "Dealer_Name", "Mat Desc"]
+# Integer columns narrowed per chunk. This is lossless, and chunks that end up with different
+# widths widen again losslessly on concat. Floats (Sales Amt) stay float64: a float32 chunk
+# concatenated with float64 chunks turns 1234.57 into 1234.5699462890625.
+DOWNCAST_COLUMNS = ["Qty"]
+# Numeric columns whose min/max the profile tracks
+RANGE_COLUMNS = ["Sales Amt", "Qty"]
+
+
+def _rewind(file):
+    if hasattr(file, "seek"):
+        file.seek(0)
+
+
+def _downcast(chunk):
+    for col in DOWNCAST_COLUMNS:
+        # A chunk with nulls in the column was read as float64 and is left alone
+        if col in chunk.columns and pd.api.types.is_integer_dtype(chunk[col]):
+            chunk[col] = pd.to_numeric(chunk[col], downcast="integer")
+    return chunk
+
+
+def iter_csv_chunks(file, chunksize=DEFAULT_CHUNKSIZE, usecols=None):
+    _rewind(file)
+    dtypes = {col: "category" for col in CATEGORY_COLUMNS}
+    for chunk in pd.read_csv(file, chunksize=chunksize, dtype=dtypes, usecols=usecols):
+        yield _downcast(chunk)
+
+
+def new_profile():
+    return {
+        "rows": 0,
+        "columns": None,
+        "null_counts": None,
+        "preview": None,
+        "domains": {},
+        "ranges": {},
+    }
+
+
+def update_profile(profile, chunk, preview_rows=PREVIEW_ROWS):
+    # Everything here is a running aggregate, so only the current chunk is ever held
+    if profile["columns"] is None:
+        profile["columns"] = chunk.columns.tolist()
+        profile["null_counts"] = chunk.isnull().sum()
+        # A copy, so the preview does not keep the whole first chunk alive
+        profile["preview"] = chunk.head(preview_rows).copy()
+    else:
+        profile["null_counts"] = profile["null_counts"].add(chunk.isnull().sum(), fill_value=0).astype("int64")
+        if len(profile["preview"]) < preview_rows:
+            missing = preview_rows - len(profile["preview"])
+            profile["preview"] = pd.concat([profile["preview"], chunk.head(missing).copy()])
+
+    profile["rows"] += len(chunk)
+
+    for col in CATEGORY_COLUMNS:
+        if col in chunk.columns:
+            values = chunk[col].dropna().unique()
+            profile["domains"].setdefault(col, set()).update(values)
+
+    for col in RANGE_COLUMNS:
+        if col in chunk.columns and pd.api.types.is_numeric_dtype(chunk[col]) and chunk[col].notna().any():
+            lo, hi = chunk[col].min(), chunk[col].max()
+            if col in profile["ranges"]:
+                lo = min(lo, profile["ranges"][col][0])
+                hi = max(hi, profile["ranges"][col][1])
+            profile["ranges"][col] = (lo, hi)
+    return profile
+
+
+def finish_profile(profile):
+    profile["domains"] = {col: sorted(values) for col, values in profile["domains"].items()}
+    if profile["null_counts"] is None:
+        profile["null_counts"] = pd.Series(dtype="int64")
+        profile["preview"] = pd.DataFrame()
+    return profile
+
+
+def _split(chunk, parts):
+    # Columns are taken out of the chunk one by one. Numpy columns are copied out of the
+    # chunk's shared 2-D blocks, so nothing references the chunk once it has been split.
+    for col in chunk.columns:
+        part = chunk[col]
+        parts.setdefault(col, []).append(part.copy() if isinstance(part.dtype, np.dtype) else part)
+
+
+def _concat_columns(parts):
+    # One column at a time, dropping its chunks as soon as it is built, so the peak is the
+    # finished frame plus one column rather than two copies of the data
+    columns = {}
+    for col in list(parts):
+        pieces = parts.pop(col)
+        if len(pieces) == 1:
+            columns[col] = pieces[0].reset_index(drop=True)
+        elif all(isinstance(piece.dtype, pd.CategoricalDtype) for piece in pieces):
+            # Each chunk has its own categories; union them instead of falling back to object
+            try:
+                columns[col] = pd.Series(union_categoricals(pieces, sort_categories=True), name=col)
+            except TypeError:
+                # An all-null chunk can carry differently typed categories
+                columns[col] = pd.concat(pieces, ignore_index=True).astype("category")
+        else:
+            columns[col] = pd.concat(pieces, ignore_index=True)
+        del pieces
+    return pd.DataFrame(columns, copy=False)
+
+
+def load_csv_typed(file, chunksize=DEFAULT_CHUNKSIZE):
+    # Single pass that builds the compact typed frame and its profile together
+    profile = new_profile()
+    parts = {}
+    for chunk in iter_csv_chunks(file, chunksize):
+        update_profile(profile, chunk)
+        _split(chunk, parts)
+    df = _concat_columns(parts)
+    return df, finish_profile(profile)
+
+
+def null_count_table(null_counts):
+    return null_counts.reset_index().rename(columns={"index": "Column", 0: "Null Count"})
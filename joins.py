@@ -0,0 +1,193 @@
+import numpy as np
+import pandas as pd
+
+
+JOIN_HOW = ["left", "inner"]
+
+
+# A join is computed as two row indexers into the inputs (-1: no row on that side; None: every
+# row in order), and the result is assembled from them. Columns of a side whose indexer is None
+# are referenced as they are (copy-on-write keeps them shared); only the other side is gathered.
+
+if int(pd.__version__.split(".")[0]) < 3:
+    # Always on from pandas 3; without it selecting the referenced columns copies them
+    pd.options.mode.copy_on_write = True
+
+def _renumber(codes, valid):
+    # Dense codes 0..k-1 for the valid rows, -1 elsewhere
+    out = np.full(len(codes), -1, dtype=np.int64)
+    out[valid], uniques = pd.factorize(codes[valid])
+    return out, uniques
+
+
+def _key_codes(left, right, keys):
+    # Codes over the distinct left keys; right keys the left side does not have get -1,
+    # as do nulls, so neither can ever match
+    lcodes = np.zeros(len(left), dtype=np.int64)
+    rcodes = np.zeros(len(right), dtype=np.int64)
+    lvalid = np.ones(len(left), dtype=bool)
+    rvalid = np.ones(len(right), dtype=bool)
+    for col in keys:
+        lc, uniques = pd.factorize(left[col])
+        rc = pd.Index(uniques).get_indexer(right[col])
+        lvalid &= lc >= 0
+        rvalid &= rc >= 0
+        lcodes = lcodes * len(uniques) + lc
+        rcodes = rcodes * len(uniques) + rc
+        if len(keys) > 1:
+            # Keep the combined codes dense so they never overflow
+            lcodes, combos = _renumber(lcodes, lvalid)
+            rcodes = np.where(rvalid, pd.Index(combos).get_indexer(rcodes), -1)
+            rvalid &= rcodes >= 0
+    return np.where(lvalid, lcodes, -1), np.where(rvalid, rcodes, -1)
+
+
+def _hash_matches(left, right, keys):
+    # Right rows bucketed by key code (a counting sort); each left row looks its bucket up
+    lcodes, rcodes = _key_codes(left, right, keys)
+    valid = np.flatnonzero(rcodes >= 0)
+    counts = np.bincount(rcodes[valid], minlength=int(lcodes.max(initial=0)) + 1)
+    order = valid[np.argsort(rcodes[valid], kind="stable")]
+    offsets = np.cumsum(counts) - counts
+    slot = np.maximum(lcodes, 0)
+    return offsets[slot], np.where(lcodes >= 0, counts[slot], 0), order
+
+
+def _sortable(series):
+    # (values, valid) as int64 or float64 for a sorted-merge join, or None if the key is not numeric
+    dtype = series.dtype
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        values = series.to_numpy(dtype="datetime64[ns]")
+        return values.view("int64"), ~np.isnat(values)
+    if pd.api.types.is_bool_dtype(dtype) or not pd.api.types.is_numeric_dtype(dtype):
+        return None
+    valid = series.notna().to_numpy()
+    if pd.api.types.is_integer_dtype(dtype):
+        return series.to_numpy(dtype="int64", na_value=0), valid
+    return series.to_numpy(dtype="float64", na_value=np.nan), valid
+
+
+def _merge_matches(left, right, key):
+    # Right rows in key order; left rows binary-search their range, which streams through
+    # memory when the left side is in key order too
+    lvalues, lvalid = _sortable(left[key])
+    rvalues, rvalid = _sortable(right[key])
+    if lvalues.dtype != rvalues.dtype:
+        lvalues, rvalues = lvalues.astype("float64"), rvalues.astype("float64")
+    order = np.flatnonzero(rvalid)
+    rsorted = rvalues[order]
+    if len(rsorted) > 1 and not (rsorted[1:] >= rsorted[:-1]).all():
+        positions = np.argsort(rsorted, kind="stable")
+        order, rsorted = order[positions], rsorted[positions]
+    starts = np.searchsorted(rsorted, lvalues, side="left")
+    hits = np.where(lvalid, np.searchsorted(rsorted, lvalues, side="right") - starts, 0)
+    return starts, hits, order
+
+
+def choose_method(left, right, keys):
+    # Sorted-merge only pays when both sides already arrive in key order (time- or id-ordered
+    # exports): sorting first costs more than hashing at every size measured. Hash tables are
+    # sized by the distinct primary keys, whatever the row counts.
+    if not keys:
+        return "position"
+    if len(keys) == 1 and all(_sortable(side[keys[0]]) is not None for side in (left, right)):
+        if left[keys[0]].is_monotonic_increasing and right[keys[0]].is_monotonic_increasing:
+            return "merge"
+    return "hash"
+
+
+def join_indexers(left, right, keys=None, how="left", method="auto"):
+    # (left rows, right rows, method): one entry per output row, in left row order
+    keys = list(keys or [])
+    if method == "auto":
+        method = choose_method(left, right, keys)
+    if method == "position":
+        # Row i of one side next to row i of the other, padded where a side is shorter, as
+        # the side-by-side concat used to do
+        n = min(len(left), len(right)) if how == "inner" else max(len(left), len(right))
+        return _padded(len(left), n), _padded(len(right), n), method
+    if method == "merge":
+        starts, hits, order = _merge_matches(left, right, keys[0])
+    else:
+        starts, hits, order = _hash_matches(left, right, keys)
+
+    if how == "left" and (hits <= 1).all():
+        # At most one match per primary row: the primary side is kept as it is
+        right_rows = np.full(len(left), -1, dtype=np.int64)
+        right_rows[hits > 0] = order[starts[hits > 0]]
+        return None, right_rows, method
+
+    # Unmatched left rows are kept once (left join) or dropped (inner join)
+    repeats = np.maximum(hits, 1) if how == "left" else hits
+    left_rows = np.repeat(np.arange(len(left)), repeats)
+    first = np.repeat(np.cumsum(repeats) - repeats, repeats)
+    step = np.arange(len(left_rows)) - first
+    matched = np.repeat(hits > 0, repeats)
+    right_rows = np.full(len(left_rows), -1, dtype=np.int64)
+    right_rows[matched] = order[np.repeat(starts, repeats)[matched] + step[matched]]
+    return left_rows, right_rows, method
+
+
+def _padded(length, n):
+    if length == n:
+        return None
+    positions = np.arange(n)
+    return np.where(positions < length, positions, -1)
+
+
+def _columns(frame, rows, names):
+    # Columns of frame at the given rows; referenced instead of copied when rows is None
+    if rows is None:
+        part = frame[names].reset_index(drop=True)
+        return {name: part[name] for name in names}
+    return {
+        name: pd.Series(pd.api.extensions.take(_values(frame[name]), rows, allow_fill=True), name=name)
+        for name in names
+    }
+
+
+def _values(series):
+    # numpy-backed columns are taken as plain arrays (NaN-filled), the rest as extension arrays
+    return series.to_numpy() if isinstance(series.dtype, np.dtype) else series.array
+
+
+def join_stats(left, right, left_rows, right_rows, keys, how, method):
+    rows = len(left) if left_rows is None else len(left_rows)
+    left_rows = np.arange(rows) if left_rows is None else left_rows
+    right_rows = np.arange(rows) if right_rows is None else right_rows
+    matched_right = np.zeros(len(right), dtype=bool)
+    matched_right[right_rows[right_rows >= 0]] = True
+    matched_left = np.zeros(len(left), dtype=bool)
+    matched_left[left_rows[(left_rows >= 0) & (right_rows >= 0)]] = True
+    return {
+        "keys": list(keys or []), "how": how, "method": method,
+        "left_rows": len(left), "right_rows": len(right), "rows": rows,
+        "left_matched": int(matched_left.sum()), "right_matched": int(matched_right.sum()),
+        "left_match_rate": float(matched_left.mean()) if len(left) else 0.0,
+        "right_match_rate": float(matched_right.mean()) if len(right) else 0.0,
+    }
+
+
+def join_datasets(primary_df, mapped_df, keys=None, how="left", method="auto", columns=None):
+    # Primary columns plus the mapped columns the primary does not already have (or just
+    # `columns` of the mapped side). Returns (frame, stats).
+    left_rows, right_rows, method = join_indexers(primary_df, mapped_df, keys, how, method)
+    if columns is None:
+        columns = [col for col in mapped_df.columns if col not in primary_df.columns]
+    columns = [col for col in dict.fromkeys(columns) if col not in primary_df.columns]
+    data = _columns(primary_df, left_rows, list(primary_df.columns))
+    data.update(_columns(mapped_df, right_rows, columns))
+    joined = pd.DataFrame(data, copy=False)
+    return joined, join_stats(primary_df, mapped_df, left_rows, right_rows, keys, how, method)
+
+
+def join_summary(stats):
+    if not stats["keys"]:
+        return (f"Combined by row order: {stats['left_rows']:,} primary and {stats['right_rows']:,} "
+                f"secondary rows; rows are only related if both files list them in the same order.")
+    return (
+        f"Joined on {', '.join(stats['keys'])} ({stats['method']} join): "
+        f"{stats['left_matched']:,} of {stats['left_rows']:,} primary rows matched "
+        f"({stats['left_match_rate']:.1%}), {stats['right_matched']:,} of {stats['right_rows']:,} "
+        f"secondary rows used ({stats['right_match_rate']:.1%}); result has {stats['rows']:,} rows."
+    )
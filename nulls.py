@@ -0,0 +1,111 @@
+import numpy as np
+import pandas as pd
+
+
+IGNORE = "Ignore rows"
+MEAN = "Fill with mean"
+MEDIAN = "Fill with median"
+MODE = "Fill with mode"
+FORWARD = "Fill forward by date"
+# Group-wise fills use the statistic of the row's own group, falling back to the whole column
+GROUP_FILL_COLUMNS = ["State", "Mat Desc"]
+GROUP_MEAN = {group: f"Fill with mean by {group}" for group in GROUP_FILL_COLUMNS}
+GROUP_MODE = {group: f"Fill with mode by {group}" for group in GROUP_FILL_COLUMNS}
+
+NUMERIC_NULL_OPTIONS = [IGNORE, MEAN, MEDIAN, MODE] + list(GROUP_MEAN.values()) + [FORWARD]
+TEXT_NULL_OPTIONS = [IGNORE, MODE] + list(GROUP_MODE.values()) + [FORWARD]
+
+# option -> (statistic, group column or None)
+_STRATEGIES = {MEAN: ("mean", None), MEDIAN: ("median", None), MODE: ("mode", None), FORWARD: ("ffill", None)}
+_STRATEGIES.update({option: ("mean", group) for group, option in GROUP_MEAN.items()})
+_STRATEGIES.update({option: ("mode", group) for group, option in GROUP_MODE.items()})
+
+
+def _offered(df, col, option):
+    from dates import DATE_COLUMN
+
+    stat, group = _STRATEGIES.get(option, (None, None))
+    if stat == "ffill":
+        return DATE_COLUMN in df.columns
+    return group is None or (group in df.columns and group != col)
+
+
+def null_options(df, col):
+    # Group-wise and date fills are only offered when the frame has the column they need
+    options = NUMERIC_NULL_OPTIONS if pd.api.types.is_numeric_dtype(df[col]) else TEXT_NULL_OPTIONS
+    return [option for option in options if _offered(df, col, option)]
+
+
+def _modes(frame):
+    # Most frequent value per column (the smallest one on ties, like Series.mode()[0])
+    if frame.empty:
+        return pd.Series(np.nan, index=frame.columns, dtype=object)
+    return frame.mode(dropna=True).iloc[0]
+
+
+def _group_stats(frame, group, cols, stat):
+    # Per-row statistic of each row's group, NaN where the group has no value
+    if stat == "mean":
+        return frame.groupby(group, observed=True, sort=False)[cols].transform("mean")
+    out = {}
+    for col in cols:
+        counts = frame.groupby([group, col], observed=True).size()
+        counts = counts[counts > 0]
+        modes = counts.groupby(level=0, observed=True).idxmax().map(lambda pair: pair[1])
+        out[col] = modes.reindex(pd.Index(frame[group])).to_numpy()
+    return pd.DataFrame(out, index=frame.index)
+
+
+def _forward_fill(frame, cols):
+    # Carries the last known value forward in invoice-date order; rows without a date go last
+    from dates import DATE_COLUMN, parse_dates
+
+    parsed, _, _ = parse_dates(frame[DATE_COLUMN])
+    order = np.argsort(parsed, kind="stable")
+    filled = frame[cols].iloc[order].ffill()
+    return filled.iloc[np.argsort(order)].set_axis(frame.index)
+
+
+def apply_null_policy(df, policy):
+    # All choices at once: one combined mask for "Ignore rows", statistics computed in one pass
+    # over the rows that remain, then every filled column replaced in a single assign. The rows
+    # are copied at most once; columns without a fill are shared with the input.
+    policy = {col: option for col, option in policy.items() if col in df.columns}
+    dropped = [col for col, option in policy.items() if option == IGNORE]
+    if dropped:
+        keep = df[dropped].notna().all(axis=1)
+        if not keep.all():
+            df = df[keep]
+
+    plans = {}
+    for col, option in policy.items():
+        if option in _STRATEGIES and df[col].hasnans:
+            plans.setdefault(_STRATEGIES[option], []).append(col)
+    if not plans:
+        return df
+
+    fills = {}
+    # Group-wise fills fall back to the whole-column statistic, so it is computed for them too
+    funcs = {col: stat for (stat, _), cols in plans.items() if stat in ("mean", "median") for col in cols}
+    if funcs:
+        stats = df[list(funcs)].agg(funcs)
+        fills.update({col: stats[col] for col in funcs})
+    mode_cols = [col for (stat, _), cols in plans.items() if stat == "mode" for col in cols]
+    if mode_cols:
+        modes = _modes(df[mode_cols])
+        fills.update({col: modes[col] for col in mode_cols})
+
+    for (stat, group), cols in plans.items():
+        if group is not None:
+            values = _group_stats(df, group, cols, stat)
+            for col in cols:
+                fills[col] = values[col].fillna(fills[col]) if pd.notna(fills[col]) else values[col]
+        elif stat == "ffill":
+            values = _forward_fill(df, cols)
+            fills.update({col: values[col] for col in cols})
+
+    filled = {}
+    for col, value in fills.items():
+        if isinstance(value, pd.Series) or pd.notna(value):
+            filled[col] = df[col].fillna(value)
+    return df.assign(**filled)
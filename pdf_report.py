@@ -0,0 +1,133 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+
+import matplotlib
+matplotlib.use("Agg")
+from matplotlib.figure import Figure
+from matplotlib.ticker import FuncFormatter
+import pandas as pd
+from fpdf import FPDF
+
+from cube import report_top
+
+
+PDF_WORKERS = int(os.environ.get("PDF_WORKERS", min(4, os.cpu_count() or 1)))
+
+# Report -> (x column, bar colour, title, x label, rows charted)
+BAR_CHARTS = {
+    "Top Customers": ("Dealer_Name", '#1f77b4', "Top 10 Customers by Sales", "Customer", 10),
+    "Product Performance": ("Mat Desc", '#2ca02c', "Top 10 Products by Sales", "Product", 10),
+    "Sales by Region": ("State", '#d62728', "Sales by State", "State", 15),
+}
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def format_in_lakhs(x, _):
+    return f'₹{x*1e-5:.1f}L'
+
+
+def chart_data(report_name, df):
+    # Only the rows that end up on the chart are sent to the renderer
+    if report_name in BAR_CHARTS:
+        return report_top(report_name, df, BAR_CHARTS[report_name][4])
+    if report_name == "Sales Summary":
+        df = df.dropna(subset=["Year", "Month"])
+        # Year and Month are floats once the loaded columns had nulls
+        period = pd.to_datetime(pd.DataFrame({"year": df["Year"], "month": df["Month"], "day": 1}).astype("int64"))
+        return pd.DataFrame({"Period": period, "Sales Amt": df["Sales Amt"]}).sort_values("Period")
+    return None
+
+
+def render_chart(report_name, data):
+    # Runs in a worker process. A bare Figure draws straight to the Agg canvas, with no
+    # pyplot global state, and the PNG never leaves memory.
+    fig = Figure(figsize=(6.5, 3.5))
+    ax = fig.subplots()
+    ax.yaxis.set_major_formatter(FuncFormatter(format_in_lakhs))
+
+    if report_name in BAR_CHARTS:
+        x_col, color, title, x_label, _ = BAR_CHARTS[report_name]
+        data.plot(kind='bar', x=x_col, y='Sales Amt', ax=ax, color=color)
+        ax.set_title(title)
+        ax.set_xlabel(x_label)
+        ax.set_ylabel("Sales Amount (₹ Lakhs)")
+        for label in ax.get_xticklabels():
+            label.set_rotation(45)
+            label.set_ha('right')
+
+    elif report_name == "Sales Summary":
+        data.plot(kind='line', x='Period', y='Sales Amt', ax=ax, color='#ff7f0e', marker='o')
+        ax.set_title("Monthly Sales Trend")
+        ax.set_xlabel("Period")
+        ax.set_ylabel("Sales Amount (₹ Lakhs)")
+        ax.grid(True)
+
+    fig.tight_layout()
+    buf = BytesIO()
+    fig.savefig(buf, format='png')
+    return buf.getvalue()
+
+
+def _get_pool():
+    # One long-lived pool per process; spawn avoids forking the threaded app server
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=PDF_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def _reset_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def render_charts(jobs):
+    # jobs: {report_name: chart data}; returns {report_name: PNG bytes}
+    if len(jobs) < 2 or PDF_WORKERS < 2:
+        return {name: render_chart(name, data) for name, data in jobs.items()}
+    try:
+        pool = _get_pool()
+        futures = {name: pool.submit(render_chart, name, data) for name, data in jobs.items()}
+        return {name: future.result() for name, future in futures.items()}
+    except (BrokenProcessPool, OSError):
+        # Fall back to rendering in-process if workers cannot be started
+        _reset_pool()
+        return {name: render_chart(name, data) for name, data in jobs.items()}
+
+
+def generate_report_pdf(reports):
+    jobs = {}
+    for report_name, df in reports.items():
+        data = chart_data(report_name, df)
+        if data is not None:
+            jobs[report_name] = data
+    images = render_charts(jobs)
+
+    pdf = FPDF()
+    pdf.set_auto_page_break(auto=True, margin=15)
+
+    for report_name, df in reports.items():
+        pdf.add_page()
+        pdf.set_font("helvetica", "B", 14)
+        pdf.cell(0, 10, report_name, new_x="LMARGIN", new_y="NEXT")
+
+        if report_name in images:
+            pdf.image(BytesIO(images[report_name]), w=180)
+
+        pdf.set_font("helvetica", "", 10)
+        table_rows = report_top(report_name, df, 10)
+        for i in range(len(table_rows)):
+            row = table_rows.iloc[i].astype(str).tolist()
+            pdf.cell(0, 10, " | ".join(row), new_x="LMARGIN", new_y="NEXT")
+
+    return BytesIO(bytes(pdf.output()))
@@ -0,0 +1,211 @@
+import argparse
+import glob
+import hashlib
+import json
+import os
+import sys
+
+import pandas as pd
+
+from ingest import DEFAULT_CHUNKSIZE, load_csv_typed
+from joins import join_datasets, join_summary
+from nulls import apply_null_policy, null_options
+from profiling import chrome_trace, finish_trace, rows_of, span, start_trace
+
+
+NONE_OPTION = "-- None --"
+RANGE_FILTER_COLUMNS = ["Sales Amt", "Qty"]
+
+# Example config (JSON), every key is optional:
+# {
+#     "mapping": {"Customer": "Dealer_Name", "Amount": "Sales Amt"},
+#     "null_policy": {"Qty": "Fill with mean by State", "State": "Ignore rows"},
+#     "states": ["Karnataka", "Kerala"],
+#     "numeric_filter": {"column": "Sales Amt", "threshold": 1000},
+#     "join": {"keys": ["Dealer"], "how": "left"},
+#     "update_original": true
+# }
+
+
+def stage_key(*parts):
+    payload = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def file_key(path):
+    stat = os.stat(path)
+    return stage_key(os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+
+
+def bytes_key(data):
+    return hashlib.sha1(data).hexdigest()
+
+
+class StageCache:
+    # Keeps the last result of every stage together with the key it was built from,
+    # so a rerun only recomputes the stages whose inputs or config changed.
+    def __init__(self):
+        self._entries = {}
+
+    def run(self, stage, key, func, *args, **kwargs):
+        entry = self._entries.get(stage)
+        with span(stage, cached=entry is not None and entry[0] == key) as info:
+            if info["cached"]:
+                return entry[1]
+            result = func(*args, **kwargs)
+            info["rows"] = rows_of(result)
+        self._entries[stage] = (key, result)
+        return result
+
+    def clear(self):
+        self._entries.clear()
+
+
+# --- Stages
+
+def apply_mapping(user_df, mapping):
+    mapping = {src: dst for src, dst in mapping.items() if dst and dst != NONE_OPTION}
+    return user_df.rename(columns=mapping)
+
+
+def filter_states(df, states):
+    # None means no state filter, an empty selection means no rows
+    if states is None or "State" not in df.columns:
+        return df
+    if not states:
+        return pd.DataFrame()
+    return df[df["State"].isin(states)]
+
+
+def numeric_columns(df):
+    return df.select_dtypes(include="number").columns.tolist()
+
+
+def filter_numeric(df, column=None, threshold=None, values=None):
+    if not column or column not in df.columns:
+        return df
+    if threshold is not None:
+        return df[df[column] > threshold]
+    if values is not None:
+        return df[df[column].isin(values)]
+    return df
+
+
+def merge_datasets(primary_df, mapped_df, keys=None, how="left"):
+    # Primary columns plus the mapped columns it does not have, joined on keys (row order when
+    # there are none). Returns (merged, join stats).
+    return join_datasets(primary_df, mapped_df, keys, how)
+
+
+def update_dataset(primary_df, mapped_df, keys=None, how="left"):
+    new_cols = [col for col in mapped_df.columns if col not in primary_df.columns]
+    if not new_cols:
+        return None
+    return join_datasets(primary_df, mapped_df, keys, how, columns=new_cols)[0]
+
+
+# --- Runner
+
+def run_pipeline(primary_df, secondary_df=None, config=None, cache=None, primary_key=None, secondary_key=None):
+    config = config or {}
+    cache = cache or StageCache()
+    primary_key = primary_key or stage_key("primary", id(primary_df))
+    secondary_key = secondary_key or stage_key("secondary", id(secondary_df))
+    numeric_filter = config.get("numeric_filter") or {}
+    join = config.get("join") or {}
+    result = {"primary": primary_df}
+
+    if secondary_df is None:
+        # Primary-only run: filter the primary dataset directly
+        key = stage_key(primary_key, "states", config.get("states"))
+        state_filtered = cache.run("state_filter", key, filter_states, primary_df, config.get("states"))
+        key = stage_key(key, "numeric", numeric_filter)
+        filtered = cache.run("numeric_filter", key, filter_numeric, state_filtered, **numeric_filter)
+        result.update(state_filtered=state_filtered, filtered=filtered, merged=filtered)
+        return result
+
+    key = stage_key(secondary_key, "mapping", config.get("mapping", {}))
+    mapped = cache.run("mapping", key, apply_mapping, secondary_df, config.get("mapping", {}))
+
+    key = stage_key(key, "nulls", config.get("null_policy", {}))
+    cleaned = cache.run("null_policy", key, apply_null_policy, mapped, config.get("null_policy", {}))
+
+    if config.get("update_original"):
+        update_key = stage_key(primary_key, key, "update", join)
+        result["updated"] = cache.run("update", update_key, update_dataset, primary_df, cleaned, **join)
+
+    key = stage_key(key, "states", config.get("states"))
+    state_filtered = cache.run("state_filter", key, filter_states, cleaned, config.get("states"))
+
+    merge_key = stage_key(primary_key, key, "merge", join)
+    merged, result["join"] = cache.run("merge", merge_key, merge_datasets, primary_df, state_filtered, **join)
+
+    key = stage_key(key, "numeric", numeric_filter)
+    filtered = cache.run("numeric_filter", key, filter_numeric, state_filtered, **numeric_filter)
+
+    result.update(mapped=mapped, cleaned=cleaned, state_filtered=state_filtered, filtered=filtered, merged=merged)
+    return result
+
+
+def load_config(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def expand_paths(patterns):
+    # CSV paths from command-line arguments; a pattern that matches nothing is kept as a path
+    paths = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern))
+        paths.extend(matches or [pattern])
+    return paths
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the sales ETL pipeline without the UI.")
+    parser.add_argument("inputs", nargs="+", help="CSV files or glob patterns to process")
+    parser.add_argument("--config", help="JSON pipeline config")
+    parser.add_argument("--primary", help="Primary CSV; inputs are then treated as secondary files")
+    parser.add_argument("--output-dir", default="pipeline_output")
+    parser.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE, help="Rows per CSV read chunk")
+    parser.add_argument("--trace", help="Write a Chrome trace of every stage to this file")
+    args = parser.parse_args(argv)
+    trace = start_trace("pipeline") if args.trace else None
+
+    config = load_config(args.config) if args.config else {}
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    primary_df = load_csv_typed(args.primary, args.chunksize)[0] if args.primary else None
+    failures = 0
+
+    for path in expand_paths(args.inputs):
+        stem = os.path.splitext(os.path.basename(path))[0]
+        try:
+            with span("load_csv", "ingest", file=path) as info:
+                df, _ = load_csv_typed(path, args.chunksize)
+                info["rows"] = len(df)
+            if primary_df is None:
+                result = run_pipeline(df, config=config)
+            else:
+                result = run_pipeline(primary_df, df, config=config)
+        except Exception as exc:
+            failures += 1
+            print(f"{path}: failed ({exc})", file=sys.stderr)
+            continue
+
+        result["merged"].to_csv(os.path.join(args.output_dir, f"{stem}_merged.csv"), index=False)
+        result["filtered"].to_csv(os.path.join(args.output_dir, f"{stem}_filtered.csv"), index=False)
+        if result.get("updated") is not None:
+            result["updated"].to_csv(os.path.join(args.output_dir, f"{stem}_updated.csv"), index=False)
+        print(f"{path}: {len(result['filtered'])} filtered rows, {len(result['merged'])} merged rows")
+        if "join" in result:
+            print(f"{path}: {join_summary(result['join'])}")
+
+    if trace is not None:
+        with open(args.trace, "wb") as f:
+            f.write(chrome_trace([finish_trace(trace)]))
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,39 @@
+import streamlit as st
+
+from profiling import TRACE_RUNS, chrome_trace, run_table, span_table, trace_json
+
+
+def remember_trace(trace):
+    # The last TRACE_RUNS reruns of this session, oldest first
+    traces = st.session_state.setdefault("traces", [])
+    traces.append(trace)
+    del traces[:-TRACE_RUNS]
+    return traces
+
+
+def show_profile_panel(traces):
+    with st.sidebar.expander("⏱️ Performance", expanded=False):
+        if not traces:
+            st.caption("No reruns recorded yet.")
+            return
+        last = traces[-1]
+        computed = sum(1 for span in last.spans if span["args"].get("cached") is False)
+        st.metric("Last rerun", f"{last.wall * 1000:,.0f} ms", f"{computed} stage(s) recomputed", delta_color="off")
+
+        st.markdown("**Stages in the last rerun**")
+        st.dataframe(span_table(last), hide_index=True, use_container_width=True)
+        if not last.memory:
+            st.caption("Peak memory per stage is recorded when the app runs with PROFILE_MEMORY=1 (slower).")
+
+        st.markdown(f"**Last {len(traces)} reruns**")
+        st.dataframe(run_table(traces), hide_index=True, use_container_width=True)
+
+        st.download_button(
+            "Download trace (JSON)", trace_json(traces), file_name="sales_app_trace.json",
+            mime="application/json", key="trace_json"
+        )
+        st.download_button(
+            "Download Chrome trace", chrome_trace(traces), file_name="sales_app_chrome_trace.json",
+            mime="application/json", key="trace_chrome",
+            help="Open in chrome://tracing or ui.perfetto.dev"
+        )
@@ -0,0 +1,186 @@
+import contextvars
+import functools
+import json
+import os
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+import pandas as pd
+
+
+# Spans are recorded into the trace of the current script run (one per Streamlit rerun or CLI
+# run); with no trace active, span() costs a context variable lookup.
+#
+# Peak memory comes from tracemalloc, which is process-wide and slows allocation-heavy code,
+# so it is only switched on with PROFILE_MEMORY=1.
+PROFILE_MEMORY = os.environ.get("PROFILE_MEMORY") == "1"
+# Reruns kept per session for the panel and the exports
+TRACE_RUNS = 20
+
+_current = contextvars.ContextVar("trace", default=None)
+
+
+def _rss_bytes():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def rows_of(result):
+    # Row count of a stage result: a frame, or the first frame of a tuple
+    if isinstance(result, tuple) and result:
+        result = result[0]
+    if isinstance(result, (pd.DataFrame, pd.Series)):
+        return len(result)
+    return None
+
+
+class Trace:
+    def __init__(self, name, memory=PROFILE_MEMORY):
+        self.name = name
+        self.started_at = time.time()
+        self.origin = time.perf_counter()
+        self.memory = memory
+        self.spans = []
+        self._stack = []
+        self.wall = self.cpu = None
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def begin(self, name, category, args):
+        if self.memory:
+            current, peak = tracemalloc.get_traced_memory()
+            if self._stack:
+                self._stack[-1]["_peak"] = max(self._stack[-1]["_peak"], peak)
+            tracemalloc.reset_peak()
+        else:
+            current = None
+        record = {
+            "name": name, "category": category, "depth": len(self._stack), "args": dict(args),
+            "start": time.perf_counter() - self.origin, "_cpu": time.thread_time(),
+            "_memory": current, "_peak": current or 0,
+        }
+        self._stack.append(record)
+        return record
+
+    def end(self, record):
+        record["wall"] = time.perf_counter() - self.origin - record["start"]
+        record["cpu"] = time.thread_time() - record.pop("_cpu")
+        start_memory, peak = record.pop("_memory"), record.pop("_peak")
+        if self.memory:
+            peak = max(peak, tracemalloc.get_traced_memory()[1])
+            record["peak_bytes"] = peak - start_memory
+            if len(self._stack) > 1:
+                self._stack[-2]["_peak"] = max(self._stack[-2]["_peak"], peak)
+        else:
+            record["peak_bytes"] = None
+        record["rss_bytes"] = _rss_bytes()
+        self._stack.pop()
+        self.spans.append(record)
+
+    def finish(self):
+        self.wall = time.perf_counter() - self.origin
+        self.cpu = sum(span["cpu"] for span in self.spans if span["depth"] == 0)
+        return self
+
+
+def start_trace(name="rerun", memory=PROFILE_MEMORY):
+    trace = Trace(name, memory)
+    _current.set(trace)
+    return trace
+
+
+def finish_trace(trace):
+    if _current.get() is trace:
+        _current.set(None)
+    return trace.finish()
+
+
+def current_trace():
+    return _current.get()
+
+
+@contextmanager
+def span(name, category="stage", **args):
+    # Yields a dict the caller can add details to (rows, cache hits, ...)
+    trace = _current.get()
+    if trace is None:
+        yield args
+        return
+    record = trace.begin(name, category, args)
+    try:
+        yield record["args"]
+    finally:
+        trace.end(record)
+
+
+def traced(name=None, category="stage"):
+    # Decorator form of span(); the row count of the result is recorded when it has one
+    def _decorate(func):
+        label = name or func.__name__
+
+        @functools.wraps(func)
+        def _wrapper(*args, **kwargs):
+            if _current.get() is None:
+                return func(*args, **kwargs)
+            with span(label, category) as info:
+                result = func(*args, **kwargs)
+                info["rows"] = rows_of(result)
+                return result
+        return _wrapper
+    return _decorate
+
+
+def span_table(trace):
+    # Spans in start order, indented by nesting
+    rows = [{
+        "Stage": "  " * span["depth"] + span["name"],
+        "Kind": span["category"],
+        "Wall (ms)": span["wall"] * 1000,
+        "CPU (ms)": span["cpu"] * 1000,
+        "Peak (MB)": None if span["peak_bytes"] is None else span["peak_bytes"] / 2 ** 20,
+        "Rows": span["args"].get("rows"),
+        "Cached": span["args"].get("cached"),
+    } for span in sorted(trace.spans, key=lambda span: span["start"])]
+    return pd.DataFrame(rows, columns=["Stage", "Kind", "Wall (ms)", "CPU (ms)", "Peak (MB)", "Rows", "Cached"])
+
+
+def run_table(traces):
+    return pd.DataFrame([{
+        "Started": pd.Timestamp(trace.started_at, unit="s").strftime("%H:%M:%S"),
+        "Wall (ms)": trace.wall * 1000,
+        "Traced CPU (ms)": trace.cpu * 1000,
+        "Spans": len(trace.spans),
+        "Computed": sum(1 for span in trace.spans if span["args"].get("cached") is False),
+    } for trace in traces if trace.wall is not None])
+
+
+def trace_dict(trace):
+    return {
+        "name": trace.name, "started_at": trace.started_at, "wall": trace.wall, "cpu": trace.cpu,
+        "memory": trace.memory, "spans": trace.spans,
+    }
+
+
+def trace_json(traces):
+    return json.dumps([trace_dict(trace) for trace in traces], default=str, indent=1).encode("utf-8")
+
+
+def chrome_trace(traces):
+    # Chrome trace event format (chrome://tracing, Perfetto); each rerun is its own track
+    events = []
+    for tid, trace in enumerate(traces, start=1):
+        base = trace.started_at * 1e6
+        events.append({"name": "thread_name", "ph": "M", "pid": 1, "tid": tid, "args": {"name": f"{trace.name} {tid}"}})
+        for span in trace.spans:
+            args = dict(span["args"], cpu_ms=span["cpu"] * 1000)
+            if span["peak_bytes"] is not None:
+                args["peak_bytes"] = span["peak_bytes"]
+            events.append({
+                "name": span["name"], "cat": span["category"], "ph": "X", "pid": 1, "tid": tid,
+                "ts": base + span["start"] * 1e6, "dur": span["wall"] * 1e6, "args": args,
+            })
+    return json.dumps({"traceEvents": events, "displayTimeUnit": "ms"}, default=str).encode("utf-8")
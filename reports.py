@@ -1,34 +1,43 @@
 import streamlit as st
-import pandas as pd
-from io import BytesIO
 
-import matplotlib.pyplot as plt
-import io
-from fpdf import FPDF
-from PIL import Image
-import tempfile
-import streamlit as st
-import plotly.express as px
-from prophet import Prophet
-from prophet.plot import plot_plotly
-import plotly.graph_objects as go
+from cube import CUBE_DIMENSIONS, report_top, rollup, sorted_report
+from exports import download_on_demand, reports_fingerprint, table_export, write_excel
+from profiling import traced
+
 
 
+TOP_N = 10
+DRILL_DOWN_ROWS = 100
+# Report name -> cube dimensions it rolls up to
+REPORT_DIMENSIONS = {
+    "Top Customers": ["Dealer_Name"],
+    "Product Performance": ["Mat Desc"],
+    "Sales by Region": ["State"],
+    "Sales Summary": ["Year", "Month"],
+}
 
 
+def report_sheets(reports_dict):
+    # Each sheet is sorted only when the writer reaches it
+    return {name: (lambda name=name, df=df: sorted_report(name, df)) for name, df in reports_dict.items()}
 
 
+@traced("generate_excel", "export")
 def generate_excel(reports_dict):
-    output = BytesIO()
-    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-        for sheet_name, df in reports_dict.items():
-            df.to_excel(writer, sheet_name=sheet_name[:31], index=False)
-    return output.getvalue()
+    return write_excel(report_sheets(reports_dict))
+
+
+@traced("generate_pdf", "export")
+def generate_pdf(reports_dict):
+    # matplotlib and fpdf are only imported once a PDF is actually prepared
+    from pdf_report import generate_report_pdf
+    return generate_report_pdf(reports_dict)
 
-def show_reports_tab(merged_df):
+def show_reports_tab(cube):
     st.header("📊 Reports Generator")
 
-    if merged_df is None or merged_df.empty:
+    # Every report is a rollup of the pre-aggregated cube rather than a scan of the raw rows
+    if cube is None or cube.empty:
         st.warning("⚠️ Please complete the ETL pipeline to access reports.")
         return
 
@@ -38,7 +47,8 @@ def show_reports_tab(merged_df):
         "Top Customers Report",
         "Product Performance Report",
         "Sales by Region/Channel",
-        "Sales Summary Report"
+        "Sales Summary Report",
+        "Custom Drill-down"
     ]
 
     selected_reports = st.multiselect("Choose reports to generate:", report_options)
@@ -48,30 +58,24 @@ def show_reports_tab(merged_df):
 
 
     if "Top Customers Report" in selected_reports:
-        if "Dealer_Name" in merged_df.columns and "Sales Amt" in merged_df.columns:
-            top_customers = (
-                merged_df.groupby("Dealer_Name")[["Sales Amt", "Qty"]]
-                .sum()
-                .sort_values(by="Sales Amt", ascending=False)
-                .reset_index()
-            )
+        if "Dealer_Name" in cube.columns and "Sales Amt" in cube.columns:
+            top_customers = rollup(cube, REPORT_DIMENSIONS["Top Customers"])
             reports["Top Customers"] = top_customers
-            st.write("### Top Customers Report", top_customers)
+            st.write("### Top Customers Report", report_top("Top Customers", top_customers, TOP_N))
+            st.caption(f"Top {TOP_N} of {len(top_customers)} customers; the Excel export has the full ranking.")
 
     if "Product Performance Report" in selected_reports:
-        if "Mat Desc" in merged_df.columns and "Sales Amt" in merged_df.columns:
-            product_perf = (
-                merged_df.groupby("Mat Desc")[["Sales Amt", "Qty"]]
-                .sum()
-                .sort_values(by="Sales Amt", ascending=False)
-                .reset_index()
-            )
+        if "Mat Desc" in cube.columns and "Sales Amt" in cube.columns:
+            product_perf = rollup(cube, REPORT_DIMENSIONS["Product Performance"])
             reports["Product Performance"] = product_perf
+            top_products = report_top("Product Performance", product_perf, TOP_N)
             st.subheader("Product Performance Report")
-            st.dataframe(product_perf.head(10))
+            st.dataframe(top_products)
 
+            # plotly is imported the first time a chart is drawn
+            import plotly.express as px
             fig = px.bar(
-                product_perf.head(10),
+                top_products,
                 x="Mat Desc",
                 y="Sales Amt",
                 text_auto='.2s',
@@ -83,29 +87,24 @@ def show_reports_tab(merged_df):
 
 
     if "Sales by Region/Channel" in selected_reports:
-        if "State" in merged_df.columns and "Sales Amt" in merged_df.columns:
-            sales_by_region = (
-                merged_df.groupby("State")[["Sales Amt", "Qty"]]
-                .sum()
-                .sort_values(by="Sales Amt", ascending=False)
-                .reset_index()
-            )
+        if "State" in cube.columns and "Sales Amt" in cube.columns:
+            sales_by_region = rollup(cube, REPORT_DIMENSIONS["Sales by Region"])
             reports["Sales by Region"] = sales_by_region
-            st.write("### Sales by Region/Channel", sales_by_region)
+            st.write("### Sales by Region/Channel", sorted_report("Sales by Region", sales_by_region))
 
     if "Sales Summary Report" in selected_reports:
-        if "Month" in merged_df.columns and "Year" in merged_df.columns:
+        if "Month" in cube.columns and "Year" in cube.columns:
             summary = (
-                merged_df.groupby(["Year", "Month"])[["Sales Amt", "Qty"]]
-                .sum()
+                rollup(cube, REPORT_DIMENSIONS["Sales Summary"])
                 .sort_values(by=["Year", "Month"])
-                .reset_index()
+                .reset_index(drop=True)
             )
             reports["Sales Summary"] = summary
             st.subheader("Sales Summary Report")
             st.dataframe(summary)
 
             summary["Period"] = summary["Year"].astype(str) + "-" + summary["Month"].astype(str)
+            import plotly.express as px
             fig = px.line(
                 summary,
                 x="Period",
@@ -117,208 +116,41 @@ def show_reports_tab(merged_df):
             fig.update_xaxes(tickangle=45)
             st.plotly_chart(fig, use_container_width=True)
 
+    if "Custom Drill-down" in selected_reports:
+        dims = [col for col in CUBE_DIMENSIONS if col in cube.columns]
+        drill_dims = st.multiselect("Group by", dims, default=dims[:1])
+        drill_filters = {}
+        for col in st.multiselect("Filter on", dims):
+            values = sorted(cube[col].dropna().unique())
+            drill_filters[col] = st.multiselect(f"{col} values", values, default=values)
+        drill_down = rollup(cube, drill_dims, filters=drill_filters)
+        reports["Drill-down"] = drill_down
+        st.subheader("Custom Drill-down")
+        st.dataframe(report_top("Drill-down", drill_down, DRILL_DOWN_ROWS))
 
     if reports:
-        excel_data = generate_excel(reports)
-        st.download_button(
-            label="📥 Download All Reports (Excel)",
-            data=excel_data,
-            file_name="sales_reports.xlsx",
-            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+        # Payloads are only built when requested and are cached on the report contents
+        fingerprint = reports_fingerprint(reports, filters=selected_reports)
+        excel_builder, excel_name, excel_mime = table_export(
+            report_sheets(reports), [len(df) for df in reports.values()], "sales_reports"
         )
-        pdf_data = generate_report_pdf(reports)
-        st.download_button(
-            label="📄 Download Report Summary (PDF)",
-            data=pdf_data,
+        download_on_demand(
+            "📥 Download All Reports (Excel)",
+            f"reports_excel:{fingerprint}",
+            excel_builder,
+            file_name=excel_name,
+            mime=excel_mime,
+            widget_key="reports_excel"
+        )
+        download_on_demand(
+            "📄 Download Report Summary (PDF)",
+            f"reports_pdf:{fingerprint}",
+            generate_pdf,
+            reports,
             file_name="sales_report_summary.pdf",
-            mime="application/pdf"
+            mime="application/pdf",
+            widget_key="reports_pdf"
         )
 
     else:
         st.info("Select at least one report to generate.")
-        
-
-
-import os
-
-from matplotlib.ticker import FuncFormatter
-
-def generate_report_pdf(reports):
-    pdf = FPDF()
-    pdf.set_auto_page_break(auto=True, margin=15)
-
-    def format_in_lakhs(x, _):
-        return f'₹{x*1e-5:.1f}L'
-
-    for report_name, df in reports.items():
-        pdf.add_page()
-        pdf.set_font("Arial", "B", 14)
-        pdf.cell(0, 10, report_name, ln=True)
-
-        fig, ax = plt.subplots(figsize=(6.5, 3.5))
-        ax.yaxis.set_major_formatter(FuncFormatter(format_in_lakhs))
-
-        if report_name == "Top Customers":
-            chart_data = df.head(10)
-            chart_data.plot(kind='bar', x='Dealer_Name', y='Sales Amt', ax=ax, color='#1f77b4')
-            ax.set_title("Top 10 Customers by Sales")
-            ax.set_xlabel("Customer")
-            ax.set_ylabel("Sales Amount (₹ Lakhs)")
-            plt.xticks(rotation=45, ha='right')
-
-        elif report_name == "Product Performance":
-            chart_data = df.head(10)
-            chart_data.plot(kind='bar', x='Mat Desc', y='Sales Amt', ax=ax, color='#2ca02c')
-            ax.set_title("Top 10 Products by Sales")
-            ax.set_xlabel("Product")
-            ax.set_ylabel("Sales Amount (₹ Lakhs)")
-            plt.xticks(rotation=45, ha='right')
-
-        elif report_name == "Sales by Region":
-            chart_data = df.head(15)
-            chart_data.plot(kind='bar', x='State', y='Sales Amt', ax=ax, color='#d62728')
-            ax.set_title("Sales by State")
-            ax.set_xlabel("State")
-            ax.set_ylabel("Sales Amount (₹ Lakhs)")
-            plt.xticks(rotation=45, ha='right')
-
-        elif report_name == "Sales Summary":
-            df["Period"] = df["Year"].astype(str) + "-" + df["Month"].astype(str)
-            df["Period"] = pd.to_datetime(df["Period"] + "-01")
-            df_sorted = df.sort_values("Period")
-            df_sorted.plot(kind='line', x='Period', y='Sales Amt', ax=ax, color='#ff7f0e', marker='o')
-            ax.set_title("Monthly Sales Trend")
-            ax.set_xlabel("Period")
-            ax.set_ylabel("Sales Amount (₹ Lakhs)")
-            ax.grid(True)
-
-        fig.tight_layout()
-        buf = BytesIO()
-        plt.savefig(buf, format='png')
-        buf.seek(0)
-        img = Image.open(buf)
-
-        import time
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".png") as tmp_img:
-            img.save(tmp_img.name)
-            img.close()  # Ensure file is closed before deleting
-            pdf.image(tmp_img.name, w=180)
-            plt.close(fig)
-            buf.close()
-            # Retry deletion if file is in use
-            for _ in range(5):
-                try:
-                    os.unlink(tmp_img.name)
-                    break
-                except PermissionError:
-                    time.sleep(0.2)
-
-        plt.close(fig)
-
-        pdf.set_font("Arial", "", 10)
-        for i in range(min(len(df), 10)):
-            row = df.iloc[i].astype(str).tolist()
-            pdf.cell(0, 10, " | ".join(row), ln=True)
-
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp_pdf:
-        pdf.output(tmp_pdf.name)
-        tmp_pdf_path = tmp_pdf.name
-
-    with open(tmp_pdf_path, "rb") as f:
-        pdf_bytes = f.read()
-
-    os.unlink(tmp_pdf_path)
-
-    return BytesIO(pdf_bytes)
-
-def show_forecast_tab(df):
-    st.header("📈 Forecast Sales Using Prophet")
-
-    if df is None or df.empty:
-        st.warning("⚠️ Please load data through ETL first.")
-        return
-
-    st.subheader("Configure Forecast")
-
-    st.write("Columns in dataframe:", df.columns.tolist())
-
-
-    df['Inv Date'] = pd.to_datetime(df['Inv Date'])
-    df['Month'] = df['Inv Date'].dt.to_period('M').dt.to_timestamp()
-
-    df['Month'] = df['Inv Date'].dt.to_period('M').dt.to_timestamp()
-
-    sales_monthly = df.groupby('Month')['Sales Amt'].sum().reset_index()
-    sales_monthly.columns = ['ds', 'y']
-
-    forecast_period = st.slider("Months to Forecast", min_value=1, max_value=24, value=6)
-
-    model = Prophet()
-    with st.spinner("Training the model..."):
-        model.fit(sales_monthly)
-
-    future = model.make_future_dataframe(periods=forecast_period, freq='ME')
-    forecast = model.predict(future)
-
-    st.success("Forecast generated!")
-
-    actual = forecast[forecast['ds'] <= sales_monthly['ds'].max()]
-    predicted = forecast[forecast['ds'] > sales_monthly['ds'].max()]
-
-    # Create figure
-    fig = go.Figure()
-
-    # Actual data in blue
-    fig.add_trace(go.Scatter(
-        x=actual['ds'],
-        y=actual['yhat'],
-        mode='lines+markers',
-        name='Actual (Fitted)',
-        line=dict(color='blue')
-    ))
-
-    # Forecast data in orange
-    fig.add_trace(go.Scatter(
-        x=predicted['ds'],
-        y=predicted['yhat'],
-        mode='lines+markers',
-        name='Forecast',
-        line=dict(color='orange', dash='dash')
-    ))
-
-    # Add confidence interval
-    fig.add_trace(go.Scatter(
-        x=forecast['ds'],
-        y=forecast['yhat_upper'],
-        mode='lines',
-        name='Upper Bound',
-        line=dict(width=0),
-        showlegend=False
-    ))
-
-    fig.add_trace(go.Scatter(
-        x=forecast['ds'],
-        y=forecast['yhat_lower'],
-        mode='lines',
-        name='Lower Bound',
-        fill='tonexty',
-        line=dict(width=0),
-        fillcolor='rgba(255,165,0,0.2)',
-        showlegend=True
-    ))
-
-    # Layout
-    fig.update_layout(
-        title='Sales Forecast',
-        xaxis_title='Month',
-        yaxis_title='Sales Amount',
-        template='plotly_white',
-        legend=dict(orientation='h', yanchor='bottom', y=1.02, xanchor='right', x=1)
-    )
-
-    st.plotly_chart(fig, use_container_width=True)
-
-    forecast_table = forecast[['ds', 'yhat', 'yhat_lower', 'yhat_upper']].tail(forecast_period)
-    forecast_table.columns = ['Month', 'Predicted Sales', 'Lower Bound', 'Upper Bound']
-    st.write("### Forecast Table")
-    st.dataframe(forecast_table)
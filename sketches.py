@@ -0,0 +1,149 @@
+import numpy as np
+
+
+DEFAULT_K = 200
+# Values are fed to the compactors in blocks so level 0 never holds more than this
+UPDATE_BLOCK = 65536
+
+
+class KLLSketch:
+    # Mergeable quantile sketch (Karnin, Lang & Liberty). Memory is O(k log(n/k)) and
+    # the rank error of a single quantile is about normalized_rank_error() with 99% confidence.
+    def __init__(self, k=DEFAULT_K, seed=None):
+        self.k = k
+        self.n = 0
+        self.levels = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+
+    def _capacity(self, level):
+        depth = len(self.levels) - level - 1
+        return max(2, int(np.ceil(self.k * (2 / 3) ** depth)))
+
+    def _compress(self):
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if len(items) > self._capacity(level):
+                if level + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                items = np.sort(items)
+                # An odd item out stays behind so weights remain exact
+                keep, items = (items[-1:], items[:-1]) if len(items) % 2 else (items[:0], items)
+                offset = self._rng.integers(2)
+                self.levels[level + 1] = np.concatenate([self.levels[level + 1], items[offset::2]])
+                self.levels[level] = keep
+            level += 1
+
+    def update(self, values):
+        values = np.asarray(values, dtype="float64").ravel()
+        values = values[np.isfinite(values)]
+        for start in range(0, len(values), UPDATE_BLOCK):
+            block = values[start:start + UPDATE_BLOCK]
+            self.levels[0] = np.concatenate([self.levels[0], block])
+            self.n += len(block)
+            self._compress()
+        return self
+
+    def merge(self, other):
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for level, items in enumerate(other.levels):
+            self.levels[level] = np.concatenate([self.levels[level], items])
+        self.n += other.n
+        self._compress()
+        return self
+
+    def _weighted_items(self):
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(level), 2 ** i, dtype="float64") for i, level in enumerate(self.levels)])
+        order = np.argsort(items, kind="stable")
+        return items[order], np.cumsum(weights[order])
+
+    def quantiles(self, qs):
+        qs = np.atleast_1d(np.asarray(qs, dtype="float64"))
+        if self.n == 0:
+            return np.full(len(qs), np.nan)
+        items, cumulative = self._weighted_items()
+        positions = np.searchsorted(cumulative, qs * cumulative[-1], side="left")
+        return items[np.clip(positions, 0, len(items) - 1)]
+
+    def quantile(self, q):
+        return float(self.quantiles([q])[0])
+
+    def rank(self, value):
+        if self.n == 0:
+            return np.nan
+        items, cumulative = self._weighted_items()
+        position = np.searchsorted(items, value, side="right")
+        return float(cumulative[position - 1] / cumulative[-1]) if position else 0.0
+
+    def normalized_rank_error(self):
+        # Empirical single-quantile bound used by Apache DataSketches for KLL
+        return 2.296 / self.k ** 0.9723
+
+    def retained(self):
+        return sum(len(level) for level in self.levels)
+
+    def save(self, path):
+        arrays = {f"level_{i}": level for i, level in enumerate(self.levels)}
+        with open(path, "wb") as f:
+            np.savez(f, k=self.k, n=self.n, **arrays)
+
+    @classmethod
+    def load(cls, path, seed=None):
+        with np.load(path) as data:
+            sketch = cls(int(data["k"]), seed=seed)
+            sketch.n = int(data["n"])
+            n_levels = len([name for name in data.files if name.startswith("level_")])
+            sketch.levels = [data[f"level_{i}"] for i in range(n_levels)]
+        return sketch
+
+
+def dkw_rank_error(sample_size, confidence=0.99):
+    # Dvoretzky-Kiefer-Wolfowitz bound on the rank error of quantiles read off a uniform sample
+    if sample_size <= 0:
+        return np.nan
+    return float(np.sqrt(np.log(2 / (1 - confidence)) / (2 * sample_size)))
+
+
+def sample_positions(n, sample_size, seed=0):
+    if n <= sample_size:
+        return np.arange(n)
+    rng = np.random.default_rng(seed)
+    return np.sort(rng.choice(n, size=sample_size, replace=False))
+
+
+def sample_quantiles(values, qs, sample_size, seed=0, confidence=0.99):
+    # Returns (estimates, rank error); exact when the data fits in the sample
+    values = np.asarray(values, dtype="float64")
+    values = values[np.isfinite(values)]
+    if not len(values):
+        return np.full(len(qs), np.nan), np.nan
+    if len(values) <= sample_size:
+        return np.quantile(values, qs), 0.0
+    sample = values[sample_positions(len(values), sample_size, seed)]
+    return np.quantile(sample, qs), dkw_rank_error(sample_size, confidence)
+
+
+def grouped_quantiles(values, codes, qs, n_groups=None):
+    # Quantiles of every group from a single sort on (group, value), using the same
+    # linear interpolation as np.quantile. Groups without values get NaN.
+    values = np.asarray(values, dtype="float64")
+    codes = np.asarray(codes)
+    n_groups = int(codes.max()) + 1 if n_groups is None and len(codes) else (n_groups or 0)
+    out = np.full((n_groups, len(qs)), np.nan)
+
+    valid = (codes >= 0) & np.isfinite(values)
+    values, codes = values[valid], codes[valid]
+    order = np.lexsort((values, codes))
+    values = values[order]
+
+    counts = np.bincount(codes, minlength=n_groups)
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    present = counts > 0
+    for j, q in enumerate(qs):
+        position = starts[present] + q * (counts[present] - 1)
+        lo = np.floor(position).astype(np.int64)
+        hi = np.ceil(position).astype(np.int64)
+        out[present, j] = values[lo] + (values[hi] - values[lo]) * (position - lo)
+    return out, counts
@@ -0,0 +1,98 @@
+import os
+import shutil
+import tempfile
+import time
+import uuid
+
+import pyarrow as pa
+import pyarrow.ipc as ipc
+
+
+# Intermediate stages are kept as uncompressed Arrow IPC files so reads can be
+# memory-mapped and only the requested columns are ever materialised.
+STORE_ROOT = os.environ.get("SALES_STORE_DIR", os.path.join(tempfile.gettempdir(), "sales_store"))
+STAGE_SUFFIX = ".arrow"
+SESSION_MAX_AGE = 24 * 60 * 60
+
+
+def new_session_dir(root=STORE_ROOT):
+    path = os.path.join(root, uuid.uuid4().hex)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def prune_store(root=STORE_ROOT, max_age=SESSION_MAX_AGE):
+    # Streamlit has no session-end hook, so stale session directories are swept on startup
+    if not os.path.isdir(root):
+        return
+    cutoff = time.time() - max_age
+    for name in os.listdir(root):
+        path = os.path.join(root, name)
+        if os.path.isdir(path) and os.path.getmtime(path) < cutoff:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def stage_path(directory, name):
+    return os.path.join(directory, f"{name}{STAGE_SUFFIX}")
+
+
+def _to_table(df):
+    try:
+        return pa.Table.from_pandas(df, preserve_index=False)
+    except (pa.ArrowTypeError, pa.ArrowInvalid):
+        # Mixed-type object columns (e.g. numbers and text) are stored as strings
+        mixed = {col: "string" for col in df.columns if df[col].dtype == object}
+        return pa.Table.from_pandas(df.astype(mixed), preserve_index=False)
+
+
+def write_stage(directory, name, df):
+    path = stage_path(directory, name)
+    table = _to_table(df)
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with pa.OSFile(tmp_path, "wb") as sink:
+        with ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp_path, path)
+    return path
+
+
+def derived_path(path, kind, suffix=STAGE_SUFFIX):
+    # A stage built from another one sits next to it and is named after it
+    # (merged_ab12.arrow -> merged_ab12.dates.arrow), so it goes when its source does
+    return f"{os.path.splitext(path)[0]}.{kind}{suffix}"
+
+
+def remove_stage(path):
+    # The stage and everything derived from it
+    directory, name = os.path.split(path)
+    prefix = f"{os.path.splitext(name)[0]}."
+    for other in os.listdir(directory or "."):
+        if other == name or other.startswith(prefix):
+            try:
+                os.remove(os.path.join(directory, other))
+            except OSError:
+                pass
+
+
+def replace_stage(directory, name, df, previous=None):
+    # Writes a new version of a stage and removes the previous one (a different file, so
+    # frames still mapped from it stay valid)
+    path = write_stage(directory, name, df)
+    if previous and previous != path:
+        remove_stage(previous)
+    return path
+
+
+def stage_columns(path):
+    with pa.memory_map(path, "r") as source:
+        return ipc.open_file(source).schema.names
+
+
+def read_stage(path, columns=None):
+    with pa.memory_map(path, "r") as source:
+        table = ipc.open_file(source).read_all()
+    if columns is not None:
+        table = table.select([col for col in columns if col in table.column_names])
+    # split_blocks keeps null-free numeric columns backed by the mapped file instead of copying them
+    return table.to_pandas(split_blocks=True)
+
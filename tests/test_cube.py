@@ -0,0 +1,41 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from cube import report_top, top_k
+
+
+def ranked(df, by, k, tie_breaker=None):
+    # Reference: sort everything, then take the first k
+    cols = [by] + ([tie_breaker] if tie_breaker else [])
+    ascending = [False] + ([True] if tie_breaker else [])
+    return df.sort_values(cols, ascending=ascending, kind="mergesort", na_position="last").head(k)
+
+
+@pytest.fixture
+def report():
+    rng = np.random.default_rng(0)
+    n = 500
+    df = pd.DataFrame({
+        "Dealer_Name": [f"D{i:03d}" for i in rng.permutation(n)],
+        # Few distinct amounts, so the k-th value is usually tied
+        "Sales Amt": rng.integers(0, 40, n).astype("float64") * 10,
+    })
+    df.loc[rng.random(n) < 0.05, "Sales Amt"] = np.nan
+    return df
+
+
+@pytest.mark.parametrize("k", [0, 1, 7, 50, 499, 500, 900])
+@pytest.mark.parametrize("tie_breaker", [None, "Dealer_Name"])
+def test_top_k_matches_full_sort(report, k, tie_breaker):
+    pd.testing.assert_frame_equal(top_k(report, "Sales Amt", k, tie_breaker), ranked(report, "Sales Amt", k, tie_breaker))
+
+
+def test_top_k_nulls_come_last():
+    df = pd.DataFrame({"Sales Amt": [np.nan, 5.0, np.nan, 1.0]})
+    assert top_k(df, "Sales Amt", 3)["Sales Amt"].tolist()[:2] == [5.0, 1.0]
+
+
+def test_report_top_uses_the_report_key(report):
+    expected = ranked(report, "Sales Amt", 20, "Dealer_Name").reset_index(drop=True)
+    pd.testing.assert_frame_equal(report_top("Top Customers", report, 20), expected)
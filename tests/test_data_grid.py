@@ -0,0 +1,49 @@
+import types
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import data_grid
+from data_grid import grid_index, view_positions
+
+
+@pytest.fixture
+def session(monkeypatch):
+    state = {}
+    monkeypatch.setattr(data_grid, "st", types.SimpleNamespace(session_state=state))
+    return state
+
+
+def frame(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({"State": rng.choice(["KA", "KL", "TN"], n), "Sales Amt": np.round(rng.uniform(1, 100, n), 2)})
+
+
+def test_only_indexes_of_shown_frames_are_kept(session):
+    data = frame(100)
+    exceptions = grid_index(data, "exceptions_duplicates", ("exceptions", "v1"))
+    assert grid_index(data, "exceptions_negatives", ("exceptions", "v1")) is exceptions
+    for threshold in [10, 20, 30, 40, 50]:
+        filtered = data[data["Sales Amt"] > threshold]
+        index = grid_index(filtered, "filtered", f"filter_{threshold}")
+        assert index.df is filtered
+        # The filtered grid holds its current frame only; the shared exceptions index stays
+        assert set(session["grid_indexes"]) == {("exceptions", "v1"), f"filter_{threshold}"}
+
+    grid_index(data, "exceptions_duplicates", ("exceptions", "v2"))
+    assert ("exceptions", "v1") in session["grid_indexes"]
+    grid_index(data, "exceptions_negatives", ("exceptions", "v2"))
+    assert set(session["grid_indexes"]) == {("exceptions", "v2"), "filter_50"}
+
+
+def test_view_positions_match_pandas(session):
+    data = frame(300)
+    index = grid_index(data, "filtered", "all")
+    rows = np.flatnonzero(data["State"] != "KL")
+    positions = view_positions(index, rows, "State", "k", "Sales Amt", descending=True)
+    view = data.iloc[rows]
+    view = view[view["State"].str.contains("k", case=False)]
+    expected = view.reset_index().sort_values(["Sales Amt", "index"], ascending=[False, True])["index"]
+    np.testing.assert_array_equal(positions, expected.to_numpy())
+    assert view_positions(index) is None
@@ -0,0 +1,34 @@
+import numpy as np
+import pandas as pd
+
+from dataset_cache import DatasetCache, frame_bytes
+
+
+def frame(seed, n=1000):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "State": pd.Categorical(rng.choice(["KA", "KL", "TN"], n)),
+        "Sales Amt": np.round(rng.uniform(1, 1000, n), 2),
+    })
+
+
+def test_sessions_cannot_change_the_cached_frame(tmp_path):
+    cache = DatasetCache(spill_dir=str(tmp_path))
+    first, _ = cache.get_or_load("a", lambda: (frame(0), {"rows": 1000}))
+    first.loc[0, "Sales Amt"] = -1.0
+    first["Sales Amt"] *= 2
+    second, profile = cache.get_or_load("a", lambda: (frame(1), {}))
+    pd.testing.assert_frame_equal(second, frame(0))
+    assert profile == {"rows": 1000}
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_spilled_frames_are_restored(tmp_path):
+    cache = DatasetCache(budget=frame_bytes(frame(0)) + 1, spill_dir=str(tmp_path))
+    loads = []
+    for key in ["a", "b", "a"]:
+        df, _ = cache.get_or_load(key, lambda key=key: (loads.append(key) or frame(ord(key)), {}))
+        pd.testing.assert_frame_equal(df, frame(ord(key)))
+    stats = cache.stats()
+    assert loads == ["a", "b"]
+    assert stats["spills"] == 2 and stats["restores"] == 1 and stats["in_memory"] == 1
@@ -0,0 +1,40 @@
+import pandas as pd
+import pytest
+
+from cube import build_cube
+from dates import date_summary, date_table, parse_dates, with_calendar_columns
+
+
+def test_ambiguous_dates_are_reported():
+    _, info = date_table(pd.Series(["03/04/2024", "05/06/2024", None]))
+    assert info["format"] == "%d/%m/%Y"
+    assert info["ambiguous"] == ["%m/%d/%Y"]
+    summary = date_summary(info)
+    assert "read as DD/MM/YYYY" in summary and "also fits MM/DD/YYYY" in summary
+
+
+def test_one_unambiguous_value_settles_the_format():
+    days = [f"{day:02d}/{month:02d}/2024" for month in range(1, 13) for day in range(1, 13)]
+    # Past the inference sample, so only the check against the whole column sees it is month-first
+    parsed, _, info = parse_dates(pd.Series(days + ["01/25/2024"]))
+    assert info["format"] == "%m/%d/%Y" and info["ambiguous"] == [] and info["fallback"] == 0
+    assert str(parsed[1].astype("datetime64[D]")) == "2024-02-01"
+    _, info = date_table(pd.Series(["25/04/2024", "05/06/2024"]))
+    assert info["format"] == "%d/%m/%Y" and info["ambiguous"] == []
+    assert date_summary(info) == "Invoice dates were read as DD/MM/YYYY."
+
+
+def test_parsed_datetimes_have_no_format_caption():
+    _, info = date_table(pd.Series(pd.to_datetime(["2024-01-05", None])))
+    assert date_summary(info) == "Of 2 invoice dates, 1 are missing; those rows have no date."
+
+
+@pytest.mark.parametrize("present", [[], ["Year"], ["Month"], ["Year", "Month"]])
+def test_calendar_columns_fill_in_only_what_is_missing(present):
+    table, _ = date_table(pd.Series(["2024-01-05", "2024-02-10", None]))
+    df = pd.DataFrame({"State": ["KA", "KL", "TN"], "Sales Amt": [1.0, 2.0, 3.0], "Year": 1999, "Month": 7})
+    frame = with_calendar_columns(df[["State", "Sales Amt"] + present], table)
+    assert sorted(frame.columns) == ["Month", "Sales Amt", "State", "Year"]
+    assert frame["Year"].tolist()[:2] == ([1999, 1999] if "Year" in present else [2024, 2024])
+    assert frame["Month"].tolist()[:2] == ([7, 7] if "Month" in present else [1, 2])
+    assert build_cube(frame)["Sales Amt"].sum() == 6.0
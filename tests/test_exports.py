@@ -0,0 +1,31 @@
+import exports
+from exports import acquire, cached_payload, get_payload, release
+
+
+def test_payload_survives_while_another_session_holds_it():
+    key = "test-shared-payload"
+    acquire(key)
+    acquire(key)
+    assert get_payload(key, lambda: b"report") == b"report"
+
+    release(key)
+    assert cached_payload(key) == b"report"
+
+    release(key)
+    assert cached_payload(key) is None
+    assert key not in exports._holders
+
+
+def test_payload_is_built_once():
+    key = "test-built-once"
+    calls = []
+
+    def build():
+        calls.append(1)
+        return "text"
+
+    acquire(key)
+    assert get_payload(key, build) == b"text"
+    assert get_payload(key, build) == b"text"
+    assert len(calls) == 1
+    release(key)
@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from filter_index import FilterIndex
+from pipeline import filter_numeric, filter_states
+
+
+@pytest.fixture
+def sales():
+    rng = np.random.default_rng(0)
+    n = 2000
+    df = pd.DataFrame({
+        "State": pd.Categorical(rng.choice(["KA", "KL", "TN", "AP"], n)),
+        "Dealer_Name": rng.choice([f"Dealer {i}" for i in range(30)], n),
+        "Sales Amt": np.round(rng.exponential(500, n), 2),
+        "Qty": rng.integers(0, 20, n).astype("float64"),
+        "Invoice": [f"INV{i:05d}" for i in rng.permutation(n)],
+    })
+    df.loc[rng.random(n) < 0.05, "State"] = np.nan
+    df.loc[rng.random(n) < 0.05, "Dealer_Name"] = None
+    df.loc[rng.random(n) < 0.05, "Sales Amt"] = np.nan
+    return df
+
+
+@pytest.mark.parametrize("col", ["State", "Dealer_Name", "Qty"])
+@pytest.mark.parametrize("values", [[], ["KA"], ["KL", "TN", "XX"], ["Dealer 3", "Dealer 17"], [1.0, 5.0, 19.0]])
+def test_isin_matches_pandas(sales, col, values):
+    np.testing.assert_array_equal(FilterIndex(sales).isin(col, values), sales[col].isin(values).to_numpy())
+
+
+def test_unindexed_columns_fall_back_to_pandas(sales, monkeypatch):
+    monkeypatch.setattr("filter_index.MAX_INDEX_VALUES", 10)
+    index = FilterIndex(sales)
+    values = ["Dealer 3", "Dealer 17"]
+    np.testing.assert_array_equal(index.isin("Dealer_Name", values), sales["Dealer_Name"].isin(values).to_numpy())
+    assert index.domain("Dealer_Name") == sorted(sales["Dealer_Name"].dropna().unique())
+
+
+@pytest.mark.parametrize("threshold", [-1, 0, 10.5, 500, 1e9])
+def test_above_matches_pandas(sales, threshold):
+    index = FilterIndex(sales)
+    for col in ["Sales Amt", "Qty"]:
+        np.testing.assert_array_equal(index.above(col, threshold), (sales[col] > threshold).to_numpy())
+
+
+def test_domain_and_value_range_match_pandas(sales):
+    index = FilterIndex(sales)
+    assert index.domain("State") == sorted(sales["State"].dropna().unique())
+    within = sales[sales["State"].isin(["KA", "TN"])]
+    assert index.domain("Dealer_Name", within=("State", ["KA", "TN"])) == sorted(within["Dealer_Name"].dropna().unique())
+    assert index.value_range("Sales Amt") == (sales["Sales Amt"].min(), sales["Sales Amt"].max())
+    low, high = index.value_range("Sales Amt", within=("State", ["KA", "TN"]))
+    assert (low, high) == (within["Sales Amt"].min(), within["Sales Amt"].max())
+    assert index.value_range("Sales Amt", within=("State", ["XX"])) is None
+
+
+@pytest.mark.parametrize("states", [None, ["KA"], ["KL", "AP"]])
+@pytest.mark.parametrize("numeric", [{}, {"column": "Sales Amt", "threshold": 300}, {"column": "Qty", "values": [2.0, 3.0]}])
+def test_filter_matches_pipeline(sales, states, numeric):
+    expected = filter_numeric(filter_states(sales, states), **numeric)
+    pd.testing.assert_frame_equal(FilterIndex(sales).filter(states, **numeric), expected)
+
+
+@pytest.mark.parametrize("col", ["State", "Dealer_Name", "Sales Amt", "Qty", "Invoice"])
+@pytest.mark.parametrize("descending", [False, True])
+def test_order_matches_stable_sort(sales, col, descending):
+    expected = sales[col].sort_values(ascending=not descending, kind="stable", na_position="last")
+    if descending:
+        # sort_values reverses ties when descending; the grid keeps them in row order
+        expected = expected.reset_index().sort_values(
+            [col, "index"], ascending=[False, True], kind="stable", na_position="last")["index"]
+    else:
+        expected = expected.index
+    np.testing.assert_array_equal(FilterIndex(sales).order(col, descending), np.asarray(expected))
+
+
+@pytest.mark.parametrize("col,text,expected", [
+    ("Sales Amt", ">500", lambda s: s["Sales Amt"] > 500),
+    ("Sales Amt", "<=100", lambda s: s["Sales Amt"] <= 100),
+    ("Qty", "7", lambda s: s["Qty"] == 7),
+    ("Qty", ">=18", lambda s: s["Qty"] >= 18),
+    ("Dealer_Name", "er 1", lambda s: s["Dealer_Name"].str.contains("er 1", case=False, regex=False).fillna(False)),
+    ("State", "k", lambda s: s["State"].astype(str).str.contains("k", case=False, regex=False)),
+    ("Invoice", "inv0001", lambda s: s["Invoice"].str.contains("INV0001", regex=False)),
+])
+def test_search_matches_pandas(sales, col, text, expected):
+    np.testing.assert_array_equal(FilterIndex(sales).search(col, text), expected(sales).to_numpy(dtype=bool))
@@ -0,0 +1,121 @@
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from exception_engine import row_hashes, scan_exceptions
+from incremental import BatchAlreadyApplied, HashIndex, scan_increment
+from ingest import load_csv_typed
+from sketches import KLLSketch
+
+
+def sales_frame(n=3000, seed=0):
+    # Sales rows where about a fifth repeat an earlier row, often from another batch
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        "State": rng.choice(["KA", "KL", "TN"], n),
+        "Dealer": rng.integers(1, 40, n),
+        # At most six significant digits, which float32 holds exactly
+        "Sales Amt": np.round(rng.uniform(1, 10_000, n), 2),
+        "Qty": rng.integers(1, 50, n).astype("float64"),
+    })
+    df.loc[rng.random(n) < 0.02, "Qty"] = np.nan
+    copies = np.flatnonzero(rng.random(n) < 0.2)
+    copies = copies[copies > 0]
+    df.iloc[copies] = df.iloc[rng.integers(0, copies, len(copies))].to_numpy()
+    return df.astype({"Dealer": "int64"})
+
+
+def batches(df, n_batches):
+    return [df.iloc[rows].reset_index(drop=True) for rows in np.array_split(np.arange(len(df)), n_batches)]
+
+
+def duplicate_count(df):
+    return len(scan_exceptions(df, ["duplicates"])["hits"]["duplicates"])
+
+
+def incremental_count(tmp_path, frames):
+    return sum(len(scan_increment(str(tmp_path), frame, ["duplicates"])["hits"]["duplicates"]) for frame in frames)
+
+
+def test_full_scan_matches_pandas():
+    df = sales_frame()
+    assert duplicate_count(df) == df.duplicated().sum()
+
+
+def test_incremental_matches_full_scan_on_mixed_dtypes(tmp_path):
+    df = sales_frame()
+    frames = batches(df, 10)
+    # Batches loaded differently: float32 amounts and narrow integer quantities on every other one
+    for frame in frames[::2]:
+        frame["Sales Amt"] = frame["Sales Amt"].astype("float32")
+        frame["Qty"] = frame["Qty"].astype("Int16")
+        frame["Dealer"] = frame["Dealer"].astype("int8")
+    assert incremental_count(tmp_path, frames) == duplicate_count(df)
+
+
+def test_incremental_matches_full_scan_on_loaded_csv_batches(tmp_path):
+    df = sales_frame()
+    loaded = [load_csv_typed(io.StringIO(frame.to_csv(index=False)), chunksize=97)[0] for frame in batches(df, 10)]
+    full, _ = load_csv_typed(io.StringIO(df.to_csv(index=False)), chunksize=1000)
+    assert incremental_count(tmp_path / "state", loaded) == duplicate_count(full) == df.duplicated().sum()
+
+
+def test_float32_hashes_like_the_float64_read():
+    values = [1234.57, 10.10, np.nan, 123456.79]
+    narrow = pd.DataFrame({"Sales Amt": np.array(values, dtype="float32"), "Qty": pd.array([1, 2, None, 4], dtype="Int16")})
+    wide = pd.DataFrame({"Sales Amt": values, "Qty": [1.0, 2.0, np.nan, 4.0]})
+    np.testing.assert_array_equal(row_hashes(narrow), row_hashes(wide))
+
+
+def test_hash_index_matches_a_set(tmp_path):
+    rng = np.random.default_rng(1)
+    index = HashIndex(str(tmp_path))
+    seen = set()
+    for size in [5, 50, 3, 200, 1, 1000, 17]:
+        values = rng.integers(0, 5000, size).astype(np.uint64)
+        probe = rng.integers(0, 5000, 300).astype(np.uint64)
+        np.testing.assert_array_equal(index.contains(probe), [int(v) in seen for v in probe])
+        index.add(values)
+        seen.update(int(v) for v in values)
+        assert len(index) == len(seen)
+    # Merged segments stay sorted and unique, and at most one segment per size tier remains
+    sizes = [len(index._array(name)) for name in index.segments]
+    assert sizes == sorted(sizes, reverse=True) and len(set(sizes)) == len(sizes)
+
+    reopened = HashIndex(str(tmp_path), index.segments)
+    np.testing.assert_array_equal(reopened.contains(np.arange(5000, dtype=np.uint64)), [v in seen for v in range(5000)])
+
+
+def test_a_batch_is_applied_only_once(tmp_path):
+    frames = batches(sales_frame(), 3)
+    for i, frame in enumerate(frames):
+        scan_increment(str(tmp_path), frame, ["duplicates", "outliers_sales"], batch_name=f"day{i}.csv")
+    with open(tmp_path / "state.json", encoding="utf-8") as f:
+        before = f.read()
+    sketch = KLLSketch.load(tmp_path / "sketches" / "Sales Amt.npz")
+
+    with pytest.raises(BatchAlreadyApplied, match="day1.csv"):
+        scan_increment(str(tmp_path), frames[1].copy(), ["duplicates", "outliers_sales"], batch_name="day1_again.csv")
+    with open(tmp_path / "state.json", encoding="utf-8") as f:
+        assert f.read() == before
+    assert KLLSketch.load(tmp_path / "sketches" / "Sales Amt.npz").n == sketch.n == sum(map(len, frames))
+
+
+def test_a_failed_scan_leaves_the_state_alone(tmp_path, monkeypatch):
+    df = sales_frame()
+    first, second = batches(df, 2)
+    scan_increment(str(tmp_path), first, ["duplicates"])
+
+    def fail(*args, **kwargs):
+        raise RuntimeError("scan failed")
+
+    monkeypatch.setattr("incremental.scan_exceptions", fail)
+    with pytest.raises(RuntimeError):
+        scan_increment(str(tmp_path), second, ["duplicates"])
+    monkeypatch.undo()
+    assert KLLSketch.load(tmp_path / "sketches" / "Sales Amt.npz").n == len(first)
+    # The batch can still be applied, and its duplicates are counted once
+    duplicates = len(scan_increment(str(tmp_path), second, ["duplicates"])["hits"]["duplicates"])
+    assert duplicates + first.duplicated().sum() == df.duplicated().sum()
@@ -0,0 +1,64 @@
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from ingest import load_csv_typed
+
+
+CSV = """State,Dealer_Name,Mat Desc,Sales Amt,Qty,Inv Date
+KA,D1,P1,1234.57,2,2023-01-05
+KL,D2,P2,10.10,,2023-01-06
+KA,D1,P1,1234.57,2,2023-01-05
+TN,D3,P3,123456789.123,300000,2023-02-01
+,D2,P1,0.1,1,
+KL,D4,P4,99.99,70000,2023-03-01
+"""
+
+
+def load(chunksize):
+    return load_csv_typed(io.StringIO(CSV), chunksize=chunksize)
+
+
+@pytest.mark.parametrize("chunksize", [1, 2, 4, 100])
+def test_values_match_read_csv_across_chunks(chunksize):
+    df, _ = load(chunksize)
+    expected = pd.read_csv(io.StringIO(CSV))
+    assert list(df.columns) == list(expected.columns)
+    for col in expected.columns:
+        got, want = df[col], expected[col]
+        if pd.api.types.is_numeric_dtype(want):
+            np.testing.assert_array_equal(got.to_numpy(dtype="float64"), want.to_numpy(dtype="float64"))
+        else:
+            assert got.astype(object).where(got.notna(), None).tolist() == want.astype(object).where(want.notna(), None).tolist()
+
+
+@pytest.mark.parametrize("chunksize", [1, 2, 100])
+def test_currency_stays_float64(chunksize):
+    df, _ = load(chunksize)
+    assert df["Sales Amt"].dtype == np.float64
+    assert df["Sales Amt"].tolist()[:4] == [1234.57, 10.10, 1234.57, 123456789.123]
+
+
+@pytest.mark.parametrize("chunksize", [1, 2, 100])
+def test_duplicates_survive_chunking(chunksize):
+    df, _ = load(chunksize)
+    expected = pd.read_csv(io.StringIO(CSV))
+    assert df.astype(object).duplicated().sum() == expected.duplicated().sum() == 1
+
+
+def test_categories_are_unioned():
+    df, _ = load(2)
+    assert isinstance(df["State"].dtype, pd.CategoricalDtype)
+    assert list(df["State"].cat.categories) == ["KA", "KL", "TN"]
+
+
+def test_profile_is_built_in_the_same_pass():
+    _, profile = load(2)
+    expected = pd.read_csv(io.StringIO(CSV))
+    assert profile["rows"] == len(expected)
+    assert profile["null_counts"].to_dict() == expected.isnull().sum().to_dict()
+    assert profile["domains"]["State"] == ["KA", "KL", "TN"]
+    assert profile["ranges"]["Qty"] == (1, 300000)
+    assert len(profile["preview"]) == 5
@@ -0,0 +1,82 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from joins import join_datasets
+
+
+@pytest.fixture
+def sides():
+    rng = np.random.default_rng(0)
+    primary = pd.DataFrame({
+        "Invoice": rng.integers(0, 400, 1000),
+        "Line": rng.integers(0, 3, 1000),
+        "Sales Amt": np.round(rng.uniform(1, 1000, 1000), 2),
+    })
+    # Some keys repeat on the mapped side, some are missing from it
+    mapped = pd.DataFrame({
+        "Invoice": rng.integers(0, 500, 600),
+        "Line": rng.integers(0, 3, 600),
+        "Dealer_Name": rng.choice(["A", "B", "C"], 600),
+        "Qty": rng.integers(1, 9, 600),
+        "Sales Amt": 0.0,
+    })
+    return primary, mapped
+
+
+def reference(primary, mapped, keys, how):
+    extra = [col for col in mapped.columns if col not in primary.columns]
+    return pd.merge(primary, mapped[keys + extra], on=keys, how=how, sort=False).reset_index(drop=True)
+
+
+@pytest.mark.parametrize("how", ["left", "inner"])
+@pytest.mark.parametrize("method", ["auto", "hash"])
+@pytest.mark.parametrize("keys", [["Invoice"], ["Invoice", "Line"]])
+def test_key_join_matches_merge(sides, keys, how, method):
+    primary, mapped = sides
+    joined, stats = join_datasets(primary, mapped, keys, how, method)
+    pd.testing.assert_frame_equal(joined, reference(primary, mapped, keys, how))
+    assert stats["rows"] == len(joined) and stats["method"] == "hash"
+
+
+@pytest.mark.parametrize("how", ["left", "inner"])
+def test_sorted_merge_join_matches_merge(sides, how):
+    primary, mapped = (side.sort_values("Invoice", kind="stable").reset_index(drop=True) for side in sides)
+    joined, stats = join_datasets(primary, mapped, ["Invoice"], how)
+    assert stats["method"] == "merge"
+    pd.testing.assert_frame_equal(joined, reference(primary, mapped, ["Invoice"], how))
+    # The merge method also handles unsorted input
+    shuffled = sides[0]
+    pd.testing.assert_frame_equal(
+        join_datasets(shuffled, sides[1], ["Invoice"], how, method="merge")[0],
+        reference(shuffled, sides[1], ["Invoice"], how),
+    )
+
+
+def test_null_keys_never_match():
+    primary = pd.DataFrame({"Invoice": [1.0, np.nan, 2.0], "Sales Amt": [1.0, 2.0, 3.0]})
+    mapped = pd.DataFrame({"Invoice": [np.nan, 2.0], "Dealer_Name": ["nobody", "B"]})
+    for method in ["hash", "merge"]:
+        joined, stats = join_datasets(primary, mapped, ["Invoice"], method=method)
+        assert joined["Dealer_Name"].tolist()[2] == "B"
+        assert joined["Dealer_Name"].iloc[:2].isna().all()
+        assert stats["left_matched"] == 1 and stats["right_matched"] == 1
+
+
+@pytest.mark.parametrize("how,join", [("left", "outer"), ("inner", "inner")])
+def test_position_join_matches_concat(sides, how, join):
+    primary, mapped = sides
+    for left, right in [(primary, mapped), (primary.iloc[:300], mapped)]:
+        joined, stats = join_datasets(left, right, None, how)
+        expected = pd.concat([left, right[["Dealer_Name", "Qty"]]], axis=1, join=join).reset_index(drop=True)
+        assert stats["method"] == "position"
+        pd.testing.assert_frame_equal(joined, expected)
+
+
+def test_joined_frame_does_not_write_through(sides):
+    primary, mapped = sides
+    before = primary.copy()
+    joined, _ = join_datasets(primary, mapped, ["Invoice", "Line"])
+    joined.loc[0, "Sales Amt"] = -1.0
+    joined["Invoice"] += 1
+    pd.testing.assert_frame_equal(primary, before)
@@ -0,0 +1,120 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from dates import DATE_COLUMN, parse_dates
+from nulls import (
+    FORWARD, GROUP_MEAN, GROUP_MODE, IGNORE, MEAN, MEDIAN, MODE, apply_null_policy, null_options,
+)
+
+
+@pytest.fixture
+def sales():
+    rng = np.random.default_rng(0)
+    n = 400
+    df = pd.DataFrame({
+        "State": pd.Categorical(rng.choice(["KA", "KL", "TN", "AP"], n)),
+        "Mat Desc": rng.choice(["p1", "p2", "p3"], n).astype(object),
+        "Dealer_Name": pd.Categorical(rng.choice(["A", "B", "C"], n)),
+        "Sales Amt": np.round(rng.uniform(1, 1000, n), 2),
+        "Qty": rng.integers(0, 5, n).astype("float64"),
+        DATE_COLUMN: pd.Series(pd.date_range("2023-01-01", periods=n, freq="D")).sample(frac=1, random_state=0)
+        .dt.strftime("%Y-%m-%d").to_numpy(),
+    })
+    for col in ["State", "Mat Desc", "Dealer_Name", "Sales Amt", "Qty", DATE_COLUMN]:
+        df.loc[rng.random(n) < 0.1, col] = np.nan
+    # Every value of these groups is missing, so they fall back to the whole column
+    df.loc[df["State"] == "AP", ["Sales Amt", "Dealer_Name"]] = np.nan
+    df.loc[df["Mat Desc"] == "p3", "Qty"] = np.nan
+    return df
+
+
+def mode(series):
+    modes = series.mode(dropna=True)
+    return modes.iloc[0] if len(modes) else np.nan
+
+
+def fill(series, value):
+    return series if np.all(pd.isna(value)) else series.fillna(value)
+
+
+def reference(df, policy):
+    # One column at a time with plain pandas: drops first, then every fill on the remaining rows
+    for col, option in policy.items():
+        if option == IGNORE:
+            df = df.dropna(subset=[col])
+    out = df.copy()
+    for col, option in policy.items():
+        if option == MEAN:
+            out[col] = fill(df[col], df[col].mean())
+        elif option == MEDIAN:
+            out[col] = fill(df[col], df[col].median())
+        elif option == MODE:
+            out[col] = fill(df[col], mode(df[col]))
+        elif option == FORWARD:
+            dates, _, _ = parse_dates(df[DATE_COLUMN])
+            order = np.argsort(dates, kind="stable")
+            out[col] = df[col].iloc[order].ffill().reindex(df.index)
+        for group, group_option in GROUP_MEAN.items():
+            if option == group_option:
+                means = df.groupby(group, observed=True)[col].transform("mean")
+                out[col] = fill(fill(df[col], means), df[col].mean())
+        for group, group_option in GROUP_MODE.items():
+            if option == group_option:
+                modes = df.groupby(group, observed=True)[col].agg(mode)
+                per_row = pd.Series(df[group].map(modes).to_numpy(dtype=object), index=df.index)
+                out[col] = fill(fill(df[col], per_row), mode(df[col]))
+    return out
+
+
+POLICIES = [
+    {"Sales Amt": MEAN},
+    {"Sales Amt": MEDIAN, "Qty": MEDIAN},
+    {"Qty": MODE, "Mat Desc": MODE, "Dealer_Name": MODE},
+    {"Sales Amt": GROUP_MEAN["State"], "Qty": GROUP_MEAN["Mat Desc"]},
+    {"Dealer_Name": GROUP_MODE["State"], "Mat Desc": GROUP_MODE["State"], "Qty": GROUP_MODE["Mat Desc"]},
+    {"Sales Amt": FORWARD, "Dealer_Name": FORWARD, "Mat Desc": FORWARD},
+    {"State": IGNORE, "Mat Desc": IGNORE, "Qty": IGNORE},
+    {"State": IGNORE, "Sales Amt": GROUP_MEAN["Mat Desc"], "Dealer_Name": GROUP_MODE["State"], "Qty": FORWARD},
+]
+
+
+@pytest.mark.parametrize("policy", POLICIES)
+def test_policy_matches_per_column_pandas(sales, policy):
+    before = sales.copy()
+    result = apply_null_policy(sales, policy)
+    pd.testing.assert_frame_equal(result, reference(sales, policy), check_dtype=False)
+    pd.testing.assert_frame_equal(sales, before)
+    filled = [col for col, option in policy.items() if option != IGNORE and option != FORWARD]
+    assert not result[filled].isna().any().any()
+
+
+def test_ignore_rows_drops_rows_missing_any_chosen_column(sales):
+    result = apply_null_policy(sales, {"State": IGNORE, "Qty": IGNORE, "Sales Amt": IGNORE})
+    expected = sales[sales[["State", "Qty", "Sales Amt"]].notna().all(axis=1)]
+    pd.testing.assert_frame_equal(result, expected)
+    assert result.index.equals(expected.index)
+
+
+def test_columns_without_nulls_are_left_alone(sales):
+    complete = sales.dropna()
+    assert apply_null_policy(complete, {"Sales Amt": MEAN, "Mat Desc": MODE}) is complete
+
+
+def test_options_depend_on_the_columns_present(sales):
+    assert GROUP_MEAN["State"] in null_options(sales, "Sales Amt")
+    assert GROUP_MODE["State"] not in null_options(sales, "State")
+    assert FORWARD not in null_options(sales.drop(columns=[DATE_COLUMN]), "Sales Amt")
+    assert MEAN not in null_options(sales, "Mat Desc")
+
+
+def test_mode_ties_take_the_smallest_value():
+    df = pd.DataFrame({
+        "State": pd.Categorical(["KA", "KA", "KA", "KA", "KL", "KL", "KL"]),
+        "Qty": [2.0, 1.0, np.nan, np.nan, 3.0, 4.0, np.nan],
+        "Mat Desc": ["b", "a", None, "b", "a", "c", None],
+    })
+    result = apply_null_policy(df, {"Qty": GROUP_MODE["State"], "Mat Desc": MODE})
+    pd.testing.assert_frame_equal(result, reference(df, {"Qty": GROUP_MODE["State"], "Mat Desc": MODE}), check_dtype=False)
+    assert result["Qty"].tolist() == [2.0, 1.0, 1.0, 1.0, 3.0, 4.0, 3.0]
+    assert result["Mat Desc"].tolist() == ["b", "a", "a", "b", "a", "c", "a"]
@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+
+from sketches import KLLSketch, grouped_quantiles
+
+
+QS = [0.01, 0.25, 0.5, 0.75, 0.99]
+
+
+def rank_error(values, sketch, qs=QS):
+    # Distance between the requested ranks and the true ranks of the sketch's answers
+    ordered = np.sort(values)
+    ranks = np.searchsorted(ordered, sketch.quantiles(qs), side="right") / len(ordered)
+    return np.abs(ranks - np.asarray(qs)).max()
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_kll_rank_error_within_bound(seed):
+    values = np.random.default_rng(seed).lognormal(5, 1, 200_000)
+    sketch = KLLSketch(seed=seed).update(values)
+    assert sketch.n == len(values)
+    assert rank_error(values, sketch) <= 2 * sketch.normalized_rank_error()
+    assert sketch.retained() < len(values) / 50
+
+
+def test_kll_exact_while_small():
+    values = np.random.default_rng(3).normal(size=150)
+    sketch = KLLSketch().update(values)
+    assert sketch.quantile(0.0) == values.min()
+    assert sketch.quantile(1.0) == values.max()
+
+
+def test_kll_merge_matches_one_pass(tmp_path):
+    rng = np.random.default_rng(4)
+    parts = [rng.normal(i, 1, 30_000) for i in range(5)]
+    merged = KLLSketch(seed=0)
+    for part in parts:
+        merged.merge(KLLSketch(seed=1).update(part))
+    values = np.concatenate(parts)
+    assert merged.n == len(values)
+    assert rank_error(values, merged) <= 2 * merged.normalized_rank_error()
+
+    path = tmp_path / "sketch.npz"
+    merged.save(path)
+    loaded = KLLSketch.load(path)
+    assert loaded.n == merged.n
+    np.testing.assert_array_equal(loaded.quantiles(QS), merged.quantiles(QS))
+
+
+def test_kll_ignores_missing_values():
+    sketch = KLLSketch().update([1.0, np.nan, 3.0, np.inf, 2.0])
+    assert sketch.n == 3
+    assert sketch.quantile(0.5) == 2.0
+
+
+def test_grouped_quantiles_match_numpy():
+    rng = np.random.default_rng(5)
+    codes = rng.integers(-1, 8, 5000)
+    values = rng.exponential(100, 5000)
+    values[rng.random(5000) < 0.05] = np.nan
+    codes[codes == 6] = 7  # group 6 has no rows
+    qs = [0.0, 0.1, 0.5, 0.9, 1.0]
+    out, counts = grouped_quantiles(values, codes, qs, n_groups=9)
+    for group in range(9):
+        members = values[(codes == group) & ~np.isnan(values)]
+        assert counts[group] == len(members)
+        if len(members):
+            np.testing.assert_allclose(out[group], np.quantile(members, qs))
+        else:
+            assert np.isnan(out[group]).all()
+
+
+def test_grouped_quantiles_single_value_groups():
+    out, counts = grouped_quantiles([3.0, 1.0, 2.0], [2, 0, 1], [0.25, 0.75])
+    np.testing.assert_array_equal(out, [[1.0, 1.0], [2.0, 2.0], [3.0, 3.0]])
+    np.testing.assert_array_equal(counts, [1, 1, 1])
@@ -0,0 +1,46 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from cube import load_or_build_cube
+from dates import DATE_COLUMN, load_or_build_dates, with_calendar_columns
+from store import read_stage, replace_stage
+
+
+def sales(n=500):
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({
+        "State": rng.choice(["KA", "KL", "TN"], n),
+        "Sales Amt": np.round(rng.uniform(1, 1000, n), 2),
+        DATE_COLUMN: pd.Series(pd.date_range("2023-01-01", periods=n, freq="D")).dt.strftime("%d/%m/%Y"),
+    })
+
+
+def test_store_does_not_grow_across_filter_changes(tmp_path):
+    df = sales()
+    directory = str(tmp_path)
+    path = None
+    for threshold in [0, 100, 200, 100, 900, 0]:
+        # What a filter change does: a new merged stage, then the tabs derive their stages from it
+        filtered = df[df["Sales Amt"] > threshold]
+        path = replace_stage(directory, f"merged_{threshold}", filtered, path)
+        table, info = load_or_build_dates(path, lambda: read_stage(path, [DATE_COLUMN])[DATE_COLUMN])
+        assert len(table) == len(filtered) and info["format"] == "%d/%m/%Y"
+        cube = load_or_build_cube(path, lambda: with_calendar_columns(read_stage(path), table))
+        assert cube["Sales Amt"].sum() == pytest.approx(filtered["Sales Amt"].sum())
+        assert sorted(os.listdir(directory)) == sorted([
+            f"merged_{threshold}.arrow", f"merged_{threshold}.dates.arrow", f"merged_{threshold}.dates.json",
+            f"merged_{threshold}.cube.arrow",
+        ])
+
+
+def test_replacing_a_stage_with_itself_keeps_it(tmp_path):
+    df = sales(10)
+    path = replace_stage(str(tmp_path), "merged_a", df)
+    load_or_build_dates(path, lambda: df[DATE_COLUMN])
+    assert replace_stage(str(tmp_path), "merged_a", df, path) == path
+    assert len(os.listdir(tmp_path)) == 3
+    pd.testing.assert_frame_equal(read_stage(path), df)
+